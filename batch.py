@@ -0,0 +1,152 @@
+"""
+Batch runner: runs many independent scripts in parallel (main.py --batch).
+
+The scripts are distributed over a ProcessPoolExecutor. Every worker
+process creates one Interpreter when it starts, so the scanner, parser and
+evaluator modules are imported once per worker and not once per script,
+and runs each script in a fresh Session: a new Data store, Evaluator and
+VM, so no variables leak from one script to the next. A script's printed
+output, its result and its error (if any) are captured separately and
+sent back with its wall time.
+
+The combined report lists the scripts in input order or in the order they
+finished, followed by a summary.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from interpreter import Interpreter, error_message, format_value
+
+
+class ScriptResult:
+    """
+    Outcome of one script of a batch.
+
+    Attributes:
+    - index (int): Position of the script in the input order
+    - path (str): The script file
+    - output (str): What the script printed
+    - result (str or None): Its formatted result, if it had one
+    - error (str or None): The error message, if it failed
+    - seconds (float): Wall time of reading and running the script
+    """
+
+    def __init__(self, index, path, output, result, error, seconds):
+        self.index = index
+        self.path = path
+        self.output = output
+        self.result = result
+        self.error = error
+        self.seconds = seconds
+
+
+def find_scripts(pattern):
+    """
+    Return the script files of a batch, sorted by name: the *.txt files of
+    a directory, or the files matching a glob pattern.
+
+    Raises:
+    - ValueError: If no file is found.
+    """
+    if os.path.isdir(pattern):
+        paths = glob.glob(os.path.join(pattern, "*.txt"))
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    paths = sorted(path for path in paths if os.path.isfile(path))
+    if not paths:
+        raise ValueError(f"No scripts found for '{pattern}'")
+    return paths
+
+
+# Interpreter of a worker process, created by start_worker()
+_interpreter = None
+
+
+def start_worker(settings):
+    """Create the worker's Interpreter (ProcessPoolExecutor initializer)."""
+    global _interpreter
+    _interpreter = Interpreter(program_cache_size=0, **settings)
+
+
+def run_script(index, path):
+    """Run one script in a fresh Session of the worker's Interpreter."""
+    start = time.perf_counter()
+    session = _interpreter.session()
+    result = error = None
+    try:
+        with open(path) as f:
+            source = f.read()
+        value = session.run(source)
+        if value is not None:
+            result = format_value(value)
+    except OSError as ex:
+        error = f"Cannot read '{path}': {ex.strerror}"
+    except Exception as ex:
+        error = error_message(ex)
+    return ScriptResult(index, path, session.output.getvalue(), result, error,
+                        time.perf_counter() - start)
+
+
+def run_batch(paths, workers=None, order='input', **settings):
+    """
+    Run scripts in parallel and yield their ScriptResults.
+
+    Parameters:
+    - paths (list): Script files
+    - workers (int or None): Worker processes (None: one per CPU); with 1
+      the scripts run one after another in this process
+    - order (str): 'input' yields results in the order of paths,
+      'completion' as soon as each script finishes
+    - settings: Keyword arguments of Interpreter (mode, optimize, ...)
+    """
+    if workers == 1:
+        start_worker(settings)
+        for index, path in enumerate(paths):
+            yield run_script(index, path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_worker,
+                             initargs=(settings,)) as executor:
+        futures = [executor.submit(run_script, index, path) for index, path in enumerate(paths)]
+        if order == 'completion':
+            futures = as_completed(futures)
+        for future in futures:
+            yield future.result()
+
+
+def format_script(result):
+    """Return the report lines of one script."""
+    status = "failed" if result.error is not None else "ok"
+    lines = [f"==== {result.path} ({status}, {result.seconds:.3f}s) ===="]
+    if result.output:
+        lines.extend(result.output.splitlines())
+    if result.error is not None:
+        lines.append(f"Error: {result.error}")
+    elif result.result is not None:
+        lines.append(f"Result: {result.result}")
+    return lines
+
+
+def write_report(results, stream, start):
+    """
+    Write the report of a batch, one section per script (in the order of
+    results) and a summary line, and return the number of failed scripts.
+    start is the time.perf_counter() value when the batch started.
+    """
+    failed = 0
+    script_time = 0.0
+    count = 0
+    for result in results:
+        for line in format_script(result):
+            stream.write(line + "\n")
+        stream.flush()
+        count += 1
+        failed += result.error is not None
+        script_time += result.seconds
+    stream.write(f"==== {count} scripts, {failed} failed, {time.perf_counter() - start:.3f}s wall time, "
+                 f"{script_time:.3f}s script time ====\n")
+    stream.flush()
+    return failed
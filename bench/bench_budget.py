@@ -0,0 +1,126 @@
+"""
+Benchmark of the cost of execution budgets (see budget.py).
+
+Runs a few workloads on every backend three times: without a budget, with
+a budget whose limits are never reached (all four limits set), and with a
+budget of max_steps only. Loops and calls pay one countdown per step either
+way, so the first two columns show what the limits themselves cost: the
+safepoint every SAFEPOINT_INTERVAL steps and the counting of lists and
+strings as they are built.
+
+Usage (from the project folder):
+    python bench/bench_budget.py [--size N] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator, allow_call_depth
+from vm import VM, compile_ast
+from budget import Budget
+
+
+WORKLOADS = {
+    "counting loop": """
+total = 0
+i = 0
+while i < {n} {{
+  total = total + i
+  i = i + 1
+}}
+total
+""",
+    "function calls": """
+func add(a, b) {{
+  return a + b
+}}
+total = 0
+for i in 0:{n} {{
+  total = add(total, i)
+}}
+total
+""",
+    "list appends": """
+items = []
+for i in 0:{n} {{
+  items.append(i)
+}}
+len = 0
+""",
+    "string appends": """
+text = ""
+for i in 0:{n} {{
+  text = text + "abcdefghij"
+}}
+done = 0
+""",
+}
+
+BACKENDS = ('tree', 'compile', 'iterative', 'vm')
+
+
+def make_runner(source, backend, budget):
+    """Return a function running source once on backend in a fresh store, with budget."""
+    ast = Parser(Scanner(source)).parse()
+
+    def run():
+        evaluator = Evaluator()
+        evaluator.budget = budget
+        if backend == 'vm':
+            vm = VM(evaluator.data)
+            vm.budget = budget
+            return vm.run(compile_ast(ast, vm.data))
+        resolved, _ = resolve(ast, evaluator.data)
+        if backend == 'compile':
+            return evaluator.compile(resolved)()
+        if backend == 'iterative':
+            return evaluator.evaluate_iterative(resolved)
+        return evaluator.evaluate(resolved)
+    return run
+
+
+def best_time(run, repeat):
+    """Best wall time of repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Time runs with and without execution budgets.")
+    arg_parser.add_argument("--size", type=int, default=200000, help="loop iterations per workload")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is reported)")
+    options = arg_parser.parse_args(argv)
+    allow_call_depth(1000)
+
+    large = 10 ** 12
+    budgets = (
+        ("none", None),
+        ("all limits", Budget(max_steps=large, max_seconds=large,
+                              max_list_elements=large, max_string_chars=large)),
+        ("steps only", Budget(max_steps=large)),
+    )
+    print(f"{'workload':<16} {'backend':<10}" + "".join(f"{name:>12}" for name, _ in budgets) + "   overhead")
+    for name, template in WORKLOADS.items():
+        source = template.format(n=options.size)
+        for backend in BACKENDS:
+            make_runner(source, backend, None)()  # warm up
+            times = [best_time(make_runner(source, backend, budget), options.repeat) for _, budget in budgets]
+            overhead = (times[1] / times[0] - 1) * 100
+            print(f"{name:<16} {backend:<10}" + "".join(f"{seconds:11.3f}s" for seconds in times)
+                  + f"   {overhead:+7.1f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark of bulk List methods against interpreted loops.
+
+Sums an N-element list with a `while` loop over `lst[i]` and with one call
+to `lst.sum()`, then times a few bulk methods directly with and without
+NumPy (the pure-Python fallback).
+
+Usage (from the project folder):
+    python bench/bench_bulk.py [--size N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator
+import data
+from data import List
+
+
+LOOP_SCRIPT = """
+total = 0
+i = 0
+while i < n {
+    total = total + lst[i]
+    i = i + 1
+}
+"""
+
+BULK_SCRIPT = """
+total = lst.sum()
+"""
+
+
+def run(script, values):
+    """Run a script with lst and n predefined; return (seconds, total)."""
+    evaluator = Evaluator()
+    evaluator.data.write('lst', List(list(values)))
+    evaluator.data.write('n', len(values))
+    ast, _ = resolve(Parser(Scanner(script)).parse(), evaluator.data)
+    code = evaluator.compile(ast)
+    start = time.perf_counter()
+    code()
+    elapsed = time.perf_counter() - start
+    return elapsed, evaluator.data.read('total')
+
+
+def time_methods(lst, other):
+    """Return seconds per bulk method call on lst."""
+    calls = [
+        ("sum()", lambda: lst.sum()),
+        ("max()", lambda: lst.max()),
+        ("scale(3)", lambda: lst.scale(3)),
+        ("dot(other)", lambda: lst.dot(other)),
+    ]
+    results = []
+    for name, call in calls:
+        start = time.perf_counter()
+        call()
+        results.append((name, time.perf_counter() - start))
+    return results
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare bulk List methods with loops.")
+    arg_parser.add_argument("--size", type=int, default=1000000, help="number of elements")
+    options = arg_parser.parse_args(argv)
+
+    values = list(range(options.size))
+    for name, script in (("while loop over lst[i]", LOOP_SCRIPT), ("lst.sum()", BULK_SCRIPT)):
+        elapsed, total = run(script, values)
+        print(f"{name:<24} {elapsed:8.3f}s  (total {total})")
+
+    lst, other = List(list(values)), List(list(values))
+    numpy = data.numpy
+    with_numpy = time_methods(lst, other) if numpy is not None else None
+    data.numpy = None
+    try:
+        without_numpy = time_methods(lst, other)
+    finally:
+        data.numpy = numpy
+
+    for index, (name, elapsed) in enumerate(without_numpy):
+        line = f"{name:<24} {elapsed:8.4f}s pure Python"
+        if with_numpy is not None:
+            line += f"  {with_numpy[index][1]:8.4f}s NumPy"
+        print(line)
+    if with_numpy is None:
+        print("NumPy is not installed; only the pure-Python path was timed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Checks and times deeply nested programs.
+
+Generates programs with very long operator chains (100k terms by default),
+long runs of unary operators and nested if blocks, runs each one through
+the whole pipeline (Parser, Optimizer, resolver) and the explicit-stack
+evaluator (Evaluator.evaluate_iterative), and compares the result with the
+value computed in Python. The recursive evaluator is run as well to show
+where it hits the recursion limit. Finally both evaluators are timed on a
+shallow loop to show the cost of the explicit stack on ordinary programs.
+
+Usage (from the project folder):
+    python bench/bench_deep.py [--terms N] [--depth D]
+
+Exits with status 1 if any result is wrong.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import RegexScanner
+from parser import Parser
+from optimizer import Optimizer
+from resolver import resolve
+from evaluator import Evaluator
+
+
+def sum_chain(terms):
+    """a + a + ... with a = 3; the variable keeps the optimizer from folding it."""
+    return "a = 3\ntotal = " + " + ".join(["a"] * terms) + "\ntotal", 3 * terms
+
+
+def mixed_chain(terms):
+    """a * 2 - a + a * 2 - a ... mixing precedence levels."""
+    parts = ["a * 2" if i % 2 == 0 else "a" for i in range(terms)]
+    text = parts[0] + "".join((" - " if i % 2 else " + ") + part for i, part in enumerate(parts[1:], 1))
+    expected = 6 + sum((-3 if i % 2 else 6) for i in range(1, terms))
+    return "a = 3\nresult = " + text + "\nresult", expected
+
+
+def unary_run(terms):
+    """- - - ... a: a run of unary minus operators."""
+    return "a = 3\nresult = " + "- " * terms + "a\nresult", 3 if terms % 2 == 0 else -3
+
+
+def nested_ifs(depth):
+    """if a > 0 { if a > 0 { ... count = count + 1 ... } } nested depth times."""
+    text = "a = 1\ncount = 0\n" + "if a > 0 { " * depth + "count = count + 1" + " }" * depth + "\ncount"
+    return text, 1
+
+
+def run(text, iterative):
+    """Parse, optimize, resolve and evaluate text; return (result, seconds)."""
+    evaluator = Evaluator()
+    start = time.perf_counter()
+    ast = Optimizer().optimize(Parser(RegexScanner(text)).parse())
+    ast, _ = resolve(ast, evaluator.data)
+    if iterative:
+        result = evaluator.evaluate_iterative(ast)
+    else:
+        result = evaluator.evaluate(ast)
+    return result, time.perf_counter() - start
+
+
+def check(name, text, expected):
+    """Run text with both evaluators; return True if the iterative one is right."""
+    result, elapsed = run(text, iterative=True)
+    ok = result == expected
+    line = f"{name:<28} iterative {'OK ' if ok else 'WRONG'} {elapsed:7.3f}s"
+    try:
+        recursive, elapsed = run(text, iterative=False)
+        line += f"   recursive {'OK ' if recursive == expected else 'WRONG'} {elapsed:7.3f}s"
+    except RecursionError:
+        line += "   recursive RecursionError"
+    print(line)
+    return ok
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Check and time deeply nested programs.")
+    arg_parser.add_argument("--terms", type=int, default=100000, help="terms per generated expression")
+    arg_parser.add_argument("--depth", type=int, default=150,
+                            help="nesting depth of generated if blocks (limited by the parser)")
+    options = arg_parser.parse_args(argv)
+
+    cases = [
+        (f"sum chain ({options.terms})", *sum_chain(options.terms)),
+        (f"mixed chain ({options.terms})", *mixed_chain(options.terms)),
+        (f"unary run ({options.terms})", *unary_run(options.terms)),
+        (f"nested ifs ({options.depth})", *nested_ifs(options.depth)),
+    ]
+    all_ok = True
+    for name, text, expected in cases:
+        all_ok = check(name, text, expected) and all_ok
+
+    loop = "i = 0\ntotal = 0\nwhile i < 100000 { i = i + 1 total = total + i % 7 }\ntotal"
+    for iterative in (False, True):
+        _, elapsed = run(loop, iterative)
+        print(f"{'shallow loop, ' + ('iterative' if iterative else 'recursive'):<28} {elapsed:7.3f}s")
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark of for loops against the equivalent indexed while loops.
+
+Sums an N-element list with `while i < n { x = lst[i] ... }`, with
+`for x in lst`, and counts with `for i in 0:n` against a while counter, on
+every backend.
+
+Usage (from the project folder):
+    python bench/bench_for.py [--size N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator
+from data import List
+from vm import VM, compile_ast
+
+
+WORKLOADS = [
+    ("while i < n { x = lst[i] }", """
+total = 0
+i = 0
+while i < n {
+    x = lst[i]
+    total = total + x
+    i = i + 1
+}
+"""),
+    ("for x in lst", """
+total = 0
+for x in lst {
+    total = total + x
+}
+"""),
+    ("while i < n { i = i + 1 }", """
+total = 0
+i = 0
+while i < n {
+    total = total + i
+    i = i + 1
+}
+"""),
+    ("for i in 0:n", """
+total = 0
+for i in 0:n {
+    total = total + i
+}
+"""),
+]
+
+MODES = ("tree", "compile", "iterative", "vm")
+
+
+def run(script, mode, size):
+    """Run a script with lst and n predefined; return (seconds, total)."""
+    evaluator = Evaluator()
+    evaluator.data.write('lst', List(list(range(size))))
+    evaluator.data.write('n', size)
+    ast = Parser(Scanner(script)).parse()
+    if mode == "vm":
+        code = compile_ast(ast, evaluator.data)
+        run_code = lambda: VM(evaluator.data).run(code)
+    else:
+        resolved, _ = resolve(ast, evaluator.data)
+        if mode == "compile":
+            run_code = evaluator.compile(resolved)
+        elif mode == "iterative":
+            run_code = lambda: evaluator.evaluate_iterative(resolved)
+        else:
+            run_code = lambda: evaluator.evaluate(resolved)
+    start = time.perf_counter()
+    run_code()
+    return time.perf_counter() - start, evaluator.data.read('total')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare for loops with while loops.")
+    arg_parser.add_argument("--size", type=int, default=100000, help="loop iterations")
+    options = arg_parser.parse_args(argv)
+
+    print(f"{'':<28}" + "".join(f"{mode:>11}" for mode in MODES))
+    for name, script in WORKLOADS:
+        line = f"{name:<28}"
+        for mode in MODES:
+            elapsed, _ = run(script, mode, options.size)
+            line += f"{elapsed:10.3f}s"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
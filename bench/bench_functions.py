@@ -0,0 +1,149 @@
+"""
+Benchmark of user-defined functions.
+
+Times recursive fib(N), with and without `memo`, and a counting loop run
+inside a function against the same loop at the top level, on every
+backend. Calls are then timed with the frame pool turned off (every call
+allocates a new frame) to show what recycling frames saves.
+
+Usage (from the project folder):
+    python bench/bench_functions.py [--fib N] [--size N] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator, allow_call_depth
+import data
+from vm import VM, compile_ast
+
+
+FIB_SCRIPT = """
+func fib(n) {{
+    if n < 2 {{
+        return n
+    }}
+    return fib(n - 1) + fib(n - 2)
+}}
+result = fib({n})
+"""
+
+MEMO_FIB_SCRIPT = "memo " + FIB_SCRIPT.lstrip()
+
+LOOP_IN_FUNCTION = """
+func count(n) {{
+    total = 0
+    i = 0
+    while i < n {{
+        total = total + i % 7
+        i = i + 1
+    }}
+    return total
+}}
+result = count({n})
+"""
+
+LOOP_AT_TOP_LEVEL = """
+total = 0
+i = 0
+while i < {n} {{
+    total = total + i % 7
+    i = i + 1
+}}
+result = total
+"""
+
+# Many short calls, where setting up the frame is a large part of each call
+SHORT_CALLS = """
+func add3(a, b, c) {{
+    d = a + b
+    return d + c
+}}
+result = 0
+for i in 0:{n} {{
+    result = add3(result, i, 1)
+}}
+"""
+
+MODES = ("tree", "compile", "iterative", "vm")
+
+
+def run(script, mode):
+    """Run a script on a fresh evaluator; return (seconds, result)."""
+    evaluator = Evaluator()
+    ast = Parser(Scanner(script)).parse()
+    if mode == "vm":
+        code = compile_ast(ast, evaluator.data)
+        run_code = lambda: VM(evaluator.data).run(code)
+    else:
+        resolved, _ = resolve(ast, evaluator.data)
+        if mode == "compile":
+            run_code = evaluator.compile(resolved)
+        elif mode == "iterative":
+            run_code = lambda: evaluator.evaluate_iterative(resolved)
+        else:
+            run_code = lambda: evaluator.evaluate(resolved)
+    start = time.perf_counter()
+    run_code()
+    return time.perf_counter() - start, evaluator.data.read('result')
+
+
+def best_of(repeat, script, mode):
+    results = [run(script, mode) for _ in range(repeat)]
+    return min(elapsed for elapsed, _ in results), results[0][1]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Time function calls and loops in functions.")
+    arg_parser.add_argument("--fib", type=int, default=20, help="argument of the recursive fib")
+    arg_parser.add_argument("--size", type=int, default=100000, help="loop iterations and short calls")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is reported)")
+    options = arg_parser.parse_args(argv)
+    allow_call_depth(options.fib)
+
+    workloads = [
+        (f"fib({options.fib})", FIB_SCRIPT.format(n=options.fib)),
+        (f"memo fib({options.fib})", MEMO_FIB_SCRIPT.format(n=options.fib)),
+        ("loop in a function", LOOP_IN_FUNCTION.format(n=options.size)),
+        ("loop at top level", LOOP_AT_TOP_LEVEL.format(n=options.size)),
+        (f"{options.size} short calls", SHORT_CALLS.format(n=options.size)),
+    ]
+
+    print(f"{'':<24}" + "".join(f"{mode:>11}" for mode in MODES))
+    for name, script in workloads:
+        line = f"{name:<24}"
+        expected = None
+        for mode in MODES:
+            elapsed, result = best_of(options.repeat, script, mode)
+            if expected is None:
+                expected = result
+            elif result != expected:
+                print(f"Error: {mode} returned {result}, expected {expected}")
+                return 1
+            line += f"{elapsed:10.3f}s"
+        print(line)
+
+    print("\nframe pool on / off:")
+    pool_size = data.FRAME_POOL_SIZE
+    for name, script in (workloads[0], workloads[4]):
+        for mode in ("tree", "vm"):
+            pooled, _ = best_of(options.repeat, script, mode)
+            data.FRAME_POOL_SIZE = 0
+            try:
+                unpooled, _ = best_of(options.repeat, script, mode)
+            finally:
+                data.FRAME_POOL_SIZE = pool_size
+            print(f"  {name:<22} {mode:<5} pooled {pooled:7.3f}s  new frames {unpooled:7.3f}s "
+                  f"({unpooled / pooled:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Benchmark of saving and loading a large interpreter state as an image.
+
+Builds a state of about --megabytes MB in a Data store, the way a long
+script would leave it:
+- a list of ints and a list of floats (typed storage, most of the size)
+- a list of small records [name, number, float] (generic storage, written
+  element by element) whose names repeat
+- a second variable referring to the int list, and a list of both lists
+  (shared references, written once)
+
+Then times save_image() and load_image(), reports the image size and the
+throughput, and checks that the loaded state matches. With --pickle the
+same variables are also saved and loaded with pickle, for comparison.
+
+Usage (from the project folder):
+    python bench/bench_image.py [--megabytes MB] [--path FILE] [--pickle]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import Data, List
+from image import save_image, load_image, defined_variables
+
+
+def build_state(megabytes):
+    """Return a Data store with about megabytes MB of variables."""
+    size = megabytes * 1e6
+    ints = int(size * 0.6 / 8)
+    floats = int(size * 0.3 / 8)
+    records = int(size * 0.1 / 60)  # a record costs about 60 bytes in memory
+
+    data = Data()
+    data.write('ints', List(array('q', range(ints))))
+    data.write('floats', List(array('d', (i * 0.25 for i in range(floats)))))
+    names = [f"item{i}" for i in range(1000)]
+    data.write('records', List([List([names[i % 1000], i, i * 0.5]) for i in range(records)]))
+    data.write('same_ints', data.read('ints'))
+    data.write('both', List([data.read('ints'), data.read('floats')]))
+    data.write('label', "benchmark state")
+    return data
+
+
+def check(original, loaded):
+    """Return a list of differences between two states (empty if they match)."""
+    problems = []
+    for name in ('ints', 'floats', 'records'):
+        before, after = original.read(name), loaded.read(name)
+        if before.length != after.length:
+            problems.append(f"{name}: {after.length} elements, expected {before.length}")
+        elif before.length and str(before.get(before.length - 1)) != str(after.get(after.length - 1)):
+            problems.append(f"{name}: last element differs")
+    if loaded.read('same_ints') is not loaded.read('ints'):
+        problems.append("same_ints is not the same List as ints")
+    if loaded.read('both').get(1) is not loaded.read('floats'):
+        problems.append("both[1] is not the same List as floats")
+    return problems
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Time saving and loading a large state image.")
+    arg_parser.add_argument("--megabytes", type=int, default=1024, help="approximate size of the state")
+    arg_parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "bench_state.img"),
+                            help="image file written and read")
+    arg_parser.add_argument("--pickle", action="store_true", help="also time pickle on the same variables")
+    options = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    data = build_state(options.megabytes)
+    print(f"Built a {options.megabytes} MB state in {time.perf_counter() - start:.1f}s")
+
+    try:
+        start = time.perf_counter()
+        size = save_image(options.path, data)
+        saved = time.perf_counter() - start
+
+        loaded = Data()
+        start = time.perf_counter()
+        load_image(options.path, loaded)
+        load = time.perf_counter() - start
+
+        print(f"  image   {size / 1e6:9.1f} MB  save {saved:7.2f}s ({size / 1e6 / saved:7.1f} MB/s)  "
+              f"load {load:7.2f}s ({size / 1e6 / load:7.1f} MB/s)")
+        problems = check(data, loaded)
+        del loaded
+
+        if options.pickle:
+            variables = dict(defined_variables(data))
+            start = time.perf_counter()
+            with open(options.path, 'wb') as f:
+                pickle.dump(variables, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            with open(options.path, 'rb') as f:
+                pickle.load(f)
+            load = time.perf_counter() - start
+            print(f"  pickle  {size / 1e6:9.1f} MB  save {saved:7.2f}s ({size / 1e6 / saved:7.1f} MB/s)  "
+                  f"load {load:7.2f}s ({size / 1e6 / load:7.1f} MB/s)")
+    finally:
+        if os.path.exists(options.path):
+            os.remove(options.path)
+
+    for problem in problems:
+        print(f"Error: {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
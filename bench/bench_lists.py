@@ -0,0 +1,115 @@
+"""
+Benchmark of growing lists in the language.
+
+Builds an N-element list with `lst = lst + [i]` and with `lst.append(i)`.
+The concatenation is also timed with the previous copying implementation of
+List concatenation (a new Python list on every `+`), which is quadratic.
+Finally the memory of int and float lists is compared between the typed
+array storage and a generic Python list.
+
+Usage (from the project folder):
+    python bench/bench_lists.py [--size N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator
+import data
+from data import List
+
+
+CONCAT_SCRIPT = """
+lst = []
+i = 0
+while i < {size} {{
+    lst = lst + [i]
+    i = i + 1
+}}
+"""
+
+APPEND_SCRIPT = """
+lst = []
+i = 0
+while i < {size} {{
+    lst.append(i)
+    i = i + 1
+}}
+"""
+
+
+def copying_concat(self, other):
+    """List concatenation as it was before copy-on-write storage."""
+    result = List()
+    result.items = list(self.elements) + list(other.elements)
+    result.length = len(result.items)
+    return result
+
+
+def run(script, size):
+    """Run a script with a fresh Evaluator; return (seconds, final list length)."""
+    evaluator = Evaluator()
+    ast, _ = resolve(Parser(Scanner(script.format(size=size))).parse(), evaluator.data)
+    code = evaluator.compile(ast)
+    start = time.perf_counter()
+    code()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(evaluator.data.read('lst').elements)
+
+
+def bytes_per_element(build, size):
+    """Return the bytes per element still allocated once build() has returned."""
+    tracemalloc.start()
+    result = build()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return current / size
+
+
+def measure_memory(size):
+    """Print bytes per element of int and float Lists, typed and generic."""
+    for name, value in (("int", lambda i: i * 1000003), ("float", lambda i: i * 0.5)):
+        typed = bytes_per_element(lambda: List([value(i) for i in range(size)]), size)
+        threshold = data.TYPED_STORAGE_THRESHOLD
+        data.TYPED_STORAGE_THRESHOLD = size + 1
+        try:
+            generic = bytes_per_element(lambda: List([value(i) for i in range(size)]), size)
+        finally:
+            data.TYPED_STORAGE_THRESHOLD = threshold
+        print(f"{name + ' list memory':<28} {typed:6.1f} bytes/element typed  "
+              f"{generic:6.1f} bytes/element generic")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare ways of growing a list.")
+    arg_parser.add_argument("--size", type=int, default=100000, help="number of elements")
+    options = arg_parser.parse_args(argv)
+
+    cases = [("lst = lst + [i]", CONCAT_SCRIPT), ("lst.append(i)", APPEND_SCRIPT)]
+    for name, script in cases:
+        elapsed, length = run(script, options.size)
+        print(f"{name:<28} {elapsed:8.3f}s  ({length} elements)")
+
+    current = List.concat
+    List.concat = copying_concat
+    try:
+        elapsed, length = run(CONCAT_SCRIPT, options.size)
+    finally:
+        List.concat = current
+    print(f"{'lst = lst + [i] (copying)':<28} {elapsed:8.3f}s  ({length} elements)")
+
+    measure_memory(options.size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Micro-benchmarks of loops that continue or break often.
+
+Each workload runs on the tree-walking evaluator and the closure compiler,
+both with the current break/continue (returned loop signals) and with the
+previous implementation that raised BreakException / ContinueException,
+reproduced here by RaisingEvaluator. For the tree walker the signal version
+is also run through the same kind of subclass (SignalEvaluator), so both
+sides pay the same extra dispatch cost. The bytecode VM is timed as well.
+
+Usage (from the project folder):
+    python bench/bench_loops.py [--size N] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import (Evaluator, BreakException, ContinueException,
+                       BREAK_SIGNAL, CONTINUE_SIGNAL)
+from vm import VM, compile_ast
+
+
+WORKLOADS = {
+    # Most iterations end in a continue inside an if
+    "continue 9 of 10": """
+i = 0
+total = 0
+while i < {size} {{
+    i = i + 1
+    if i % 10 != 0 {{
+        continue
+    }}
+    total = total + i
+}}
+""",
+    # Nested loops like example5: the inner loop skips one value per pass
+    "nested continue": """
+outer = 0
+count = 0
+while outer < {size} / 10 {{
+    outer = outer + 1
+    inner = 0
+    while inner < 10 {{
+        inner = inner + 1
+        if inner == 2 {{
+            continue
+        }}
+        count = count + 1
+    }}
+}}
+""",
+    # Short inner loops left with break
+    "break after 3": """
+outer = 0
+count = 0
+while outer < {size} / 3 {{
+    outer = outer + 1
+    inner = 0
+    while true {{
+        inner = inner + 1
+        if inner == 3 {{
+            break
+        }}
+        count = count + 1
+    }}
+}}
+""",
+}
+
+
+class RaisingEvaluator(Evaluator):
+    """The evaluator with break and continue raising exceptions, as before."""
+
+    def _eval(self, node):
+        tag = node[0] if isinstance(node, tuple) and node else None
+        if tag == 'BREAK':
+            raise BreakException()
+        if tag == 'CONTINUE':
+            raise ContinueException()
+        if tag == 'BLOCK':
+            result = None
+            for stmt in node[1]:
+                result = self._eval(stmt)
+            return result
+        if tag == 'WHILE':
+            result = None
+            while self._eval(node[1]):
+                try:
+                    result = self._eval(node[2])
+                except BreakException:
+                    break
+                except ContinueException:
+                    continue
+            return result
+        return super()._eval(node)
+
+    def _compile(self, node):
+        tag = node[0] if isinstance(node, tuple) and node else None
+        if tag == 'BREAK':
+            def break_loop():
+                raise BreakException()
+            return break_loop
+        if tag == 'CONTINUE':
+            def continue_loop():
+                raise ContinueException()
+            return continue_loop
+        if tag == 'BLOCK':
+            statements = [self._compile(stmt) for stmt in node[1]]
+
+            def block():
+                result = None
+                for stmt in statements:
+                    result = stmt()
+                return result
+            return block
+        if tag == 'WHILE':
+            condition = self._compile(node[1])
+            body = self._compile(node[2])
+
+            def while_loop():
+                result = None
+                while condition():
+                    try:
+                        result = body()
+                    except BreakException:
+                        break
+                    except ContinueException:
+                        continue
+                return result
+            return while_loop
+        return super()._compile(node)
+
+
+class SignalEvaluator(Evaluator):
+    """Evaluator._eval's loop handling behind the same override as RaisingEvaluator."""
+
+    def _eval(self, node):
+        tag = node[0] if isinstance(node, tuple) and node else None
+        if tag == 'BREAK':
+            return BREAK_SIGNAL
+        if tag == 'CONTINUE':
+            return CONTINUE_SIGNAL
+        if tag == 'BLOCK':
+            result = None
+            for stmt in node[1]:
+                result = self._eval(stmt)
+                if result is BREAK_SIGNAL or result is CONTINUE_SIGNAL:
+                    break
+            return result
+        if tag == 'WHILE':
+            result = None
+            while self._eval(node[1]):
+                value = self._eval(node[2])
+                if value is BREAK_SIGNAL:
+                    break
+                if value is not CONTINUE_SIGNAL:
+                    result = value
+            return result
+        return super()._eval(node)
+
+
+def run(evaluator_class, mode, script):
+    """Run a script on a fresh evaluator; return (seconds, variables)."""
+    evaluator = evaluator_class()
+    ast = Parser(Scanner(script)).parse()
+    if mode == "vm":
+        code = compile_ast(ast, evaluator.data)
+        run_code = lambda: VM(evaluator.data).run(code)
+    else:
+        resolved, _ = resolve(ast, evaluator.data)
+        if mode == "compile":
+            run_code = evaluator.compile(resolved)
+        else:
+            run_code = lambda: evaluator.evaluate(resolved)
+    start = time.perf_counter()
+    run_code()
+    return time.perf_counter() - start, evaluator.data.all()
+
+
+def best_of(repeat, evaluator_class, mode, script):
+    results = [run(evaluator_class, mode, script) for _ in range(repeat)]
+    return min(elapsed for elapsed, _ in results), results[0][1]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Time loops with frequent break/continue.")
+    arg_parser.add_argument("--size", type=int, default=100000, help="loop iterations per workload")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per case (best is reported)")
+    options = arg_parser.parse_args(argv)
+
+    for name, template in WORKLOADS.items():
+        script = template.format(size=options.size)
+        print(f"{name}:")
+        cases = (("tree", SignalEvaluator), ("compile", Evaluator))
+        for mode, signal_class in cases:
+            raising, expected = best_of(options.repeat, RaisingEvaluator, mode, script)
+            signals, actual = best_of(options.repeat, signal_class, mode, script)
+            if actual != expected:
+                print("Error: implementations produced different variables")
+                return 1
+            print(f"  {mode:<8} exceptions {raising:7.3f}s  signals {signals:7.3f}s  "
+                  f"({raising / signals:.2f}x)")
+        for mode in ("tree", "vm"):
+            elapsed, _ = best_of(options.repeat, Evaluator, mode, script)
+            print(f"  {mode:<8} {elapsed:7.3f}s  (Evaluator{' / VM' if mode == 'vm' else ''} as shipped)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Benchmark comparing the character scanner (Scanner) with the regex scanner
+(RegexScanner) on large generated scripts.
+
+Usage (from the project folder):
+    python bench/bench_scanner.py [--lines N] [--repeat R]
+
+Both scanners are checked to produce the same token stream before timing.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner, RegexScanner
+
+
+def generate_script(lines):
+    """
+    Generate a literal-heavy script with the given number of lines.
+    Mixes numbers, floats, strings with escapes, keywords, operators and comments.
+    """
+    parts = []
+    for i in range(lines):
+        kind = i % 5
+        if kind == 0:
+            parts.append(f"value_{i} = {i} * 3.25 + ({i} % 7) - 12")
+        elif kind == 1:
+            parts.append(f'message_{i} = "line {i}: \\"quoted\\" text\\n" + "more text"')
+        elif kind == 2:
+            parts.append(f"if value_{i - 2} >= {i} and not false {{ print value_{i - 2} }} else {{ print {i}.5 }}")
+        elif kind == 3:
+            parts.append(f"items = [{i}, {i + 1}, {i + 2}, \"{i}\", true]   # comment {i}")
+        else:
+            parts.append(f"while counter != {i} {{ counter = counter + 1 break }}")
+    return "\n".join(parts) + "\n"
+
+
+def scan_all(scanner_class, text):
+    """Tokenise text completely and return the list of tokens (without EOF)."""
+    scanner = scanner_class(text)
+    tokens = []
+    token = scanner.get_next_token()
+    while token.type != 'EOF':
+        tokens.append(token)
+        token = scanner.get_next_token()
+    return tokens
+
+
+def time_scanner(scanner_class, text, repeat):
+    """Return the best wall time over repeat runs and the token count."""
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(scan_all(scanner_class, text))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compare scanner implementations.")
+    arg_parser.add_argument("--lines", type=int, default=50000, help="lines of generated source")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per scanner (best is reported)")
+    options = arg_parser.parse_args(argv)
+
+    text = generate_script(options.lines)
+    print(f"Input: {options.lines} lines, {len(text) / 1e6:.2f} MB")
+
+    expected = [(t.type, t.value) for t in scan_all(Scanner, text)]
+    actual = [(t.type, t.value) for t in scan_all(RegexScanner, text)]
+    if expected != actual:
+        print("Error: scanners produced different token streams")
+        return 1
+
+    results = {}
+    for scanner_class in (Scanner, RegexScanner):
+        elapsed, count = time_scanner(scanner_class, text, options.repeat)
+        results[scanner_class.__name__] = elapsed
+        print(f"{scanner_class.__name__:<14} {elapsed:8.3f}s  {count / elapsed:12,.0f} tokens/s")
+
+    print(f"Speed-up: {results['Scanner'] / results['RegexScanner']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Benchmark of building a long string with `s = s + "..."` in a loop.
+
+Builds a 10 MB string from 1M appends of 10 characters on every backend,
+with concatenation results kept as a Rope and joined once at the end.
+Then compares ropes with plain str concatenation (ROPE_MIN_LENGTH raised
+so no rope is built), which copies the whole string on every append, on
+a smaller number of appends (--compare), since the copying makes plain
+concatenation quadratic.
+
+Usage (from the project folder):
+    python bench/bench_strings.py [--appends N] [--compare N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator
+from vm import VM, compile_ast
+import data
+
+
+SCRIPT = """
+s = ""
+for i in 0:{n} {{
+    s = s + "0123456789"
+}}
+"""
+
+MODES = ("tree", "compile", "iterative", "vm")
+
+
+def run(n, mode):
+    """Build the string on a fresh evaluator; return (seconds, length of the joined string)."""
+    evaluator = Evaluator()
+    ast = Parser(Scanner(SCRIPT.format(n=n))).parse()
+    if mode == "vm":
+        code = compile_ast(ast, evaluator.data)
+        run_code = lambda: VM(evaluator.data).run(code)
+    else:
+        resolved, _ = resolve(ast, evaluator.data)
+        if mode == "compile":
+            run_code = evaluator.compile(resolved)
+        elif mode == "iterative":
+            run_code = lambda: evaluator.evaluate_iterative(resolved)
+        else:
+            run_code = lambda: evaluator.evaluate(resolved)
+    start = time.perf_counter()
+    run_code()
+    # Joining the rope is part of the work
+    text = data.materialize(evaluator.data.read('s'))
+    return time.perf_counter() - start, len(text)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Time building a long string by appending.")
+    arg_parser.add_argument("--appends", type=int, default=1000000, help="appends of 10 characters")
+    arg_parser.add_argument("--compare", type=int, default=60000,
+                            help="appends for the comparison with plain str concatenation")
+    options = arg_parser.parse_args(argv)
+
+    print(f"{options.appends} appends, {options.appends * 10 / 1e6:.1f} MB:")
+    for mode in MODES:
+        elapsed, length = run(options.appends, mode)
+        if length != options.appends * 10:
+            print(f"Error: {mode} built {length} characters, expected {options.appends * 10}")
+            return 1
+        print(f"  {mode:<10} {elapsed:8.3f}s  {options.appends / elapsed:12,.0f} appends/s")
+
+    print(f"\n{options.compare} appends, rope / plain str:")
+    rope_min_length = data.ROPE_MIN_LENGTH
+    for mode in ("tree", "vm"):
+        rope, _ = run(options.compare, mode)
+        data.ROPE_MIN_LENGTH = sys.maxsize
+        try:
+            plain, _ = run(options.compare, mode)
+        finally:
+            data.ROPE_MIN_LENGTH = rope_min_length
+        print(f"  {mode:<10} rope {rope:7.3f}s  plain {plain:7.3f}s  ({plain / rope:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Benchmark suite for the scanner, parser and evaluator, with a regression check.
+
+Each workload exercises one stage on generated input:
+- scan:  tokenising a large literal-heavy script with Scanner and RegexScanner
+- parse: parsing deeply nested if/while blocks and long expressions from
+         tokens scanned beforehand, so only Parser is timed
+- eval:  arithmetic loops, string concatenation, list growth and loops
+         that break/continue often, on one backend (--mode)
+
+For every workload the runner reports operations per second (tokens for
+scan and parse, loop iterations for eval), timed as the best of --repeat
+runs, and the peak memory allocated during a separate run traced with
+tracemalloc (tracing slows the code down, so it is never timed).
+
+Results can be saved as JSON and compared with a saved baseline. A workload
+is flagged as a regression if its ops/sec dropped, or its peak memory grew,
+by more than --threshold percent; the runner then exits with status 1.
+
+Usage (from the project folder):
+    python bench/bench_suite.py [--stage scan|parse|eval] [--scale F] [--repeat R]
+                                [--mode tree|compile|iterative|vm] [--no-memory]
+                                [--save results.json] [--baseline baseline.json]
+                                [--threshold PERCENT]
+
+For example, keep a baseline and check a change against it:
+    python bench/bench_suite.py --save baseline.json
+    python bench/bench_suite.py --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scanner import Scanner, RegexScanner
+from parser import Parser
+from resolver import resolve
+from evaluator import Evaluator
+from vm import VM, compile_ast
+from bench_scanner import generate_script, scan_all
+
+
+# Bump when the layout of the JSON results changes
+FORMAT_VERSION = 1
+
+MODES = ("tree", "compile", "iterative", "vm")
+
+
+# ==== Parser input ====
+
+class TokenReplay:
+    """Feeds the Parser a list of tokens scanned beforehand."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def get_next_token(self):
+        token = self.tokens[self.position]
+        if self.position < len(self.tokens) - 1:
+            self.position += 1
+        return token
+
+    def peek_next_token(self):
+        return self.tokens[self.position]
+
+
+def nested_blocks(count, depth):
+    """count statements of if and while blocks nested depth levels deep."""
+    parts = []
+    for i in range(count):
+        opening = "".join(("if" if level % 2 == 0 else "while") + f" x{level} < {i} {{ "
+                          for level in range(depth))
+        parts.append(opening + f"y = y + {i}" + " }" * depth)
+    return "\n".join(parts) + "\n"
+
+
+def long_expressions(count, terms):
+    """count assignments of expressions with terms operands mixing precedence levels."""
+    parts = []
+    for i in range(count):
+        expression = " + ".join(f"a{j % 10} * {j} - (b - {i})" for j in range(terms))
+        parts.append(f"value = {expression}")
+    return "\n".join(parts) + "\n"
+
+
+def scan_with_eof(text):
+    tokens = scan_all(Scanner, text)
+    tokens.append(Scanner("").get_next_token())
+    return tokens
+
+
+# ==== Evaluator workloads (each runs {n} loop iterations) ====
+
+ARITHMETIC = """
+total = 0
+i = 0
+while i < {n} {{
+    total = total + i * 3 % 7 - i / 4
+    i = i + 1
+}}
+"""
+
+STRINGS = """
+text = ""
+i = 0
+while i < {n} {{
+    text = text + "ab"
+    i = i + 1
+}}
+"""
+
+LIST_GROWTH = """
+items = []
+for i in 0:{n} {{
+    items.append(i * 2)
+}}
+"""
+
+BREAK_CONTINUE = """
+count = 0
+outer = 0
+while outer < {n} / 10 {{
+    outer = outer + 1
+    inner = 0
+    while true {{
+        inner = inner + 1
+        if inner % 3 == 0 {{
+            continue
+        }}
+        if inner > 10 {{
+            break
+        }}
+        count = count + 1
+    }}
+}}
+"""
+
+
+def prepare_program(script, mode):
+    """
+    Parse a script once; return a function that runs it on a fresh
+    Evaluator with the given backend (resolving or compiling it first).
+    """
+    ast = Parser(Scanner(script)).parse()
+
+    def run():
+        evaluator = Evaluator()
+        if mode == "vm":
+            VM(evaluator.data).run(compile_ast(ast, evaluator.data))
+            return
+        resolved, _ = resolve(ast, evaluator.data)
+        if mode == "compile":
+            evaluator.compile(resolved)()
+        elif mode == "iterative":
+            evaluator.evaluate_iterative(resolved)
+        else:
+            evaluator.evaluate(resolved)
+    return run
+
+
+# ==== Suite ====
+
+def build_workloads(scale, mode):
+    """
+    Return the workloads as (name, stage, operations, run) tuples, where
+    run() performs the given number of operations once.
+    """
+    def scaled(n):
+        return max(1, int(n * scale))
+
+    workloads = []
+
+    text = generate_script(scaled(10000))
+    token_count = len(scan_all(Scanner, text))
+    for scanner_class in (Scanner, RegexScanner):
+        workloads.append((f"scan literals ({scanner_class.__name__})", "scan", token_count,
+                          lambda scanner_class=scanner_class: scan_all(scanner_class, text)))
+
+    for name, source in (("parse nested if/while", nested_blocks(scaled(2000), 40)),
+                         ("parse long expressions", long_expressions(scaled(200), 100))):
+        tokens = scan_with_eof(source)
+        workloads.append((name, "parse", len(tokens),
+                          lambda tokens=tokens: Parser(TokenReplay(tokens)).parse()))
+
+    for name, script, n in (("eval arithmetic loop", ARITHMETIC, scaled(30000)),
+                            ("eval string concatenation", STRINGS, scaled(20000)),
+                            ("eval list growth", LIST_GROWTH, scaled(50000)),
+                            ("eval break/continue", BREAK_CONTINUE, scaled(30000))):
+        workloads.append((f"{name} ({mode})", "eval", n, prepare_program(script.format(n=n), mode)))
+    return workloads
+
+
+def measure(run, operations, repeat, memory=True):
+    """
+    Time run() and, if memory is True, trace its memory in one more run.
+    Returns the result record of a workload (peak_bytes is None untraced).
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        'operations': operations,
+        'seconds': best,
+        'ops_per_sec': operations / best if best > 0 else float('inf'),
+        'peak_bytes': peak,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Returns:
+    - (lines, regressions): Report lines and the names of the workloads that
+      got slower or used more memory than threshold (a fraction) allows
+    """
+    lines = [f"{'workload':<40} {'ops/sec':>9} {'peak mem':>9}"]
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            lines.append(f"{name:<40} {'new':>9} {'new':>9}")
+            continue
+        speed = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        memory = None
+        if result['peak_bytes'] is not None and before['peak_bytes']:
+            memory = result['peak_bytes'] / before['peak_bytes'] - 1
+        flags = []
+        if speed < -threshold:
+            flags.append("slower")
+        if memory is not None and memory > threshold:
+            flags.append("more memory")
+        if flags:
+            regressions.append(name)
+        line = f"{name:<40} {speed:+9.1%} " + (f"{memory:+9.1%}" if memory is not None else f"{'-':>9}")
+        if flags:
+            line += "  REGRESSION (" + ", ".join(flags) + ")"
+        lines.append(line)
+    return lines, regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Run the benchmark suite and check for regressions.")
+    arg_parser.add_argument("--stage", choices=("scan", "parse", "eval"), action="append",
+                            help="run only this stage (may be repeated)")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the workload sizes")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="timed runs per workload (best is reported)")
+    arg_parser.add_argument("--mode", choices=MODES, default="tree", help="backend of the eval workloads")
+    arg_parser.add_argument("--no-memory", dest="memory", action="store_false",
+                            help="skip the tracemalloc runs (they are much slower than the timed runs)")
+    arg_parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    arg_parser.add_argument("--baseline", metavar="FILE", help="compare with results saved by --save")
+    arg_parser.add_argument("--threshold", type=float, default=10.0,
+                            help="percent change reported as a regression (default: 10)")
+    options = arg_parser.parse_args(argv)
+
+    results = {}
+    print(f"{'workload':<40} {'ops':>10} {'seconds':>9} {'ops/sec':>13} {'peak mem':>11}")
+    for name, stage, operations, run in build_workloads(options.scale, options.mode):
+        if options.stage and stage not in options.stage:
+            continue
+        result = measure(run, operations, options.repeat, options.memory)
+        result['stage'] = stage
+        results[name] = result
+        peak = f"{result['peak_bytes'] / 1e6:9.2f}MB" if result['peak_bytes'] is not None else f"{'-':>11}"
+        print(f"{name:<40} {operations:>10} {result['seconds']:9.3f} {result['ops_per_sec']:13,.0f} {peak}")
+
+    report = {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'scale': options.scale,
+        'mode': options.mode,
+        'results': results,
+    }
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {options.save}")
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('version') != FORMAT_VERSION:
+            print(f"Error: {options.baseline} has format version {baseline.get('version')}, "
+                  f"expected {FORMAT_VERSION}")
+            return 1
+        if baseline.get('scale') != options.scale:
+            print(f"Warning: baseline was run with --scale {baseline.get('scale')}; "
+                  f"ops/sec are still comparable but peak memory is not")
+        lines, regressions = compare(results, baseline['results'], options.threshold / 100)
+        print(f"\nChange against {options.baseline} (threshold {options.threshold:g}%):")
+        for line in lines:
+            print(line)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Benchmark of token memory use and construction time.
+
+Compares the slotted Token and PositionedToken classes with the previous token
+layout (a per-instance __dict__ and a type check in __init__), which is
+reproduced here as DictToken.
+
+Usage (from the project folder):
+    python bench/bench_tokens.py [--lines N]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokens import Token, PositionedToken
+from scanner import RegexScanner
+from bench_scanner import generate_script
+
+
+class DictToken:
+    """The token layout before slots were introduced."""
+
+    TYPE_DISPLAY = Token.TYPE_DISPLAY
+
+    def __init__(self, token_type, value=None):
+        if token_type not in self.TYPE_DISPLAY:
+            raise ValueError(f"Invalid token type: {token_type}")
+        self.type = token_type
+        self.value = value
+
+
+def measure(build):
+    """Return (peak bytes allocated, seconds, result) for build()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed, result
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Measure bytes per token.")
+    arg_parser.add_argument("--lines", type=int, default=50000, help="lines of generated source")
+    options = arg_parser.parse_args(argv)
+
+    # Token values (numbers, strings) are shared by all layouts and created
+    # before measuring, so only the token objects themselves are counted.
+    source = RegexScanner(generate_script(options.lines)).tokens
+    pairs = [(t.type, t.value) for t in source]
+    count = len(pairs)
+    print(f"Tokens: {count:,}")
+
+    layouts = [
+        ("dict + type check", lambda: [DictToken(t, v) for t, v in pairs]),
+        ("slots", lambda: [Token(t, v) for t, v in pairs]),
+        ("slots + positions", lambda: [PositionedToken(t, v, i // 40 + 1, i % 40 + 1)
+                                       for i, (t, v) in enumerate(pairs)]),
+    ]
+    list_overhead = measure(lambda: [None] * count)[0]
+    for name, build in layouts:
+        peak, elapsed, _ = measure(build)
+        per_token = (peak - list_overhead) / count
+        print(f"{name:<20} {per_token:7.1f} bytes/token  {count / elapsed:12,.0f} tokens/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Execution budgets: limits on the work one run of a program may do.
+
+A Budget set as the `budget` of an Evaluator or VM (or passed to
+Interpreter for its sessions, or given with the --max-* options of main.py)
+stops a run that goes over one of its limits with a BudgetExceededError:
+
+- max_steps: loop iterations and function calls
+- max_seconds: wall time
+- max_list_elements: elements added to lists (list literals, append, the
+  right operand of a list +, lists returned by list methods)
+- max_string_chars: characters of the strings built by + and by string
+  methods (appending to a Rope counts only the appended text)
+
+The counters start from zero at the start of every run (evaluate(),
+evaluate_iterative(), a compiled program, VM.run()), unless per_run is
+False: then they are started once with start() and cover all the runs
+that follow, such as the statements of a script run with --stream. A
+limit of None is no limit. The memory counters add up what a run builds, not what it
+still holds, so they also bound the work spent building values.
+
+Errors name the source line the run was at when it is known: for the
+tree backends from `lines` (id(node) -> line, filled by resolve() for a
+program scanned with positions=True, as for the profiler), for the VM
+from the line table the Compiler keeps in each Code object.
+
+Steps and time are checked in bulk: the backends count steps down in the
+runner's `countdown` and call run_safepoint() (see evaluator.py) only
+every SAFEPOINT_INTERVAL steps, or at the step that goes over max_steps.
+So max_seconds is enforced within SAFEPOINT_INTERVAL steps, and a single
+long step (a bulk method on a huge list) is not interrupted. Lists and
+strings are counted when they are built, since a single step can double a
+list.
+"""
+
+import time
+from itertools import groupby
+
+from data import List, Rope, TEXT_TYPES
+
+
+# Steps (loop iterations and function calls) between two safepoints
+SAFEPOINT_INTERVAL = 1000
+
+# Functions of the call chain named in a BudgetExceededError message
+MAX_CALLS_SHOWN = 8
+
+
+class BudgetExceededError(RuntimeError):
+    """
+    Raised when a run goes over a limit of its Budget.
+
+    Attributes:
+    - limit (str): 'steps', 'seconds', 'list elements' or 'string characters'
+    - maximum: The limit's value
+    - where (str): What the program was doing, e.g. "in a while loop"
+    - functions (list): Names of the functions that were running, innermost
+      first, added as the error leaves their calls
+    """
+
+    def __init__(self, limit, maximum, where):
+        super().__init__(limit, maximum, where)
+        self.limit = limit
+        self.maximum = maximum
+        self.where = where
+        self.functions = []
+
+    def __str__(self):
+        message = f"more than {self.maximum} {self.limit}"
+        if self.where:
+            message += f" {self.where}"
+        # Recursive calls of a function are shown once, with their number
+        calls = [[name, len(list(group))] for name, group in groupby(self.functions)]
+        for position, (name, count) in enumerate(calls[:MAX_CALLS_SHOWN]):
+            message += " in function " if position == 0 else ", called from "
+            message += name if count == 1 else f"{name} ({count} nested calls)"
+        if len(calls) > MAX_CALLS_SHOWN:
+            message += ", ..."
+        return message
+
+
+# Tags of for loop nodes (resolved and not) -> how their loop variable is named
+FOR_NAMES = {'FOR_SLOT': 2, 'FOR_RANGE_SLOT': 2, 'FOR_LOCAL': 2, 'FOR_RANGE_LOCAL': 2}
+
+
+def describe_location(where, lines=None):
+    """
+    Describe where a run was, from what the backends pass as `where`: a
+    loop or other AST node, a Function being called, or the Code object and
+    offset of a VM instruction. The source line is added when it is known,
+    from lines (id(node) -> line) for a node or the Code's line table.
+    """
+    if where is None:
+        return ""
+    if hasattr(where, 'local_names'):
+        return f"calling {where.name}()"
+    if hasattr(where[0], 'describe'):
+        code, offset = where
+        return code.describe(offset)
+    tag = where[0]
+    if tag == 'WHILE':
+        description = "in a while loop"
+    elif tag in FOR_NAMES:
+        description = f"in a for loop over {where[FOR_NAMES[tag]]}"
+    elif tag in ('FOR', 'FOR_RANGE'):
+        description = f"in a for loop over {where[1].value}"
+    elif tag == 'LIST_LITERAL':
+        description = "building a list"
+    elif tag == 'LIST_APPEND':
+        description = "appending to a list"
+    elif tag == 'METHOD_CALL':
+        description = f"calling .{where[2].value}()"
+    else:
+        description = "in a + operation"
+    line = lines.get(id(where)) if lines is not None else None
+    return f"{description} at line {line}" if line is not None else description
+
+
+class Budget:
+    """
+    Limits of a run and what the current run has used of them.
+
+    Parameters:
+    - max_steps (int or None): Loop iterations and function calls
+    - max_seconds (float or None): Wall time
+    - max_list_elements (int or None): Elements added to lists
+    - max_string_chars (int or None): Characters of the strings built
+
+    Attributes:
+    - per_run (bool): Start the counters at every run (True), or only when
+      start() is called, to share the limits between runs (False)
+    - lines (dict or None): id(node) -> source line of the program being
+      run (see resolve()), to name the line in errors
+    """
+
+    def __init__(self, max_steps=None, max_seconds=None, max_list_elements=None, max_string_chars=None):
+        for name, value in (('max_steps', max_steps), ('max_seconds', max_seconds),
+                            ('max_list_elements', max_list_elements), ('max_string_chars', max_string_chars)):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} cannot be negative")
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.max_list_elements = max_list_elements
+        self.max_string_chars = max_string_chars
+        self.per_run = True
+        self.lines = None
+        self.start()
+
+    def copy(self):
+        """Return a new Budget with the same limits, e.g. for another session."""
+        return Budget(self.max_steps, self.max_seconds, self.max_list_elements, self.max_string_chars)
+
+    def start(self):
+        """Reset the counters for a new run (or, if not per_run, for the runs to come)."""
+        self.steps = 0
+        self.list_elements = 0
+        self.string_chars = 0
+        self.deadline = time.monotonic() + self.max_seconds if self.max_seconds is not None else None
+
+    def next_interval(self):
+        """Steps until the next safepoint: at most SAFEPOINT_INTERVAL, and the step over max_steps."""
+        if self.max_steps is None:
+            return SAFEPOINT_INTERVAL
+        return max(1, min(SAFEPOINT_INTERVAL, self.max_steps - self.steps + 1))
+
+    # ==== Checks ====
+
+    def spend(self, steps, where):
+        """
+        Count steps done since the last safepoint and check the step and
+        time limits.
+
+        Raises:
+        - BudgetExceededError: If either limit is exceeded.
+        """
+        self.steps += steps
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceededError('steps', self.max_steps, describe_location(where, self.lines))
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError('seconds', self.max_seconds, describe_location(where, self.lines))
+
+    def add_elements(self, count, where):
+        """Count elements added to lists (BudgetExceededError over the limit)."""
+        self.list_elements += count
+        if self.max_list_elements is not None and self.list_elements > self.max_list_elements:
+            raise BudgetExceededError('list elements', self.max_list_elements,
+                                      describe_location(where, self.lines))
+
+    def add_chars(self, count, where):
+        """Count characters of strings built (BudgetExceededError over the limit)."""
+        self.string_chars += count
+        if self.max_string_chars is not None and self.string_chars > self.max_string_chars:
+            raise BudgetExceededError('string characters', self.max_string_chars,
+                                      describe_location(where, self.lines))
+
+    def concatenated(self, left_val, result, right_val, where):
+        """Count the value built by a + of lists or strings."""
+        if type(result) is List:
+            self.add_elements(right_val.length, where)
+        elif type(result) is Rope and type(left_val) is Rope:
+            self.add_chars(result.length - left_val.length, where)
+        elif type(result) in TEXT_TYPES:
+            self.add_chars(len(result), where)
+
+    def method_result(self, obj, method_name, result, where):
+        """Count what a method call added to a list or built."""
+        if type(result) is List:
+            self.add_elements(result.length, where)
+        elif type(result) is str:
+            self.add_chars(len(result), where)
+        elif method_name == 'append' and type(obj) is List:
+            self.add_elements(1, where)
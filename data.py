@@ -1,34 +1,586 @@
+from array import array
+from itertools import islice
+
+# NumPy is optional: bulk List methods use it on typed storage when available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Custom exception raised when trying to access an undefined variable
 class VariableNotDefinedError(Exception):
     pass
 
+# Value of a slot whose variable has not been assigned (or was deleted)
+UNDEFINED = object()
+
+# Lists of at least this many elements that are all ints (or all floats)
+# are stored in a compact array instead of a Python list of boxed numbers
+TYPED_STORAGE_THRESHOLD = 32
+
+# Array typecode -> the exact Python type of its elements
+TYPED_STORAGE_TYPES = {'q': int, 'd': float}
+
+
+def typed_storage(items):
+    """
+    Return items as an array('q') if they are all ints, an array('d') if
+    they are all floats, or None otherwise. Bools are not ints here, and
+    ints that do not fit in 64 bits keep the list generic.
+    """
+    if not items:
+        return None
+    first = type(items[0])
+    if first is int:
+        typecode = 'q'
+    elif first is float:
+        typecode = 'd'
+    else:
+        return None
+    for item in items:
+        if type(item) is not first:
+            return None
+    try:
+        return array(typecode, items)
+    except OverflowError:
+        return None
+
+
+def extend_storage(items, values):
+    """
+    Append values to a storage (list or typed array) in place and return it.
+    If a typed array cannot hold the values, return a new generic list instead.
+    """
+    if type(items) is list:
+        items.extend(values)
+        return items
+    if type(values) is array and values.typecode == items.typecode:
+        items.extend(values)
+        return items
+    element_type = TYPED_STORAGE_TYPES[items.typecode]
+    if all(type(value) is element_type for value in values):
+        try:
+            items.extend(values)
+            return items
+        except OverflowError:
+            pass
+    generic = list(items)
+    generic.extend(values)
+    return generic
+
+
+# Array typecode -> NumPy dtype with the same memory layout
+NUMPY_TYPES = {'q': 'int64', 'd': 'float64'}
+
+# Integer results up to this magnitude are computed in int64 by NumPy;
+# anything that could be larger is computed with Python ints instead
+INT64_SAFE = 2 ** 62
+
+
+def is_number(value):
+    return type(value) is int or type(value) is float
+
+
 class List:
+    """
+    List value of the language.
+
+    Several List objects may share one storage, each seeing only its first
+    `length` items. Concatenation appends to the storage in place when this
+    List is the newest one using it (its length covers the whole storage)
+    and returns a new, longer List, so `a = a + [x]` takes amortised O(1)
+    time while any other List holding the old value keeps seeing the old
+    elements. Operations that change elements other Lists can see first copy
+    the storage (copy-on-write).
+
+    The storage is a Python list, or an array('q') / array('d') once a list
+    of only ints / only floats reaches TYPED_STORAGE_THRESHOLD elements. The
+    first element of another type turns it back into a Python list.
+    """
+
     def __init__(self, elements=None):
-        self.elements = elements if elements else []
+        items = elements if elements else []
+        if type(items) is list and len(items) >= TYPED_STORAGE_THRESHOLD:
+            items = typed_storage(items) or items
+        self.items = items                # storage, possibly shared
+        self.length = len(items)          # number of items this List sees
+        self.shared = False               # another List may see self.items
+
+    @property
+    def elements(self):
+        """The elements of this list as a list or typed array (do not modify it)."""
+        if len(self.items) != self.length:
+            self._detach()
+        return self.items
+
+    def _detach(self):
+        """Give this List its own copy of its elements."""
+        self.items = self.items[:self.length]
+        self.shared = False
+
+    def _grown(self, items, previous_length):
+        """Switch a generic storage that just reached the threshold to a typed one."""
+        if type(items) is list and previous_length < TYPED_STORAGE_THRESHOLD <= len(items):
+            return typed_storage(items) or items
+        return items
+
+    def concat(self, other):
+        """
+        Return a new List with the elements of self followed by those of other.
+        Neither operand changes.
+        """
+        items = self.items
+        if len(items) != self.length:
+            items = items[:self.length]  # self is not the newest List: copy
+        combined = self._grown(extend_storage(items, other.elements), self.length)
+
+        result = List.__new__(List)
+        result.items = combined
+        result.length = len(combined)
+        result.shared = combined is self.items
+        if result.shared:
+            self.shared = True
+        return result
 
     def append(self, value):
-        self.elements.append(value)
+        # A shared storage is appended to in place only by the List that
+        # sees all of it: the others see just their first `length` items
+        if len(self.items) != self.length:
+            self._detach()
+        items = self.items
+        if type(items) is list:
+            items.append(value)
+            if self.length + 1 == TYPED_STORAGE_THRESHOLD:
+                self.items = self._grown(items, self.length)
+        else:
+            self.items = extend_storage(items, (value,))
+            if self.items is not items:
+                self.shared = False
+        self.length += 1
+
+    def view(self):
+        """
+        Return a new List with the same elements that shares this List's
+        storage copy-on-write, so changes to either one are not seen by the
+        other. Lists among the elements, at any depth, are replaced by views
+        of them too, one view per List (see _share_lists).
+        """
+        return _share_lists([self], {})[0]
+
+    def _shallow_view(self):
+        """
+        Return a view of this List whose elements are still the original
+        Lists: it shares the storage if there are no Lists among the
+        elements, otherwise it has a copy of them for _share_lists to fill.
+        """
+        items = self.items
+        if type(items) is list and any(type(item) is List for item in islice(items, self.length)):
+            items = list(islice(items, self.length))
+        else:
+            self.shared = True
+        result = List.__new__(List)
+        result.items = items
+        result.length = self.length
+        result.shared = items is self.items
+        return result
 
     def get(self, index):
-        if index < 0 or index >= len(self.elements):
+        if index < 0 or index >= self.length:
             raise IndexError("List index out of range")
-        return self.elements[index]
+        return self.items[index]
 
     def remove(self, index):
-        if index < 0 or index >= len(self.elements):
+        if index < 0 or index >= self.length:
             raise IndexError("List index out of range")
-        return self.elements.pop(index)
+        if self.shared or len(self.items) != self.length:
+            self._detach()
+        self.length -= 1
+        return self.items.pop(index)
+
+    # ==== Bulk Operations ====
+    # Reachable from scripts as methods, e.g. `total = values.sum()`.
+    # Typed storage is processed by NumPy when it is installed, other lists
+    # element by element in Python. Results are plain Python numbers and
+    # Lists either way (float sums may differ in the last digits).
+
+    def _vector(self):
+        """NumPy view of the elements, or None if the pure-Python path applies."""
+        if numpy is None or type(self.items) is list or self.length == 0:
+            return None
+        return numpy.frombuffer(self.items, dtype=NUMPY_TYPES[self.items.typecode], count=self.length)
+
+    def _numbers(self, method):
+        """The elements, checked to be numbers."""
+        elements = self.elements
+        if type(elements) is list:
+            for element in elements:
+                if not is_number(element):
+                    raise TypeError(f"List.{method} requires numbers, found {type_name(element)}")
+        return elements
+
+    @staticmethod
+    def _check_operand(method, value):
+        if not is_number(value):
+            raise TypeError(f"List.{method} requires a number, got {type_name(value)}")
+
+    @staticmethod
+    def _from_vector(vector):
+        """Wrap a NumPy result in a List with typed storage."""
+        typecode = 'q' if vector.dtype.kind == 'i' else 'd'
+        return List(array(typecode, vector.tobytes()))
+
+    def sum(self):
+        """Return the sum of the elements (0 for an empty list)."""
+        vector = self._vector()
+        if vector is not None:
+            if vector.dtype.kind == 'f':
+                return vector.sum().item()
+            if numpy.abs(vector, dtype='float64').sum() < INT64_SAFE:
+                return vector.sum().item()
+        return sum(self._numbers('sum'))
+
+    def min(self):
+        """Return the smallest element."""
+        if self.length == 0:
+            raise ValueError("List.min of an empty list")
+        vector = self._vector()
+        if vector is not None:
+            return vector.min().item()
+        return min(self._numbers('min'))
+
+    def max(self):
+        """Return the largest element."""
+        if self.length == 0:
+            raise ValueError("List.max of an empty list")
+        vector = self._vector()
+        if vector is not None:
+            return vector.max().item()
+        return max(self._numbers('max'))
+
+    def map_add(self, value):
+        """Return a new List with value added to every element."""
+        self._check_operand('map_add', value)
+        vector = self._vector()
+        if vector is not None and (vector.dtype.kind == 'f' or type(value) is float
+                                   or max(abs(vector.min().item() + value),
+                                          abs(vector.max().item() + value)) < INT64_SAFE):
+            return List._from_vector(vector + value)
+        return List([element + value for element in self._numbers('map_add')])
+
+    def scale(self, factor):
+        """Return a new List with every element multiplied by factor."""
+        self._check_operand('scale', factor)
+        vector = self._vector()
+        if vector is not None and (vector.dtype.kind == 'f' or type(factor) is float
+                                   or max(abs(vector.min().item()),
+                                          abs(vector.max().item())) * abs(factor) < INT64_SAFE):
+            return List._from_vector(vector * factor)
+        return List([element * factor for element in self._numbers('scale')])
+
+    def dot(self, other):
+        """Return the sum of the products of the elements of self and other."""
+        if not isinstance(other, List):
+            raise TypeError(f"List.dot requires a List, got {type_name(other)}")
+        if other.length != self.length:
+            raise ValueError(f"List.dot requires lists of equal length, got {self.length} and {other.length}")
+        left, right = self._vector(), other._vector()
+        if left is not None and right is not None:
+            if left.dtype.kind == 'f' or right.dtype.kind == 'f':
+                return numpy.dot(left.astype('float64'), right.astype('float64')).item()
+            bound = numpy.dot(numpy.abs(left, dtype='float64'), numpy.abs(right, dtype='float64'))
+            if bound < INT64_SAFE:
+                return numpy.dot(left, right).item()
+        total = 0
+        for a, b in zip(self._numbers('dot'), other._numbers('dot')):
+            total += a * b
+        return total
+
+    def sort(self):
+        """Sort the elements in ascending order, in place."""
+        if self.shared or len(self.items) != self.length:
+            self._detach()
+        vector = self._vector()
+        if vector is not None:
+            vector.sort()
+            return None
+        elements = self.items
+        if type(elements) is not list:
+            self.items = array(elements.typecode, sorted(elements))
+            return None
+        if not all(is_number(e) for e in elements) and not all(type(e) in TEXT_TYPES for e in elements):
+            raise TypeError("List.sort requires all numbers or all strings")
+        elements.sort()
+        return None
+
+    def slice(self, start, end):
+        """Return a new List with the elements from index start up to (not including) end."""
+        if type(start) is not int or type(end) is not int:
+            raise TypeError("List slice bounds must be integers")
+        if start < 0 or end > self.length or start > end:
+            raise IndexError("List slice out of range")
+        return List(self.items[start:end])
+
+    def __iter__(self):
+        """
+        Iterate over the elements the list has now, straight from its storage.
+        The storage is marked shared, so changes made to the list while
+        iterating copy it first and are not seen by the iteration.
+        """
+        self.shared = True
+        return islice(self.items, self.length)
 
     def __repr__(self):
-        return f"List({self.elements})"
+        return f"List({list(self.elements)})"
 
     def __str__(self):
         return "[" + ", ".join(str(e) for e in self.elements) + "]"
 
+# Concatenations whose result has at least this many characters build a Rope
+# instead of a str; shorter strings are cheaper to copy than to chain
+ROPE_MIN_LENGTH = 256
+
+
+class Rope:
+    """
+    String value built by concatenation, kept as a list of pieces and
+    joined into a str only when its text is needed (printing, comparing,
+    int(), input(), string methods, results shown by main.py).
+
+    Appending to a rope adds a piece to a chunk list that ropes share: a
+    rope is the first `count` pieces of its list, so `s = s + "..."` in a
+    loop appends in place in O(1) instead of copying the whole string, and
+    older ropes sharing the list still see only their own pieces. Appending
+    to a rope that is not the last one of its list copies its pieces first.
+    The joined text is kept, so a rope is joined at most once.
+
+    The language treats ropes as str: they compare, hash, print and report
+    their type as str.
+    """
+
+    __slots__ = ('chunks', 'count', 'length', 'text')
+
+    def __init__(self, chunks, count, length):
+        self.chunks = chunks    # pieces, shared with ropes built from this one
+        self.count = count      # number of pieces of chunks in this rope
+        self.length = length    # number of characters
+        self.text = None        # the joined str, once needed
+
+    def append(self, text):
+        """Return a new Rope of this rope followed by the str text."""
+        if self.text is not None:
+            chunks = [self.text]
+        elif len(self.chunks) != self.count:
+            chunks = self.chunks[:self.count]
+        else:
+            chunks = self.chunks
+        chunks.append(text)
+        return Rope(chunks, len(chunks), self.length + len(text))
+
+    def __str__(self):
+        text = self.text
+        if text is None:
+            chunks = self.chunks
+            text = self.text = "".join(chunks if len(chunks) == self.count else chunks[:self.count])
+        return text
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        if type(other) in TEXT_TYPES:
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if type(other) in TEXT_TYPES:
+            return str(self) != str(other)
+        return NotImplemented
+
+    def __lt__(self, other):
+        if type(other) in TEXT_TYPES:
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __gt__(self, other):
+        if type(other) in TEXT_TYPES:
+            return str(self) > str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __int__(self):
+        # int() of a rope parses its text like int() of a str
+        return int(str(self))
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+# Types of the string values of the language
+TEXT_TYPES = (str, Rope)
+
+
+def concat(left, right):
+    """
+    Return left + right for a PLUS with a string operand: the other operand
+    is converted with str(), and long results are built as a Rope.
+    """
+    if type(left) is Rope:
+        return left.append(right if type(right) is str else str(right))
+    if type(left) is not str:
+        left = str(left)
+    if type(right) is not str:
+        right = str(right)
+    length = len(left) + len(right)
+    if length < ROPE_MIN_LENGTH:
+        return left + right
+    return Rope([left, right], 2, length)
+
+
+def materialize(value):
+    """Return value with a Rope joined into a str (other values unchanged)."""
+    if type(value) is Rope:
+        return str(value)
+    return value
+
+
+def type_name(value):
+    """Name of the type of a value in error messages; a Rope is a str."""
+    if type(value) is Rope:
+        return 'str'
+    return type(value).__name__
+
+
+# Cleared frames kept by each function for reuse by later calls; deeper
+# recursion than this allocates the extra frames as needed
+FRAME_POOL_SIZE = 64
+
+
+class Function:
+    """
+    Function value of the language, created when a function definition runs.
+
+    The parameters and other local variables of the body live in a call
+    frame: a list with one slot per local variable (the parameters first),
+    read and written by index like the global slots of Data. A finished
+    call clears its frame and returns it to the function's pool, so later
+    calls reuse frames instead of allocating new ones.
+    """
+
+    def __init__(self, name, param_count, local_names, body):
+        self.name = name
+        self.param_count = param_count
+        self.local_names = local_names    # local slot number -> name
+        self.body = body                  # resolved AST of the body
+        self.closure = None               # body compiled by Evaluator.compile, if used
+        self.code = None                  # body compiled for the bytecode VM, if used
+        self.cache = None                 # MemoCache of a memo function
+        self.global_reads = ()            # global slots a memo function's body reads
+        self.empty_frame = [UNDEFINED] * len(local_names)
+        self.free_frames = []
+
+    def new_frame(self, args):
+        """Return a frame (from the pool if possible) with args bound to the parameters."""
+        frame = self.free_frames.pop() if self.free_frames else self.empty_frame[:]
+        frame[:self.param_count] = args
+        return frame
+
+    def free_frame(self, frame):
+        """Clear a frame whose call has finished and keep it for reuse."""
+        if len(self.free_frames) < FRAME_POOL_SIZE:
+            frame[:] = self.empty_frame
+            self.free_frames.append(frame)
+
+    def __repr__(self):
+        return f"Function({self.name})"
+
+    def __str__(self):
+        return f"<function {self.name}>"
+
+
+def _share_lists(values, views):
+    """
+    Return values as a list with every List, at any depth, replaced by a
+    copy-on-write view. views maps id(list) -> view for all nesting levels,
+    so a List reached by several paths (two variables, a variable and an
+    element of another List, a cycle) gets a single view and the views
+    refer to each other as the Lists did. Nested Lists are visited with an
+    explicit stack, so deep nesting does not hit the recursion limit.
+    """
+    pending = []  # views whose elements are still the original Lists
+
+    def view_of(value):
+        view = views.get(id(value))
+        if view is None:
+            view = views[id(value)] = value._shallow_view()
+            if view.items is not value.items:
+                pending.append(view)
+        return view
+
+    shared = [view_of(value) if type(value) is List else value for value in values]
+    while pending:
+        items = pending.pop().items
+        for index, item in enumerate(items):
+            if type(item) is List:
+                items[index] = view_of(item)
+    return shared
+
+
 class Data:
     def __init__(self):
-        # Internal storage for variables (symbol table)
-        self.variables = {}
+        # Internal storage for variables (symbol table).
+        # Every variable name gets a fixed slot number; values live in a
+        # preallocated list so resolved programs can read them by index.
+        self.slot_table = {}  # name -> slot number
+        self.names = []       # slot number -> name
+        self.slots = []       # slot number -> value, or UNDEFINED
+
+    def slot(self, identifier):
+        """
+        Get the slot number of a variable, allocating an empty slot if needed.
+
+        Parameters:
+        - identifier: A string or token object representing the variable name.
+
+        Returns:
+        - The slot number (int) of the variable.
+        """
+        name = identifier.value if hasattr(identifier, 'value') else identifier
+        index = self.slot_table.get(name)
+        if index is None:
+            index = len(self.slots)
+            self.slot_table[name] = index
+            self.names.append(name)
+            self.slots.append(UNDEFINED)
+        return index
+
+    def read_slot(self, index):
+        """
+        Retrieve the value stored in a slot.
+
+        Raises:
+        - VariableNotDefinedError: If the slot's variable is not defined.
+        """
+        value = self.slots[index]
+        if value is UNDEFINED:
+            raise VariableNotDefinedError(f"Variable '{self.names[index]}' not defined.")
+        return value
+
+    def write_slot(self, index, value):
+        """Assign a value to the variable in a slot."""
+        self.slots[index] = value
+
+    def delete_slot(self, index):
+        """
+        Delete the variable in a slot. The slot itself stays allocated.
+
+        Raises:
+        - VariableNotDefinedError: If the slot's variable is not defined.
+        """
+        if self.slots[index] is UNDEFINED:
+            raise VariableNotDefinedError(f"Variable '{self.names[index]}' not defined, cannot delete.")
+        self.slots[index] = UNDEFINED
 
     def read(self, identifier):
         """
@@ -44,8 +596,9 @@ class Data:
         - VariableNotDefinedError: If the variable does not exist.
         """
         name = identifier.value if hasattr(identifier, 'value') else identifier
-        if name in self.variables:
-            return self.variables[name]
+        index = self.slot_table.get(name)
+        if index is not None and self.slots[index] is not UNDEFINED:
+            return self.slots[index]
         raise VariableNotDefinedError(f"Variable '{name}' not defined.")
 
     def write(self, identifier, value):
@@ -59,8 +612,7 @@ class Data:
         Action:
         - Adds or updates the variable in the symbol table.
         """
-        name = identifier.value if hasattr(identifier, 'value') else identifier
-        self.variables[name] = value
+        self.slots[self.slot(identifier)] = value
 
     def exists(self, identifier):
         """
@@ -73,7 +625,8 @@ class Data:
         - True if the variable exists, False otherwise.
         """
         name = identifier.value if hasattr(identifier, 'value') else identifier
-        return name in self.variables
+        index = self.slot_table.get(name)
+        return index is not None and self.slots[index] is not UNDEFINED
 
     def delete(self, identifier):
         """
@@ -86,8 +639,8 @@ class Data:
         - VariableNotDefinedError: If the variable does not exist.
         """
         name = identifier.value if hasattr(identifier, 'value') else identifier
-        if name in self.variables:
-            del self.variables[name]
+        if self.exists(name):
+            self.slots[self.slot_table[name]] = UNDEFINED
         else:
             raise VariableNotDefinedError(f"Variable '{name}' not defined, cannot delete.")
 
@@ -99,4 +652,37 @@ class Data:
         - A dictionary of all stored variables and their values.
         Useful for debugging or inspection.
         """
-        return self.variables
+        return {name: value for name, value in zip(self.names, self.slots)
+                if value is not UNDEFINED}
+
+    @property
+    def variables(self):
+        """Dictionary view of the defined variables (same as all())."""
+        return self.all()
+
+    def clear(self):
+        """
+        Delete all variables. The slots stay allocated, so ASTs resolved
+        against this store can still run on it.
+        """
+        self.slots[:] = [UNDEFINED] * len(self.slots)
+
+    def snapshot(self):
+        """
+        Return the current values of all variables, for restore().
+
+        Lists are captured as copy-on-write views, so the snapshot is cheap
+        and later changes to the lists do not change it. Variables and
+        elements that refer to the same List share one view.
+        """
+        return tuple(_share_lists(self.slots, {}))
+
+    def restore(self, snapshot):
+        """
+        Set all variables back to a snapshot() of this store. Variables
+        created since the snapshot are deleted (their slots stay allocated).
+        Restoring gives out new views, so a snapshot can be restored again.
+        """
+        values = _share_lists(snapshot, {})
+        values.extend([UNDEFINED] * (len(self.slots) - len(values)))
+        self.slots[:] = values
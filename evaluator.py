@@ -4,10 +4,19 @@ Handles expression evaluation, control flow (if/while), assignments,
 and built-in operations like input/output, deletion, and type casting.
 """
 
+import operator
+import sys
+
 from tokens import Token
 from scanner import Scanner
 from parser import Parser
-from data import Data, List
+from resolver import resolve
+from data import Data, List, Function, UNDEFINED, Rope, TEXT_TYPES, concat, materialize, type_name
+from data import VariableNotDefinedError as SlotNotDefinedError
+from output import StreamOutput
+from memo import MemoCache, MEMO_SIZE, MISSING, memo_key, result_view, global_reads, globals_key
+from image import save_image, load_image
+from budget import BudgetExceededError, SAFEPOINT_INTERVAL
 
 
 
@@ -22,13 +31,301 @@ class TypeConversionError(TypeError):
 
 
 class BreakException(Exception):
-    """Used to break out of a while loop."""
+    """Raised for a break outside of any while loop."""
     pass
 
 class ContinueException(Exception):
     pass
 
 
+class CallDepthError(RecursionError):
+    """Raised when function calls nest deeper than the evaluator's max_call_depth."""
+    pass
+
+
+class ControlSignal:
+    """
+    Value of a break, continue or return statement.
+
+    BREAK and CONTINUE return a signal instead of raising, BLOCK stops at a
+    signal and returns it, IF returns whatever its branch returned, and the
+    enclosing WHILE acts on it. This keeps Python exceptions off the path of
+    loops that continue or break often. A signal that reaches the top of the
+    program (no enclosing loop) is raised as BreakException or
+    ContinueException, as the bytecode VM does.
+
+    RETURN stores its value in the evaluator and returns RETURN_SIGNAL,
+    which loops pass on and the function call turns back into the value.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"ControlSignal({self.name})"
+
+
+BREAK_SIGNAL = ControlSignal('break')
+CONTINUE_SIGNAL = ControlSignal('continue')
+RETURN_SIGNAL = ControlSignal('return')
+
+
+def _outside_loop(result):
+    """Raise the exception for a loop signal that left the program; else return result."""
+    if result is BREAK_SIGNAL:
+        raise BreakException()
+    if result is CONTINUE_SIGNAL:
+        raise ContinueException()
+    return result
+
+
+def _check_call(function, args, depth, max_depth):
+    """
+    Check that a call can be made: function is a Function taking len(args)
+    arguments and depth calls are not already running.
+
+    Raises:
+    - TypeError: If function is not a Function or the argument count is wrong.
+    - CallDepthError: If depth has reached max_depth.
+    """
+    if not isinstance(function, Function):
+        raise TypeError(f"Object of type {type_name(function)} is not callable")
+    if len(args) != function.param_count:
+        raise TypeError(f"Function '{function.name}' takes {function.param_count} "
+                        f"arguments but {len(args)} were given")
+    if depth >= max_depth:
+        raise CallDepthError(f"Maximum function call depth ({max_depth}) exceeded")
+
+
+def _make_function(name, param_count, local_names, memo, body, memo_size):
+    """
+    Create the Function value of a definition. A memo function's body is
+    checked with Evaluator.check_memo_body() and the function gets a
+    MemoCache of memo_size entries and the global slots its body reads.
+    """
+    function = Function(name, param_count, local_names, body)
+    if memo:
+        Evaluator.check_memo_body(name, param_count, body)
+        function.cache = MemoCache(memo_size)
+        function.global_reads = global_reads(body)
+    return function
+
+
+def _memo_lookup(function, args, slots):
+    """
+    Look up a call in the cache of a memo function. The key covers the
+    arguments and the global variables (in slots) that the function, and
+    the memo functions it can reach through them, read.
+
+    Returns:
+    - (key, value): value is the cached result (or a view of it) or MISSING;
+      key is None if the arguments or globals cannot be used as a key.
+
+    Raises:
+    - ValueError: If function is not a memo function. Memo functions may only
+      call memo functions, whose bodies have been checked the same way.
+    """
+    cache = function.cache
+    if cache is None:
+        raise ValueError(f"Memo functions can only call other memo functions, not '{function.name}'")
+    key = memo_key(args)
+    if key is not None and function.global_reads:
+        reads_key = globals_key(function, slots)
+        key = (key, reads_key) if reads_key is not None else None
+    if key is None:
+        cache.uncached += 1
+        return None, MISSING
+    return key, result_view(cache.lookup(key))
+
+
+def _memo_store(function, key, value):
+    """
+    Cache the value a memo function returned for key and return the caller's
+    value. A List is cached as a view of its own, so changes made later to
+    the returned List (or to the argument it came from) do not reach the
+    cache; lookups hand out a new view of it every time.
+    """
+    if key is None:
+        return value
+    cached = result_view(value)
+    function.cache.remember(key, cached)
+    return result_view(cached)
+
+
+def _call_memo(runner, function, args, run):
+    """
+    Make a call to a memo function, or any call while one is running:
+    return the cached result if there is one, otherwise run(function, args)
+    and cache its value. runner (an Evaluator or VM) counts the running
+    memo calls in memo_depth.
+    """
+    key, value = _memo_lookup(function, args, runner.data.slots)
+    if value is not MISSING:
+        return value
+    runner.memo_depth += 1
+    try:
+        value = run(function, args)
+    finally:
+        runner.memo_depth -= 1
+    return _memo_store(function, key, value)
+
+
+# Methods that change the List they are called on
+MUTATING_METHODS = ('append', 'remove', 'sort')
+
+
+# Default limit on nested function calls (Evaluator.max_call_depth)
+MAX_CALL_DEPTH = 1000
+
+# Python frames the recursive evaluators use per function call, with room
+# for the expressions and blocks between one call and the next
+PYTHON_FRAMES_PER_CALL = 20
+
+
+def allow_call_depth(depth):
+    """
+    Raise Python's recursion limit, if needed, so that evaluate(), compile()
+    and the VM can run depth nested function calls. evaluate_iterative()
+    does not need this.
+    """
+    limit = depth * PYTHON_FRAMES_PER_CALL + 1000
+    if sys.getrecursionlimit() < limit:
+        sys.setrecursionlimit(limit)
+
+
+def _call_method(obj, method_name, args, budget=None, where=None):
+    """
+    Run a METHOD_CALL and return its value. The methods of Python strings
+    are reachable on string values, so a Rope receiver is joined into a str
+    first, and so are Rope arguments of a str method. With a budget, what
+    the method built is counted against it (where is the METHOD_CALL node,
+    or the VM's code and offset).
+    """
+    if type(obj) is Rope:
+        obj = str(obj)
+    if type(obj) is str:
+        args = [materialize(arg) for arg in args]
+    method = getattr(obj, method_name, None)
+    if method is None or not callable(method):
+        raise TypeError(f"Object of type {type(obj).__name__} has no method '{method_name}'")
+    result = method(*args)
+    if budget is not None:
+        budget.method_result(obj, method_name, result, where)
+    return result
+
+
+def start_run(runner):
+    """
+    Prepare an Evaluator or VM for a run: start its budget (if it has one
+    and is per_run) and the countdown to the first safepoint.
+    """
+    budget = runner.budget
+    if budget is not None:
+        if budget.per_run:
+            budget.start()
+        else:
+            # The budget goes on from the previous run: count the steps it
+            # did after its last safepoint
+            budget.steps += runner.countdown_start - runner.countdown
+        runner.countdown_start = runner.countdown = budget.next_interval()
+    else:
+        runner.countdown_start = runner.countdown = SAFEPOINT_INTERVAL
+
+
+def run_safepoint(runner, where):
+    """
+    Run a safepoint of an Evaluator or VM whose countdown reached zero.
+
+    The backends count a step down in runner.countdown at every loop
+    iteration and function call, where no operation is half done, and call
+    this when it reaches zero. It counts the steps against the runner's
+    budget, runs the safepoint_handlers (such as an image.Checkpointer),
+    and starts the countdown to the next safepoint.
+
+    Parameters:
+    - where: The loop node, Function or VM (code, offset) of the step, for
+      the error message (see budget.describe_location)
+
+    Raises:
+    - BudgetExceededError: If the run has used up its steps or time.
+    """
+    budget = runner.budget
+    if budget is not None:
+        budget.spend(runner.countdown_start - runner.countdown, where)
+    for handler in list(runner.safepoint_handlers):
+        handler(runner)
+    interval = budget.next_interval() if budget is not None else SAFEPOINT_INTERVAL
+    runner.countdown_start = runner.countdown = interval
+
+
+def _counted(apply, runner, node):
+    """
+    Wrap the implementation of a + of lists or strings so that what it
+    builds is counted against the budget of runner (if it has one).
+    """
+    def counted(left_val, right_val):
+        result = apply(left_val, right_val)
+        budget = runner.budget
+        if budget is not None:
+            budget.concatenated(left_val, result, right_val, node)
+        return result
+    return counted
+
+
+def _list_values(value):
+    """Iterator over the elements of the List a for loop runs over."""
+    if not isinstance(value, List):
+        raise TypeError("FOR requires a List object")
+    return iter(value)
+
+
+def _range_values(start, end):
+    """Iterator over the integers of a start:end range (end excluded)."""
+    if not isinstance(start, int) or not isinstance(end, int):
+        raise TypeError("Range bounds must be integers")
+    return iter(range(start, end))
+
+
+# Work items of Evaluator.evaluate_iterative(): (kind, node, extra). EVAL
+# pushes the value of node on the value stack; the other kinds continue the
+# evaluation of node once the values of its children are on the stack.
+EVAL = 0
+STORE_VALUE = 1      # store the value in slot node[1]
+ASSIGN_VALUE = 2     # store the value in variable node[1]
+NEXT_STATEMENT = 3   # node is a statement list, extra the next index
+IF_TEST = 4          # extra is the index of the condition just evaluated
+WHILE_TEST = 5
+WHILE_BODY = 6
+CAST_INT = 7
+BUILD_LIST = 8       # extra is the number of elements
+ACCESS_LIST = 9
+ACCESS_INDEX = 10
+APPEND_LIST = 11
+APPEND_VALUE = 12
+REMOVE_LIST = 13
+REMOVE_INDEX = 14
+CALL_METHOD = 15
+PRINT_VALUE = 16
+READ_INPUT = 17
+NEGATE = 18
+LOGICAL_NOT = 19
+BINARY = 20          # extra is the operator type
+FOR_START = 21       # the List or range bounds are on the stack
+FOR_NEXT = 22        # extra is the iterator
+FOR_BODY = 23        # extra is the iterator
+STORE_LOCAL_VALUE = 24  # store the value in frame slot node[1]
+CALL_FUNCTION = 25   # extra is the number of arguments
+RETURN_FROM = 26     # extra is (function, frame of the call, frame of the caller, memo key)
+RETURN_VALUE = 27
+
+# Tags of for loops: all of them, those over a List, those with a local variable
+FOR_TAGS = ('FOR_SLOT', 'FOR_RANGE_SLOT', 'FOR_LOCAL', 'FOR_RANGE_LOCAL', 'FOR', 'FOR_RANGE')
+LIST_FOR_TAGS = ('FOR_SLOT', 'FOR_LOCAL', 'FOR')
+LOCAL_FOR_TAGS = ('FOR_LOCAL', 'FOR_RANGE_LOCAL')
+
+
 class Evaluator:
     """
     Evaluates an abstract syntax tree (AST) produced by the parser.
@@ -37,10 +334,500 @@ class Evaluator:
 
     def __init__(self):
         self.data = Data()  # Stores variable names and values
+        self.frame = None          # local slots of the running function call
+        self.return_value = None   # value of the RETURN being passed up
+        self.call_depth = 0
+        self.max_call_depth = MAX_CALL_DEPTH
+        self.memo_depth = 0        # number of running memo function calls
+        self.memo_size = MEMO_SIZE  # cache size of new memo functions
+        self.output = StreamOutput(buffer_size=0)  # where PRINT writes (see output.py)
+        self.input = input         # reads a line for INPUT, given the prompt
+        self.feedback = {}         # id of a binary node -> its specialisation (see _specialise)
+        self.budget = None         # limits of a run (see budget.py), or None
+        self.countdown = self.countdown_start = SAFEPOINT_INTERVAL  # steps to the next safepoint
+        self.safepoint_handlers = []  # called with the evaluator at every safepoint (see run_safepoint)
 
     def evaluate(self, ast):
         """Public method to evaluate an AST."""
-        return self._eval(ast)
+        start_run(self)
+        return materialize(_outside_loop(self._eval(ast)))
+
+    def evaluate_iterative(self, ast):
+        """
+        Evaluate an AST like evaluate(), but with an explicit work stack
+        instead of Python recursion.
+
+        Nesting is then limited only by memory, so generated programs with
+        very long operator chains (a + b + c + ...) or deeply nested blocks
+        run where evaluate() would exceed the recursion limit, and so do
+        function calls up to max_call_depth without allow_call_depth().
+        Output, results and errors are the same as with evaluate().
+        """
+        start_run(self)
+        work = [(EVAL, ast, None)]
+        try:
+            return self._iterate(work)
+        except BudgetExceededError as error:
+            # The calls still running have their RETURN_FROM on the work stack
+            error.functions.extend(extra[0].name for kind, _, extra in reversed(work) if kind == RETURN_FROM)
+            raise
+
+    def _iterate(self, work):
+        """Run the work stack of evaluate_iterative() and return the program's value."""
+        data = self.data
+        frame = None   # local slots of the running function call
+        depth = 0      # number of running function calls
+        memo_depth = 0  # number of running memo function calls
+        feedback = self.feedback
+        values = []
+        push = work.append
+        while work:
+            kind, node, extra = work.pop()
+
+            if kind == EVAL:
+                if isinstance(node, Token):
+                    if node.type == 'VARIABLE':
+                        try:
+                            values.append(data.read(node))
+                        except KeyError:
+                            raise VariableNotDefinedError(f"Variable '{node.value}' is not defined.")
+                    else:
+                        values.append(node.value)
+                    continue
+
+                if not isinstance(node, tuple):
+                    raise Exception(f"Unknown AST node: {node}")
+                tag = node[0]
+
+                if tag == 'LOAD_SLOT':
+                    value = data.slots[node[1]]
+                    if value is UNDEFINED:
+                        value = data.read_slot(node[1])  # raises the not-defined error
+                    values.append(value)
+                elif tag == 'LOAD_LOCAL':
+                    value = frame[node[1]]
+                    if value is UNDEFINED:
+                        raise SlotNotDefinedError(f"Variable '{node[2]}' not defined.")
+                    values.append(value)
+                elif tag == 'STORE_SLOT':
+                    push((STORE_VALUE, node, None))
+                    push((EVAL, node[3], None))
+                elif tag == 'STORE_LOCAL':
+                    push((STORE_LOCAL_VALUE, node, None))
+                    push((EVAL, node[3], None))
+                elif tag == 'CALL':
+                    push((CALL_FUNCTION, node, len(node[2])))
+                    work.extend((EVAL, arg, None) for arg in reversed(node[2]))
+                    push((EVAL, node[1], None))
+                elif tag == 'RETURN':
+                    if node[1] is None:
+                        self.return_value = None
+                        values.append(RETURN_SIGNAL)
+                    else:
+                        push((RETURN_VALUE, node, None))
+                        push((EVAL, node[1], None))
+                elif tag == 'BLOCK':
+                    statements = node[1]
+                    if not statements:
+                        values.append(None)
+                    else:
+                        if len(statements) > 1:
+                            push((NEXT_STATEMENT, statements, 1))
+                        push((EVAL, statements[0], None))
+                elif tag == 'IF':
+                    if node[1]:
+                        push((IF_TEST, node, 0))
+                        push((EVAL, node[1][0], None))
+                    elif node[3]:
+                        push((EVAL, node[3], None))
+                    else:
+                        values.append(None)
+                elif tag == 'WHILE':
+                    values.append(None)  # result of the last completed iteration
+                    push((WHILE_TEST, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'ASSIGN':
+                    push((ASSIGN_VALUE, node, None))
+                    push((EVAL, node[2], None))
+                elif tag == 'PRINT':
+                    push((PRINT_VALUE, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'INPUT':
+                    push((READ_INPUT, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'INT_CAST':
+                    push((CAST_INT, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'LIST_LITERAL':
+                    push((BUILD_LIST, node, len(node[1])))
+                    work.extend((EVAL, element, None) for element in reversed(node[1]))
+                elif tag == 'LIST_ACCESS':
+                    push((ACCESS_LIST, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'LIST_APPEND':
+                    push((APPEND_LIST, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'LIST_REMOVE':
+                    push((REMOVE_LIST, node, None))
+                    push((EVAL, node[1], None))
+                elif tag == 'METHOD_CALL':
+                    push((CALL_METHOD, node, len(node[3])))
+                    work.extend((EVAL, arg, None) for arg in reversed(node[3]))
+                    push((EVAL, node[1], None))
+                elif tag in FOR_TAGS:
+                    values.append(None)  # result of the last completed iteration
+                    push((FOR_START, node, None))
+                    push((EVAL, node[-2], None))
+                    if tag not in LIST_FOR_TAGS:
+                        push((EVAL, node[-3], None))
+                elif tag == 'DEFINE':
+                    data.slots[node[1]] = _make_function(*node[2:], self.memo_size)
+                    values.append(None)
+                elif tag == 'DEL':
+                    data.delete(node[1])
+                    values.append(None)
+                elif tag == 'DEL_SLOT':
+                    data.delete_slot(node[1])
+                    values.append(None)
+                elif tag == 'DEL_LOCAL':
+                    if frame[node[1]] is UNDEFINED:
+                        raise SlotNotDefinedError(f"Variable '{node[2]}' not defined, cannot delete.")
+                    frame[node[1]] = UNDEFINED
+                    values.append(None)
+                elif tag == 'BREAK':
+                    values.append(BREAK_SIGNAL)
+                elif tag == 'CONTINUE':
+                    values.append(CONTINUE_SIGNAL)
+                elif len(node) == 3:
+                    op, left, right = node
+                    op_type = op.type if isinstance(op, Token) else op
+                    if left is None and op_type == 'MINUS':
+                        push((NEGATE, node, None))
+                    elif left is None and op_type == 'NOT':
+                        push((LOGICAL_NOT, node, None))
+                    else:
+                        push((BINARY, node, op_type))
+                        if left is None:
+                            values.append(None)
+                    push((EVAL, right, None))
+                    if left is not None:
+                        push((EVAL, left, None))
+                else:
+                    raise Exception(f"Unknown AST node: {node}")
+
+            elif kind == BINARY:
+                right_val = values.pop()
+                left_val = values.pop()
+                entry = feedback.get(id(node))
+                if (entry is not None and type(left_val) is entry[1] and type(right_val) is entry[2]
+                        and entry[0] == extra):
+                    values.append(entry[3](left_val, right_val))
+                else:
+                    values.append(self._specialise_node(node, extra, left_val, right_val))
+
+            elif kind == NEXT_STATEMENT:
+                # The value of the previous statement is on top of the stack
+                if type(values[-1]) is ControlSignal:
+                    continue
+                values.pop()
+                if extra + 1 < len(node):
+                    push((NEXT_STATEMENT, node, extra + 1))
+                push((EVAL, node[extra], None))
+
+            elif kind == STORE_VALUE:
+                data.slots[node[1]] = values.pop()
+                values.append(None)
+
+            elif kind == STORE_LOCAL_VALUE:
+                frame[node[1]] = values.pop()
+                values.append(None)
+
+            elif kind == IF_TEST:
+                conditions = node[1]
+                if values.pop():
+                    push((EVAL, node[2][extra], None))
+                elif extra + 1 < len(conditions):
+                    push((IF_TEST, node, extra + 1))
+                    push((EVAL, conditions[extra + 1], None))
+                elif node[3]:
+                    push((EVAL, node[3], None))
+                else:
+                    values.append(None)
+
+            elif kind == WHILE_TEST:
+                if values.pop():
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, node)
+                    push((WHILE_BODY, node, None))
+                    push((EVAL, node[2], None))
+
+            elif kind == WHILE_BODY:
+                value = values.pop()
+                if type(value) is ControlSignal:
+                    if value is BREAK_SIGNAL:
+                        continue
+                    if value is RETURN_SIGNAL:
+                        values[-1] = value  # the loop's value passes the return on
+                        continue
+                else:
+                    values[-1] = value
+                push((WHILE_TEST, node, None))
+                push((EVAL, node[1], None))
+
+            elif kind == FOR_START:
+                if node[0] in LIST_FOR_TAGS:
+                    iterator = _list_values(values.pop())
+                else:
+                    end = values.pop()
+                    iterator = _range_values(values.pop(), end)
+                push((FOR_NEXT, node, iterator))
+
+            elif kind == FOR_NEXT:
+                item = next(extra, UNDEFINED)
+                if item is not UNDEFINED:
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, node)
+                    if node[0] in ('FOR_SLOT', 'FOR_RANGE_SLOT'):
+                        data.slots[node[1]] = item
+                    elif node[0] in LOCAL_FOR_TAGS:
+                        frame[node[1]] = item
+                    else:
+                        data.write(node[1], item)
+                    push((FOR_BODY, node, extra))
+                    push((EVAL, node[-1], None))
+
+            elif kind == FOR_BODY:
+                value = values.pop()
+                if type(value) is ControlSignal:
+                    if value is BREAK_SIGNAL:
+                        continue
+                    if value is RETURN_SIGNAL:
+                        values[-1] = value
+                        continue
+                else:
+                    values[-1] = value
+                push((FOR_NEXT, node, extra))
+
+            elif kind == CALL_FUNCTION:
+                args = values[len(values) - extra:]
+                del values[len(values) - extra:]
+                function = values.pop()
+                _check_call(function, args, depth, self.max_call_depth)
+                self.countdown -= 1
+                if self.countdown <= 0:
+                    run_safepoint(self, function)
+                key = MISSING  # not a memo call
+                if function.cache is not None or memo_depth:
+                    key, value = _memo_lookup(function, args, data.slots)
+                    if value is not MISSING:
+                        values.append(value)
+                        continue
+                    memo_depth += 1
+                callee_frame = function.new_frame(args)
+                push((RETURN_FROM, node, (function, callee_frame, frame, key)))
+                push((EVAL, function.body, None))
+                frame = callee_frame
+                depth += 1
+
+            elif kind == RETURN_FROM:
+                function, callee_frame, frame, key = extra
+                depth -= 1
+                function.free_frame(callee_frame)
+                value = self._returned(values.pop())
+                if key is not MISSING:
+                    memo_depth -= 1
+                    value = _memo_store(function, key, value)
+                values.append(value)
+
+            elif kind == RETURN_VALUE:
+                self.return_value = values.pop()
+                values.append(RETURN_SIGNAL)
+
+            elif kind == ASSIGN_VALUE:
+                data.write(node[1], values.pop())
+                values.append(None)
+
+            elif kind == PRINT_VALUE:
+                self.output.print(values.pop())
+                values.append(None)
+
+            elif kind == READ_INPUT:
+                self.output.flush()
+                values.append(self.input(str(values.pop())))
+
+            elif kind == CAST_INT:
+                val = values.pop()
+                try:
+                    values.append(int(val))
+                except (ValueError, TypeError) as e:
+                    raise TypeConversionError(f"Cannot cast to int: {e}")
+
+            elif kind == BUILD_LIST:
+                elements = values[len(values) - extra:]
+                del values[len(values) - extra:]
+                if self.budget is not None:
+                    self.budget.add_elements(extra, node)
+                values.append(List(elements))
+
+            elif kind == ACCESS_LIST:
+                if not isinstance(values[-1], List):
+                    raise TypeError("LIST_ACCESS requires a List object")
+                push((ACCESS_INDEX, node, None))
+                push((EVAL, node[2], None))
+
+            elif kind == ACCESS_INDEX:
+                index = values.pop()
+                list_obj = values.pop()
+                if not isinstance(index, int):
+                    raise TypeError("List index must be an integer")
+                values.append(list_obj.get(index))
+
+            elif kind == APPEND_LIST:
+                if not isinstance(values[-1], List):
+                    raise TypeError("LIST_APPEND requires a List object")
+                push((APPEND_VALUE, node, None))
+                push((EVAL, node[2], None))
+
+            elif kind == APPEND_VALUE:
+                if self.budget is not None:
+                    self.budget.add_elements(1, node)
+                value = values.pop()
+                values.pop().append(value)
+                values.append(None)
+
+            elif kind == REMOVE_LIST:
+                if not isinstance(values[-1], List):
+                    raise TypeError("LIST_REMOVE requires a List object")
+                push((REMOVE_INDEX, node, None))
+                push((EVAL, node[2], None))
+
+            elif kind == REMOVE_INDEX:
+                index = values.pop()
+                list_obj = values.pop()
+                if not isinstance(index, int):
+                    raise TypeError("List remove index must be an integer")
+                values.append(list_obj.remove(index))
+
+            elif kind == CALL_METHOD:
+                args = values[len(values) - extra:]
+                del values[len(values) - extra:]
+                obj = values.pop()
+                values.append(_call_method(obj, node[2].value, args, self.budget, node))
+
+            elif kind == NEGATE:
+                val = values.pop()
+                if not isinstance(val, (int, float)):
+                    raise TypeConversionError("Unary minus requires a number")
+                values.append(-val)
+
+            elif kind == LOGICAL_NOT:
+                operand = values.pop()
+                if not isinstance(operand, bool):
+                    raise TypeConversionError("Unary NOT requires a boolean")
+                values.append(not operand)
+
+        return materialize(_outside_loop(values.pop()))
+
+    def compile(self, ast):
+        """
+        Compile an AST into a tree of Python closures.
+
+        The AST is walked once and every node is turned into a function that
+        is already specialised to its operator and operands, so running the
+        result skips the node dispatch that _eval repeats on every visit.
+        The returned callable takes no arguments and behaves like
+        evaluate(ast), including raising the same errors.
+        """
+        code = self._compile(ast)
+
+        def run():
+            start_run(self)
+            return materialize(_outside_loop(code()))
+        return run
+
+    def save_state(self, path):
+        """
+        Save all variables to an image file (see image.py), replacing it.
+
+        Returns:
+        - int: The size of the image in bytes
+
+        Raises:
+        - TypeError: If a value cannot be saved.
+        - OSError: If the file cannot be written.
+        """
+        return save_image(path, self.data)
+
+    def load_state(self, path):
+        """
+        Replace all variables by those saved in an image file.
+
+        Returns:
+        - int: The number of variables loaded
+
+        Raises:
+        - ValueError: If the file is not a valid image.
+        - OSError: If the file cannot be read.
+        """
+        return load_image(path, self.data, self.memo_size)
+
+    @staticmethod
+    def check_memo_body(name, param_count, body):
+        """
+        Check that the resolved body of memo function name has no effect
+        other than its return value, so a cached result can stand in for
+        running it: no print, input, assignment to a global variable, del,
+        or append/remove/sort on a List the function did not create. Calls
+        are checked when they run (a memo function may only call memo
+        functions). The global variables the body reads are part of the
+        cache key (see memo.globals_key).
+
+        A List counts as created by the function only if it is held in a
+        local variable that is assigned nothing but list literals, so a
+        parameter cannot be changed through an alias such as l2 = l.
+
+        Raises:
+        - ValueError: Describing the first statement that is not allowed.
+        """
+        literal_locals = set()  # locals assigned a list literal
+        other_locals = set()    # locals assigned anything else (or loop variables)
+        changed = []            # (local, method) of the mutating method calls on locals
+        work = [body]
+        while work:
+            node = work.pop()
+            if isinstance(node, list):
+                work.extend(node)
+                continue
+            if not isinstance(node, tuple) or not node:
+                continue
+            tag = node[0]
+            if tag == 'PRINT':
+                raise ValueError(f"Memo function '{name}' cannot print")
+            if tag == 'INPUT':
+                raise ValueError(f"Memo function '{name}' cannot read input")
+            if tag in ('STORE_SLOT', 'FOR_SLOT', 'FOR_RANGE_SLOT'):
+                raise ValueError(f"Memo function '{name}' cannot assign global variable '{node[2]}'")
+            if tag in ('DEL_SLOT', 'DEL_LOCAL'):
+                raise ValueError(f"Memo function '{name}' cannot delete variable '{node[2]}'")
+            if tag == 'STORE_LOCAL':
+                value = node[3]
+                is_literal = isinstance(value, tuple) and value and value[0] == 'LIST_LITERAL'
+                (literal_locals if is_literal else other_locals).add(node[1])
+            if tag in ('FOR_LOCAL', 'FOR_RANGE_LOCAL'):
+                other_locals.add(node[1])
+            if tag == 'METHOD_CALL' and node[2].value in MUTATING_METHODS:
+                target = node[1]
+                if not (isinstance(target, tuple) and target[0] == 'LOAD_LOCAL' and target[1] >= param_count):
+                    raise ValueError(f"Memo function '{name}' can only {node[2].value}() "
+                                     f"lists it created itself")
+                changed.append((target, node[2].value))
+            work.extend(node[1:])
+        for target, method in changed:
+            if target[1] in other_locals or target[1] not in literal_locals:
+                raise ValueError(f"Memo function '{name}' can only {method}() lists it created itself: "
+                                 f"'{target[2]}' must only be assigned list literals")
 
     @staticmethod
     def _are_compatible(a, b, operator):
@@ -51,7 +838,7 @@ class Evaluator:
             # Allow concatenation of two Lists
             if isinstance(a, List) and isinstance(b, List):
                 return True
-            if isinstance(a, str) or isinstance(b, str):
+            if isinstance(a, TEXT_TYPES) or isinstance(b, TEXT_TYPES):
                 return True
             return isinstance(a, (int, float)) and isinstance(b, (int, float))
         elif operator in ('MINUS', 'MUL', 'DIV', 'MOD'):
@@ -70,6 +857,26 @@ class Evaluator:
             return isinstance(a, (int, float)) and isinstance(b, (int, float))
         return True
 
+    def _specialise_node(self, node, op_type, left_val, right_val):
+        """
+        Apply a binary node's operator to operands whose types the node has
+        not recorded (it runs for the first time, or the types changed), and
+        record the types and the operator's implementation for them.
+
+        Raises:
+        - TypeConversionError: If the operand types are incompatible.
+        """
+        apply = _specialise(op_type, left_val, right_val)
+        if apply is None:
+            raise Exception(f"Unknown AST node: {node}")
+        if apply in ALLOCATING_OPERATIONS:
+            apply = _counted(apply, self, node)
+        feedback = self.feedback
+        if len(feedback) >= FEEDBACK_SIZE:
+            feedback.clear()
+        feedback[id(node)] = (op_type, type(left_val), type(right_val), apply)
+        return apply(left_val, right_val)
+
     def _eval(self, node):
         """
         Core recursive method to evaluate AST nodes.
@@ -86,6 +893,26 @@ class Evaluator:
         if isinstance(node, tuple):
             tag = node[0]
 
+            if tag == 'LOAD_SLOT':
+                value = self.data.slots[node[1]]
+                if value is UNDEFINED:
+                    return self.data.read_slot(node[1])  # raises the not-defined error
+                return value
+
+            if tag == 'LOAD_LOCAL':
+                value = self.frame[node[1]]
+                if value is UNDEFINED:
+                    raise SlotNotDefinedError(f"Variable '{node[2]}' not defined.")
+                return value
+
+            if tag == 'STORE_SLOT':
+                self.data.slots[node[1]] = self._eval(node[3])
+                return None
+
+            if tag == 'STORE_LOCAL':
+                self.frame[node[1]] = self._eval(node[3])
+                return None
+
             if tag == 'INT_CAST':
                 val = self._eval(node[1])
                 try:
@@ -94,6 +921,8 @@ class Evaluator:
                     raise TypeConversionError(f"Cannot cast to int: {e}")
             if tag == 'LIST_LITERAL':
                 elements = [self._eval(elem) for elem in node[1]]
+                if self.budget is not None:
+                    self.budget.add_elements(len(elements), node)
                 return List(elements)
 
             if tag == 'LIST_ACCESS':
@@ -110,6 +939,8 @@ class Evaluator:
                 if not isinstance(list_obj, List):
                     raise TypeError("LIST_APPEND requires a List object")
                 value = self._eval(node[2])
+                if self.budget is not None:
+                    self.budget.add_elements(1, node)
                 list_obj.append(value)
                 return None
 
@@ -127,19 +958,15 @@ class Evaluator:
                 method_token = node[2]
                 args_nodes = node[3]
 
-                method_name = method_token.value
                 args = [self._eval(arg) for arg in args_nodes]
-
-                method = getattr(obj, method_name, None)
-                if method is None or not callable(method):
-                    raise TypeError(f"Object of type {type(obj).__name__} has no method '{method_name}'")
-
-                return method(*args)
+                return _call_method(obj, method_token.value, args, self.budget, node)
 
             if tag == 'BLOCK':
                 result = None
                 for stmt in node[1]:
                     result = self._eval(stmt)
+                    if type(result) is ControlSignal:
+                        break
                 return result
 
             if tag == 'ASSIGN':
@@ -149,12 +976,13 @@ class Evaluator:
 
             if tag == 'PRINT':
                 value = self._eval(node[1])
-                print(value)
+                self.output.print(value)
                 return None
 
             if tag == 'INPUT':
                 prompt_value = self._eval(node[1])
-                return input(str(prompt_value))
+                self.output.flush()
+                return self.input(str(prompt_value))
 
             if tag == 'IF':
                 for cond, action in zip(node[1], node[2]):
@@ -167,22 +995,53 @@ class Evaluator:
             if tag == 'WHILE':
                 result = None
                 while self._eval(node[1]):
-                    try:
-                        result = self._eval(node[2])
-                    except BreakException:
-                        break
-                    except ContinueException:
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, node)
+                    value = self._eval(node[2])
+                    if type(value) is ControlSignal:
+                        if value is BREAK_SIGNAL:
+                            break
+                        if value is RETURN_SIGNAL:
+                            return value
                         continue
+                    result = value
                 return result
 
+            if tag in FOR_TAGS:
+                return self._eval_for(node)
+
+            if tag == 'DEFINE':
+                self.data.slots[node[1]] = _make_function(*node[2:], self.memo_size)
+                return None
+
             if tag == 'DEL':
                 self.data.delete(node[1])
                 return None
 
+            if tag == 'DEL_SLOT':
+                self.data.delete_slot(node[1])
+                return None
+
+            if tag == 'DEL_LOCAL':
+                if self.frame[node[1]] is UNDEFINED:
+                    raise SlotNotDefinedError(f"Variable '{node[2]}' not defined, cannot delete.")
+                self.frame[node[1]] = UNDEFINED
+                return None
+
+            if tag == 'CALL':
+                function = self._eval(node[1])
+                args = [self._eval(arg) for arg in node[2]]
+                return self._call(function, args)
+
+            if tag == 'RETURN':
+                self.return_value = self._eval(node[1]) if node[1] is not None else None
+                return RETURN_SIGNAL
+
             if tag == 'BREAK':
-                raise BreakException()
+                return BREAK_SIGNAL
             elif tag == 'CONTINUE':
-                raise ContinueException()
+                return CONTINUE_SIGNAL
 
             if len(node) == 3:
                 op, left, right = node
@@ -203,68 +1062,650 @@ class Evaluator:
                 left_val = self._eval(left) if left is not None else None
                 right_val = self._eval(right)
 
-                if not self._are_compatible(left_val, right_val, op_type):
-                    raise TypeConversionError(
-                        f"Incompatible types: {type(left_val).__name__} and {type(right_val).__name__} for {op_type}"
-                    )
-
-                # Binary operation handling
-                if op_type == 'PLUS':
-                    if isinstance(left_val, List) and isinstance(right_val, List):
-                        # Return a new List with combined elements
-                        return List(left_val.elements + right_val.elements)
-                    if isinstance(left_val, str) or isinstance(right_val, str):
-                        return str(left_val) + str(right_val)
-                    return left_val + right_val
-
-                elif op_type == 'MINUS':
-                    return left_val - right_val
-                elif op_type == 'MUL':
-                    return left_val * right_val
-                elif op_type == 'DIV':
-                    if right_val == 0:
-                        raise ZeroDivisionError("Division by zero")
-                    return left_val / right_val
-                elif op_type == 'MOD':
-                    if right_val == 0:
-                        raise ZeroDivisionError("Modulus by zero")
-                    return left_val % right_val
-                elif op_type == 'EQ':
-                    if type(left_val) != type(right_val):
-                        return False
-                    return left_val == right_val
-                elif op_type == 'NEQ':
-                    if type(left_val) != type(right_val):
-                        return True
-                    return left_val != right_val
-                elif op_type == 'LT':
-                    return left_val < right_val
-                elif op_type == 'GT':
-                    return left_val > right_val
-                elif op_type == 'LTE':
-                    return left_val <= right_val
-                elif op_type == 'GTE':
-                    return left_val >= right_val
-                elif op_type == 'AND':
-                    return left_val and right_val
-                elif op_type == 'OR':
-                    return left_val or right_val
+                # Fast path: the operands have the types the node saw last
+                entry = self.feedback.get(id(node))
+                if (entry is not None and type(left_val) is entry[1] and type(right_val) is entry[2]
+                        and entry[0] == op_type):
+                    return entry[3](left_val, right_val)
+                return self._specialise_node(node, op_type, left_val, right_val)
 
         raise Exception(f"Unknown AST node: {node}")
 
+    def _eval_for(self, node):
+        """
+        Run a for loop (resolved or not) over a List or a start:end range.
+        Like WHILE, its value is the value of the last completed iteration.
+        """
+        tag = node[0]
+        if tag in LIST_FOR_TAGS:
+            values = _list_values(self._eval(node[-2]))
+        else:
+            start = self._eval(node[-3])
+            values = _range_values(start, self._eval(node[-2]))
+        body = node[-1]
+
+        result = None
+        if tag in ('FOR', 'FOR_RANGE'):
+            for item in values:
+                self.countdown -= 1
+                if self.countdown <= 0:
+                    run_safepoint(self, node)
+                self.data.write(node[1], item)
+                value = self._eval(body)
+                if type(value) is ControlSignal:
+                    if value is BREAK_SIGNAL:
+                        break
+                    if value is RETURN_SIGNAL:
+                        return value
+                    continue
+                result = value
+        else:
+            slots = self.frame if tag in LOCAL_FOR_TAGS else self.data.slots
+            index = node[1]
+            for item in values:
+                self.countdown -= 1
+                if self.countdown <= 0:
+                    run_safepoint(self, node)
+                slots[index] = item
+                value = self._eval(body)
+                if type(value) is ControlSignal:
+                    if value is BREAK_SIGNAL:
+                        break
+                    if value is RETURN_SIGNAL:
+                        return value
+                    continue
+                result = value
+        return result
+
+    def _call(self, function, args):
+        """Make a function call with the tree-walking evaluator and return its value."""
+        _check_call(function, args, self.call_depth, self.max_call_depth)
+        self.countdown -= 1
+        if self.countdown <= 0:
+            run_safepoint(self, function)
+        if function.cache is not None or self.memo_depth:
+            return _call_memo(self, function, args, self._run_call)
+        return self._run_call(function, args)
+
+    def _run_call(self, function, args):
+        """Run the body of a function for a call and return the call's value."""
+        frame = function.new_frame(args)
+        caller_frame = self.frame
+        self.frame = frame
+        self.call_depth += 1
+        try:
+            result = self._eval(function.body)
+        except BudgetExceededError as error:
+            error.functions.append(function.name)
+            raise
+        finally:
+            self.frame = caller_frame
+            self.call_depth -= 1
+            function.free_frame(frame)
+        return self._returned(result)
+
+    def _returned(self, result):
+        """
+        Return the value of a call from the result of running its body: the
+        value of its RETURN, or None if the body ended without one.
+
+        Raises:
+        - BreakException, ContinueException: For a break or continue that
+          was not inside a loop of the function.
+        """
+        if result is RETURN_SIGNAL:
+            value = self.return_value
+            self.return_value = None
+            return value
+        _outside_loop(result)
+        return None
+
+    def _compile(self, node):
+        """
+        Core recursive method to compile AST nodes into closures.
+        Mirrors _eval node for node; errors are raised when the closure runs.
+        """
+        if isinstance(node, Token):
+            if node.type == 'VARIABLE':
+                name = node.value
+
+                def read_variable():
+                    return self.data.read(name)
+                return read_variable
+
+            value = node.value
+            return lambda: value
+
+        if isinstance(node, tuple):
+            tag = node[0]
+
+            if tag == 'LOAD_SLOT':
+                index = node[1]
+
+                def read_slot():
+                    value = self.data.slots[index]
+                    if value is UNDEFINED:
+                        return self.data.read_slot(index)  # raises the not-defined error
+                    return value
+                return read_slot
+
+            if tag == 'STORE_SLOT':
+                index = node[1]
+                value_expr = self._compile(node[3])
+
+                def write_slot():
+                    self.data.slots[index] = value_expr()
+                    return None
+                return write_slot
+
+            if tag == 'LOAD_LOCAL':
+                index, name = node[1], node[2]
+
+                def read_local():
+                    value = self.frame[index]
+                    if value is UNDEFINED:
+                        raise SlotNotDefinedError(f"Variable '{name}' not defined.")
+                    return value
+                return read_local
+
+            if tag == 'STORE_LOCAL':
+                index = node[1]
+                value_expr = self._compile(node[3])
+
+                def write_local():
+                    self.frame[index] = value_expr()
+                    return None
+                return write_local
+
+            if tag == 'CALL':
+                function_expr = self._compile(node[1])
+                arg_exprs = [self._compile(arg) for arg in node[2]]
+                call_compiled = self._call_compiled
+
+                def call():
+                    function = function_expr()
+                    return call_compiled(function, [arg() for arg in arg_exprs])
+                return call
+
+            if tag == 'RETURN':
+                value_expr = self._compile(node[1]) if node[1] is not None else (lambda: None)
+
+                def return_value():
+                    self.return_value = value_expr()
+                    return RETURN_SIGNAL
+                return return_value
+
+            if tag == 'DEFINE':
+                index, name, param_count, local_names, memo, body = node[1:]
+                body_code = self._compile(body)
+
+                def define():
+                    function = _make_function(name, param_count, local_names, memo, body, self.memo_size)
+                    function.closure = body_code
+                    self.data.slots[index] = function
+                    return None
+                return define
+
+            if tag == 'INT_CAST':
+                operand = self._compile(node[1])
+
+                def int_cast():
+                    val = operand()
+                    try:
+                        return int(val)
+                    except (ValueError, TypeError) as e:
+                        raise TypeConversionError(f"Cannot cast to int: {e}")
+                return int_cast
+
+            if tag == 'LIST_LITERAL':
+                elements = [self._compile(elem) for elem in node[1]]
+
+                def list_literal():
+                    if self.budget is not None:
+                        self.budget.add_elements(len(elements), node)
+                    return List([elem() for elem in elements])
+                return list_literal
+
+            if tag == 'LIST_ACCESS':
+                list_expr = self._compile(node[1])
+                index_expr = self._compile(node[2])
+
+                def list_access():
+                    list_obj = list_expr()
+                    if not isinstance(list_obj, List):
+                        raise TypeError("LIST_ACCESS requires a List object")
+                    index = index_expr()
+                    if not isinstance(index, int):
+                        raise TypeError("List index must be an integer")
+                    return list_obj.get(index)
+                return list_access
+
+            if tag == 'LIST_APPEND':
+                list_expr = self._compile(node[1])
+                value_expr = self._compile(node[2])
+
+                def list_append():
+                    list_obj = list_expr()
+                    if not isinstance(list_obj, List):
+                        raise TypeError("LIST_APPEND requires a List object")
+                    value = value_expr()
+                    if self.budget is not None:
+                        self.budget.add_elements(1, node)
+                    list_obj.append(value)
+                    return None
+                return list_append
+
+            if tag == 'LIST_REMOVE':
+                list_expr = self._compile(node[1])
+                index_expr = self._compile(node[2])
+
+                def list_remove():
+                    list_obj = list_expr()
+                    if not isinstance(list_obj, List):
+                        raise TypeError("LIST_REMOVE requires a List object")
+                    index = index_expr()
+                    if not isinstance(index, int):
+                        raise TypeError("List remove index must be an integer")
+                    return list_obj.remove(index)
+                return list_remove
+
+            if tag == 'METHOD_CALL':
+                obj_expr = self._compile(node[1])
+                method_name = node[2].value
+                arg_exprs = [self._compile(arg) for arg in node[3]]
+
+                def method_call():
+                    obj = obj_expr()
+                    return _call_method(obj, method_name, [arg() for arg in arg_exprs], self.budget, node)
+                return method_call
+
+            if tag == 'BLOCK':
+                statements = [self._compile(stmt) for stmt in node[1]]
+                if len(statements) == 1:
+                    return statements[0]
+
+                def block():
+                    result = None
+                    for stmt in statements:
+                        result = stmt()
+                        if type(result) is ControlSignal:
+                            break
+                    return result
+                return block
+
+            if tag == 'ASSIGN':
+                name = node[1].value
+                value_expr = self._compile(node[2])
+
+                def assign():
+                    self.data.write(name, value_expr())
+                    return None
+                return assign
+
+            if tag == 'PRINT':
+                value_expr = self._compile(node[1])
+
+                def print_value():
+                    self.output.print(value_expr())
+                    return None
+                return print_value
+
+            if tag == 'INPUT':
+                prompt_expr = self._compile(node[1])
+
+                def read_input():
+                    prompt = str(prompt_expr())
+                    self.output.flush()
+                    return self.input(prompt)
+                return read_input
+
+            if tag == 'IF':
+                branches = [(self._compile(cond), self._compile(action))
+                            for cond, action in zip(node[1], node[2])]
+                else_action = self._compile(node[3]) if node[3] else None
+
+                def if_statement():
+                    for cond, action in branches:
+                        if cond():
+                            return action()
+                    if else_action is not None:
+                        return else_action()
+                    return None
+                return if_statement
+
+            if tag == 'WHILE':
+                condition = self._compile(node[1])
+                body = self._compile(node[2])
+
+                def while_loop():
+                    result = None
+                    while condition():
+                        self.countdown -= 1
+                        if self.countdown <= 0:
+                            run_safepoint(self, node)
+                        value = body()
+                        if type(value) is ControlSignal:
+                            if value is BREAK_SIGNAL:
+                                break
+                            if value is RETURN_SIGNAL:
+                                return value
+                            continue
+                        result = value
+                    return result
+                return while_loop
+
+            if tag in FOR_TAGS:
+                return self._compile_for(node)
+
+            if tag == 'DEL':
+                name = node[1].value
+
+                def delete():
+                    self.data.delete(name)
+                    return None
+                return delete
+
+            if tag == 'DEL_SLOT':
+                index = node[1]
+
+                def delete_slot():
+                    self.data.delete_slot(index)
+                    return None
+                return delete_slot
+
+            if tag == 'DEL_LOCAL':
+                index, name = node[1], node[2]
+
+                def delete_local():
+                    if self.frame[index] is UNDEFINED:
+                        raise SlotNotDefinedError(f"Variable '{name}' not defined, cannot delete.")
+                    self.frame[index] = UNDEFINED
+                    return None
+                return delete_local
+
+            if tag == 'BREAK':
+                return lambda: BREAK_SIGNAL
+            elif tag == 'CONTINUE':
+                return lambda: CONTINUE_SIGNAL
+
+            if len(node) == 3:
+                return self._compile_operator(node)
+
+        def unknown_node():
+            raise Exception(f"Unknown AST node: {node}")
+        return unknown_node
+
+    def _compile_for(self, node):
+        """Compile a for loop into a closure; mirrors _eval_for."""
+        tag = node[0]
+        if tag in LIST_FOR_TAGS:
+            list_expr = self._compile(node[-2])
+
+            def values():
+                return _list_values(list_expr())
+        else:
+            start_expr = self._compile(node[-3])
+            end_expr = self._compile(node[-2])
+
+            def values():
+                start = start_expr()
+                return _range_values(start, end_expr())
+        body = self._compile(node[-1])
+
+        if tag in ('FOR', 'FOR_RANGE'):
+            name = node[1].value
+
+            def for_loop():
+                result = None
+                for item in values():
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, node)
+                    self.data.write(name, item)
+                    value = body()
+                    if type(value) is ControlSignal:
+                        if value is BREAK_SIGNAL:
+                            break
+                        if value is RETURN_SIGNAL:
+                            return value
+                        continue
+                    result = value
+                return result
+        else:
+            global_slots = self.data.slots
+            local = tag in LOCAL_FOR_TAGS
+            index = node[1]
+
+            def for_loop():
+                result = None
+                # A local loop variable lives in the frame of the running call
+                slots = self.frame if local else global_slots
+                for item in values():
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, node)
+                    slots[index] = item
+                    value = body()
+                    if type(value) is ControlSignal:
+                        if value is BREAK_SIGNAL:
+                            break
+                        if value is RETURN_SIGNAL:
+                            return value
+                        continue
+                    result = value
+                return result
+        return for_loop
+
+    def _call_compiled(self, function, args):
+        """Make a function call with compiled closures and return its value; mirrors _call."""
+        _check_call(function, args, self.call_depth, self.max_call_depth)
+        self.countdown -= 1
+        if self.countdown <= 0:
+            run_safepoint(self, function)
+        if function.cache is not None or self.memo_depth:
+            return _call_memo(self, function, args, self._run_compiled_call)
+        return self._run_compiled_call(function, args)
+
+    def _run_compiled_call(self, function, args):
+        """Run the compiled body of a function for a call and return the call's value."""
+        body = function.closure
+        if body is None:
+            body = function.closure = self._compile(function.body)
+        frame = function.new_frame(args)
+        caller_frame = self.frame
+        self.frame = frame
+        self.call_depth += 1
+        try:
+            result = body()
+        except BudgetExceededError as error:
+            error.functions.append(function.name)
+            raise
+        finally:
+            self.frame = caller_frame
+            self.call_depth -= 1
+            function.free_frame(frame)
+        return self._returned(result)
+
+    def _compile_operator(self, node):
+        """
+        Compile a unary or binary operator node into a closure bound to
+        the operator's own implementation.
+        """
+        op, left, right = node
+        op_type = op.type if isinstance(op, Token) else op
+
+        if op_type == 'MINUS' and left is None:
+            operand = self._compile(right)
+
+            def negate():
+                val = operand()
+                if not isinstance(val, (int, float)):
+                    raise TypeConversionError("Unary minus requires a number")
+                return -val
+            return negate
+
+        if op_type == 'NOT' and left is None:
+            operand = self._compile(right)
+
+            def logical_not():
+                val = operand()
+                if not isinstance(val, bool):
+                    raise TypeConversionError("Unary NOT requires a boolean")
+                return not val
+            return logical_not
+
+        left_expr = self._compile(left) if left is not None else (lambda: None)
+        right_expr = self._compile(right)
+        # Type feedback: the operand types seen last and the implementation for them
+        left_type = right_type = apply = None
+
+        def binary_operation():
+            nonlocal left_type, right_type, apply
+            left_val = left_expr()
+            right_val = right_expr()
+            if type(left_val) is left_type and type(right_val) is right_type:
+                return apply(left_val, right_val)
+            apply = _specialise(op_type, left_val, right_val)
+            if apply is None:
+                raise Exception(f"Unknown AST node: {node}")
+            if apply in ALLOCATING_OPERATIONS:
+                apply = _counted(apply, self, node)
+            left_type = type(left_val)
+            right_type = type(right_val)
+            return apply(left_val, right_val)
+        return binary_operation
+
+
+# ==== Binary Operation Implementations ====
+# Used by compiled code; each function assumes _are_compatible already passed.
+
+def _plus(left_val, right_val):
+    if isinstance(left_val, List) and isinstance(right_val, List):
+        return left_val.concat(right_val)
+    if isinstance(left_val, TEXT_TYPES) or isinstance(right_val, TEXT_TYPES):
+        return concat(left_val, right_val)
+    return left_val + right_val
+
+
+def _div(left_val, right_val):
+    if right_val == 0:
+        raise ZeroDivisionError("Division by zero")
+    return left_val / right_val
+
+
+def _mod(left_val, right_val):
+    if right_val == 0:
+        raise ZeroDivisionError("Modulus by zero")
+    return left_val % right_val
+
+
+def _eq(left_val, right_val):
+    if type(left_val) != type(right_val):
+        # A Rope and a str are both strings
+        return type(left_val) in TEXT_TYPES and type(right_val) in TEXT_TYPES and str(left_val) == str(right_val)
+    return left_val == right_val
+
+
+def _neq(left_val, right_val):
+    if type(left_val) != type(right_val):
+        return not (type(left_val) in TEXT_TYPES and type(right_val) in TEXT_TYPES
+                    and str(left_val) == str(right_val))
+    return left_val != right_val
+
+
+def _concat_lists(left_val, right_val):
+    return left_val.concat(right_val)
+
+
+BINARY_OPERATIONS = {
+    'PLUS': _plus,
+    'MINUS': operator.sub,
+    'MUL': operator.mul,
+    'DIV': _div,
+    'MOD': _mod,
+    'EQ': _eq,
+    'NEQ': _neq,
+    'LT': operator.lt,
+    'GT': operator.gt,
+    'LTE': operator.le,
+    'GTE': operator.ge,
+    'AND': lambda a, b: a and b,
+    'OR': lambda a, b: a or b,
+}
+
+
+# ==== Type Feedback ====
+# Whether the operands of a binary operator are compatible, and which branch
+# of _plus, _eq or _neq applies, depends only on their types. So every binary
+# node records the operand types it saw last with the implementation of its
+# operator for them (see _specialise), and runs that directly, without
+# _are_compatible or a dispatch on the operator, while the types stay the
+# same; when they change, the node is specialised again.
+
+# Binary nodes whose feedback an Evaluator keeps before starting over
+FEEDBACK_SIZE = 1 << 16
+
+# Implementations of the operators by (operator, left type, right type)
+_specialisations = {}
+
+# Implementations that build a list or string, counted against a budget
+# (see _counted) when a node is specialised to them
+ALLOCATING_OPERATIONS = (_concat_lists, concat)
+
+
+def _specialise(op_type, left_val, right_val):
+    """
+    Return the implementation of a binary operator for the types of its
+    operands, or None if the operator is unknown. It gives the same results
+    as BINARY_OPERATIONS for operands of these types.
+
+    Raises:
+    - TypeConversionError: If the operand types are incompatible.
+    """
+    key = (op_type, type(left_val), type(right_val))
+    apply = _specialisations.get(key)
+    if apply is not None:
+        return apply
+    if op_type not in BINARY_OPERATIONS:
+        return None
+    if not Evaluator._are_compatible(left_val, right_val, op_type):
+        raise TypeConversionError(
+            f"Incompatible types: {type_name(left_val)} and {type_name(right_val)} for {op_type}"
+        )
+
+    left_type, right_type = key[1], key[2]
+    if op_type == 'PLUS':
+        if issubclass(left_type, List) and issubclass(right_type, List):
+            apply = _concat_lists
+        elif issubclass(left_type, TEXT_TYPES) or issubclass(right_type, TEXT_TYPES):
+            apply = concat
+        else:
+            apply = operator.add
+    elif op_type == 'EQ' and left_type is right_type:
+        apply = operator.eq
+    elif op_type == 'NEQ' and left_type is right_type:
+        apply = operator.ne
+    else:
+        apply = BINARY_OPERATIONS[op_type]
+    _specialisations[key] = apply
+    return apply
+
 
 # Global Evaluator instance
 evaluator_instance = Evaluator()
 
 
-def evaluate(expression: str):
+def evaluate(expression: str, compiled=False):
     """
     Evaluate an input expression string by:
     1. Scanning into tokens
     2. Parsing into an AST
-    3. Evaluating the AST
+    3. Resolving variables to slots
+    4. Evaluating the AST (or compiling it to closures first if compiled=True)
     """
     scanner = Scanner(expression)
     parser = Parser(scanner)
-    ast = parser.parse()
+    ast, _ = resolve(parser.parse(), evaluator_instance.data)
+    if compiled:
+        return evaluator_instance.compile(ast)()
     return evaluator_instance.evaluate(ast)
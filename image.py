@@ -0,0 +1,608 @@
+"""
+State images: the variables of a Data store saved to a compact binary file.
+
+An image holds every defined variable by name, so a long-running script can
+be checkpointed and a REPL session picked up after a restart:
+
+    save_image('state.img', data)      # write all variables
+    load_image('state.img', data)      # replace the variables by the saved ones
+
+Values keep their identity within an image: a List (or Function, or Rope)
+that several variables or lists refer to is written once and all of them
+refer to the same object again after loading, cycles included. Lists with
+typed storage (see data.List) are written as raw 64-bit numbers, so large
+numeric lists save and load at disk speed.
+
+Functions are saved with their resolved body. The global slots in a body
+are looked up again by name in the store an image is loaded into, so an
+image can be loaded by another process or session. Memo functions get an
+empty result cache.
+
+Format: MAGIC, the format version (2 bytes) and the number of variables
+(8 bytes), then each variable as its name and its value. A value is a one
+byte tag followed by its payload (see the tags below); numbers are little
+endian. Strings, Ropes, Lists and Functions are numbered in the order they
+are written, and a REF to that number stands for any later occurrence.
+
+A Checkpointer saves an image every few seconds while a script runs (see
+main.py --checkpoint).
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from itertools import islice
+
+from tokens import Token, PositionedToken
+from data import List, Function, Rope, UNDEFINED, ROPE_MIN_LENGTH, TYPED_STORAGE_THRESHOLD, type_name
+from memo import MemoCache, MEMO_SIZE, global_reads
+from resolver import SLOT_TAGS
+
+
+# First bytes of every image file
+MAGIC = b"LIMG"
+
+# Bump when the layout of images changes; older versions cannot be loaded
+IMAGE_VERSION = 1
+
+# Value tags
+NONE = 0
+FALSE = 1
+TRUE = 2
+INT8 = 3            # 1 signed byte
+INT64 = 4           # 8 bytes
+BIG_INT = 5         # count, then that many bytes (two's complement)
+FLOAT = 6           # 8 bytes
+STR = 7             # count, then that many bytes of UTF-8
+ROPE = 8            # like STR; loaded as a Rope
+REF = 9             # count: number of a string, Rope, List or Function written before
+LIST = 10           # count, then the elements
+INT_LIST = 11       # count, then the elements as 8-byte ints
+FLOAT_LIST = 12     # count, then the elements as 8-byte floats
+TUPLE = 13          # count, then the items (AST nodes)
+PY_LIST = 14        # count, then the items (lists of AST nodes)
+TOKEN = 15          # type and value
+POSITIONED_TOKEN = 16  # type, value, line and column
+FUNCTION = 17       # name, parameter count, local names, memo flag and body
+
+# Typecode of typed storage -> its tag, and back
+ARRAY_TAGS = {'q': INT_LIST, 'd': FLOAT_LIST}
+ARRAY_TYPECODES = {INT_LIST: 'q', FLOAT_LIST: 'd'}
+
+# Number of items of the container tags with a fixed number of them
+FIXED_COUNTS = {TOKEN: 2, POSITIONED_TOKEN: 4, FUNCTION: 5}
+
+# Counts below this fit in their first byte; larger ones follow it in 8 bytes
+LONG_COUNT = 0xFF
+
+# Bytes collected before writing them, and read from the file at once
+BLOCK_SIZE = 1 << 20
+
+# Elements of typed storage written per block
+ARRAY_BLOCK = BLOCK_SIZE // 8
+
+# Nodes that refer to a global slot (and have its name in node[2])
+GLOBAL_SLOT_TAGS = frozenset(SLOT_TAGS + ('DEFINE',))
+
+HEADER = struct.Struct('<HQ')
+PACK_INT8 = struct.Struct('<b').pack
+PACK_INT64 = struct.Struct('<q').pack
+PACK_FLOAT = struct.Struct('<d').pack
+PACK_COUNT = struct.Struct('<Q').pack
+UNPACK_INT8 = struct.Struct('<b').unpack_from
+UNPACK_INT64 = struct.Struct('<q').unpack_from
+UNPACK_FLOAT = struct.Struct('<d').unpack_from
+UNPACK_COUNT = struct.Struct('<Q').unpack_from
+
+# Values of the tags without payload
+CONSTANTS = (None, False, True)
+
+# Bytes the reader keeps buffered before a tag: the largest tag with a
+# fixed size payload or a count
+HEADROOM = 16
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+# Typed storage is little endian in images
+SWAP_BYTES = sys.byteorder == 'big'
+
+
+# ==== Writing ====
+
+class _Writer:
+    """Encodes values into a binary stream, remembering those it numbered."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+        self.strings = {}   # text -> number
+        self.objects = {}   # id of a Rope, List or Function -> number
+        self.numbered = 0
+
+    def flush(self):
+        self.stream.write(self.buffer)
+        self.buffer = bytearray()
+
+    def count(self, n):
+        if n < LONG_COUNT:
+            self.buffer.append(n)
+        else:
+            self.buffer.append(LONG_COUNT)
+            self.buffer += PACK_COUNT(n)
+
+    def text(self, tag, text):
+        encoded = text.encode('utf-8', 'surrogatepass')
+        self.buffer.append(tag)
+        self.count(len(encoded))
+        if len(encoded) >= BLOCK_SIZE:
+            self.flush()
+            self.stream.write(encoded)
+        else:
+            self.buffer += encoded
+
+    def number(self, key, table):
+        """Number a value written for the first time; return its REF number if it was written before."""
+        number = table.get(key)
+        if number is not None:
+            self.buffer.append(REF)
+            self.count(number)
+            return number
+        table[key] = self.numbered
+        self.numbered += 1
+        return None
+
+    def typed_elements(self, items, length):
+        """Write the first length elements of a typed storage as raw numbers."""
+        self.flush()
+        # Copy block by block: a view of the array would keep a running
+        # script from appending to it while a Checkpointer writes
+        for start in range(0, length, ARRAY_BLOCK):
+            block = items[start:min(start + ARRAY_BLOCK, length)]
+            if SWAP_BYTES:
+                block.byteswap()
+            self.stream.write(block.tobytes())
+
+    def value(self, value):
+        """Write a value and everything it contains."""
+        buffer = self.buffer
+        # Iterators over the items of the containers being written
+        stack = [iter((value,))]
+        while stack:
+            for value in stack[-1]:
+                if len(buffer) >= BLOCK_SIZE:
+                    self.flush()
+                    buffer = self.buffer
+                kind = type(value)
+                if kind is int:
+                    if -128 <= value < 128:
+                        buffer.append(INT8)
+                        buffer += PACK_INT8(value)
+                    elif INT64_MIN <= value <= INT64_MAX:
+                        buffer.append(INT64)
+                        buffer += PACK_INT64(value)
+                    else:
+                        encoded = value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+                        buffer.append(BIG_INT)
+                        self.count(len(encoded))
+                        buffer += encoded
+                elif kind is str:
+                    if self.number(value, self.strings) is None:
+                        self.text(STR, value)
+                        buffer = self.buffer
+                elif kind is bool:
+                    buffer.append(TRUE if value else FALSE)
+                elif value is None:
+                    buffer.append(NONE)
+                elif kind is float:
+                    buffer.append(FLOAT)
+                    buffer += PACK_FLOAT(value)
+                elif kind is List:
+                    if self.number(id(value), self.objects) is not None:
+                        continue
+                    items = value.items
+                    if type(items) is array:
+                        buffer.append(ARRAY_TAGS[items.typecode])
+                        self.count(value.length)
+                        self.typed_elements(items, value.length)
+                        buffer = self.buffer
+                    else:
+                        buffer.append(LIST)
+                        self.count(value.length)
+                        stack.append(islice(items, value.length))
+                        break
+                elif kind is tuple or kind is list:
+                    buffer.append(TUPLE if kind is tuple else PY_LIST)
+                    self.count(len(value))
+                    stack.append(iter(value))
+                    break
+                elif kind is Token:
+                    buffer.append(TOKEN)
+                    stack.append(iter((value.type, value.value)))
+                    break
+                elif kind is PositionedToken:
+                    buffer.append(POSITIONED_TOKEN)
+                    stack.append(iter((value.type, value.value, value.line, value.column)))
+                    break
+                elif kind is Rope:
+                    if self.number(id(value), self.objects) is None:
+                        self.text(ROPE, str(value))
+                        buffer = self.buffer
+                elif kind is Function:
+                    if self.number(id(value), self.objects) is not None:
+                        continue
+                    buffer.append(FUNCTION)
+                    stack.append(iter((value.name, value.param_count, value.local_names,
+                                       value.cache is not None, value.body)))
+                    break
+                else:
+                    raise TypeError(f"Cannot save a value of type {type_name(value)}")
+            else:
+                stack.pop()
+
+
+def write_image(stream, variables):
+    """
+    Write an image of variables to a binary stream.
+
+    Parameters:
+    - stream: A binary file object
+    - variables (list): (name, value) pairs
+
+    Raises:
+    - TypeError: If a value cannot be saved.
+    """
+    stream.write(MAGIC + HEADER.pack(IMAGE_VERSION, len(variables)))
+    writer = _Writer(stream)
+    for name, value in variables:
+        writer.value(name)
+        writer.value(value)
+    writer.flush()
+
+
+def defined_variables(data, values=None):
+    """
+    Return the (name, value) pairs of the defined variables of a Data
+    store, or of values taken from its slots (such as a snapshot()).
+    """
+    if values is None:
+        values = data.slots
+    return [(name, value) for name, value in zip(data.names, values) if value is not UNDEFINED]
+
+
+def save_image(path, data, variables=None):
+    """
+    Write the variables of a Data store (or the given (name, value) pairs)
+    to an image file. The file is replaced only once the image is complete,
+    so a crash while saving leaves the previous image intact.
+
+    Returns:
+    - int: The size of the image in bytes
+
+    Raises:
+    - TypeError: If a value cannot be saved.
+    - OSError: If the file cannot be written.
+    """
+    if variables is None:
+        variables = defined_variables(data)
+    partial = path + ".partial"
+    try:
+        with open(partial, 'wb') as f:
+            write_image(f, variables)
+            size = f.tell()
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return size
+
+
+# ==== Reading ====
+
+class _Reader:
+    """Decodes values from a binary stream into a Data store's slot numbering."""
+
+    def __init__(self, stream, data, memo_size):
+        self.stream = stream
+        self.data = data
+        self.memo_size = memo_size
+        self.buffer = b""
+        self.position = 0
+        self.numbered = []  # number -> string, Rope, List or Function
+
+    def fill(self, n):
+        """Make the buffer hold the next n bytes (fewer at the end of the stream)."""
+        rest = self.buffer[self.position:]
+        self.buffer = rest + self.stream.read(max(n - len(rest), BLOCK_SIZE))
+        self.position = 0
+
+    def typed_elements(self, typecode, length):
+        """Read length raw numbers into a new typed storage."""
+        items = array(typecode, [0]) * length
+        with memoryview(items) as view, view.cast('B') as raw:
+            filled = min(len(raw), len(self.buffer) - self.position)
+            raw[:filled] = self.buffer[self.position:self.position + filled]
+            self.position += filled
+            while filled < len(raw):
+                read = self.stream.readinto(raw[filled:])
+                if not read:
+                    raise ValueError("State image is truncated")
+                filled += read
+        if SWAP_BYTES:
+            items.byteswap()
+        return items
+
+    def value(self):
+        """
+        Read one value and everything it contains.
+
+        Raises:
+        - ValueError: If the image is invalid.
+        - IndexError, struct.error: If the image ends within the value.
+        """
+        numbered = self.numbered
+        # Containers being read: [tag, count, items, List or number]
+        stack = []
+        # The buffer and position live in locals while decoding; self has
+        # them whenever another method reads from the stream
+        buffer, position = self.buffer, self.position
+        end = len(buffer)
+        while True:
+            if position + HEADROOM > end:
+                self.position = position
+                self.fill(HEADROOM)
+                buffer, position = self.buffer, 0
+                end = len(buffer)
+            tag = buffer[position]
+            position += 1
+
+            if tag == INT8:
+                value = UNPACK_INT8(buffer, position)[0]
+                position += 1
+            elif tag == INT64:
+                value = UNPACK_INT64(buffer, position)[0]
+                position += 8
+            elif tag == FLOAT:
+                value = UNPACK_FLOAT(buffer, position)[0]
+                position += 8
+            elif tag <= TRUE:
+                value = CONSTANTS[tag]
+            elif tag in FIXED_COUNTS:
+                owner = None
+                if tag == FUNCTION:
+                    owner = len(numbered)
+                    numbered.append(None)  # set once the function is complete
+                stack.append([tag, FIXED_COUNTS[tag], [], owner])
+                continue
+            else:
+                count = buffer[position]
+                position += 1
+                if count == LONG_COUNT:
+                    count = UNPACK_COUNT(buffer, position)[0]
+                    position += 8
+
+                if tag == REF:
+                    if count >= len(numbered) or numbered[count] is None:
+                        raise ValueError(f"State image refers to unknown value {count}")
+                    value = numbered[count]
+                elif tag == LIST or tag == TUPLE or tag == PY_LIST:
+                    owner = None
+                    if tag == LIST:
+                        # Numbered before its elements, which may refer to it
+                        owner = List()
+                        numbered.append(owner)
+                    if count:
+                        stack.append([tag, count, [], owner])
+                        continue
+                    value = self.build(tag, [], owner)
+                elif tag in ARRAY_TYPECODES:
+                    self.position = position
+                    value = List(self.typed_elements(ARRAY_TYPECODES[tag], count))
+                    buffer, position = self.buffer, self.position
+                    end = len(buffer)
+                    numbered.append(value)
+                elif tag == STR or tag == ROPE or tag == BIG_INT:
+                    if position + count > end:
+                        self.position = position
+                        self.fill(count)
+                        buffer, position = self.buffer, 0
+                        end = len(buffer)
+                        if count > end:
+                            raise ValueError("State image is truncated")
+                    payload = buffer[position:position + count]
+                    position += count
+                    if tag == BIG_INT:
+                        value = int.from_bytes(payload, 'little', signed=True)
+                    else:
+                        value = payload.decode('utf-8', 'surrogatepass')
+                        if tag == ROPE and count >= ROPE_MIN_LENGTH:
+                            value = Rope([value], 1, len(value))
+                        numbered.append(value)
+                else:
+                    raise ValueError(f"State image has an unknown value tag {tag}")
+
+            # Hand the value to the containers it completes
+            while stack:
+                container = stack[-1]
+                items = container[2]
+                items.append(value)
+                if len(items) < container[1]:
+                    break
+                stack.pop()
+                value = self.build(container[0], items, container[3])
+            else:
+                self.buffer, self.position = buffer, position
+                return value
+
+    def build(self, tag, items, owner):
+        """Return the value of a container whose items have all been read."""
+        if tag == LIST:
+            if len(items) >= TYPED_STORAGE_THRESHOLD:
+                List.__init__(owner, items)
+            else:
+                owner.items = items
+                owner.length = len(items)
+            return owner
+        if tag == TUPLE:
+            if type(items[0]) is str and items[0] in GLOBAL_SLOT_TAGS and type(items[1]) is int:
+                # A global slot: its number in the Data store loading the image
+                items[1] = self.data.slot(items[2])
+            return tuple(items)
+        if tag == PY_LIST:
+            return items
+        if tag == TOKEN:
+            return Token(*items)
+        if tag == POSITIONED_TOKEN:
+            return PositionedToken(*items)
+        name, param_count, local_names, memo, body = items
+        function = Function(name, param_count, local_names, body)
+        if memo:
+            function.cache = MemoCache(self.memo_size)
+            function.global_reads = global_reads(body)
+        self.numbered[owner] = function
+        return function
+
+
+def read_image(stream, data, memo_size=MEMO_SIZE):
+    """
+    Read an image written by write_image() from a binary stream.
+
+    Parameters:
+    - stream: A binary file object
+    - data (Data): The store the functions of the image will run against
+      (global variables in their bodies get slots of this store)
+    - memo_size (int): Cache size of the memo functions of the image
+
+    Returns:
+    - list: The (name, value) pairs of the image
+
+    Raises:
+    - ValueError: If the stream does not hold a valid image of this version.
+    """
+    header = stream.read(len(MAGIC) + HEADER.size)
+    if header[:len(MAGIC)] != MAGIC or len(header) < len(MAGIC) + HEADER.size:
+        raise ValueError("Not a state image")
+    version, count = HEADER.unpack(header[len(MAGIC):])
+    if version != IMAGE_VERSION:
+        raise ValueError(f"State image has format version {version}, expected {IMAGE_VERSION}")
+    reader = _Reader(stream, data, memo_size)
+    variables = []
+    try:
+        for _ in range(count):
+            name = reader.value()
+            if type(name) is not str:
+                raise ValueError("State image has a variable without a name")
+            variables.append((name, reader.value()))
+    except (IndexError, struct.error):
+        raise ValueError("State image is truncated")
+    return variables
+
+
+def load_image(path, data, memo_size=MEMO_SIZE):
+    """
+    Replace the variables of a Data store by those of an image file.
+    Variables the image does not have are deleted; if the image cannot be
+    read, the variables stay as they were.
+
+    Returns:
+    - int: The number of variables loaded
+
+    Raises:
+    - ValueError: If the file is not a valid image.
+    - OSError: If the file cannot be read.
+    """
+    with open(path, 'rb') as f:
+        variables = read_image(f, data, memo_size)
+    data.clear()
+    for name, value in variables:
+        data.write(name, value)
+    return len(variables)
+
+
+# ==== Checkpoints ====
+
+class Checkpointer:
+    """
+    Saves an image of a Data store every interval seconds while a script runs.
+
+    The attached runners (Evaluator or VM) call it at their safepoints (see
+    run_safepoint() in evaluator.py), where no operation is half done. Once
+    interval seconds have passed, it takes a snapshot of the variables and
+    the image is written from the snapshot in a background thread while the
+    script goes on. A checkpoint that comes due while the previous one is
+    still being written is skipped.
+
+    Attributes:
+    - path (str): The image file
+    - interval (float): Seconds between checkpoints
+    - saved (int): Checkpoints written
+    - error (Exception or None): Why the last checkpoint failed, if it did
+    """
+
+    def __init__(self, path, data, interval):
+        if interval <= 0:
+            raise ValueError("Checkpoint interval must be positive")
+        self.path = path
+        self.data = data
+        self.interval = interval
+        self.runners = []
+        self.saved = 0
+        self.error = None
+        self.writer = None     # thread writing the current checkpoint
+        self.due = None        # time.monotonic() of the next checkpoint, once started
+
+    def attach(self, runner):
+        """Take checkpoints when runner (an Evaluator or VM) runs the script."""
+        self.runners.append(runner)
+        runner.safepoint_handlers.append(self.checkpoint)
+
+    def start(self):
+        """Start counting the interval to the first checkpoint."""
+        self.due = time.monotonic() + self.interval
+
+    def checkpoint(self, runner):
+        """
+        Safepoint handler: when due, snapshot the variables and write them
+        in the background. The snapshot (see Data.snapshot) keeps Lists
+        shared by several variables or Lists, and cycles, as they are. A
+        failure is recorded in error and never stops the script.
+        """
+        if self.due is None or time.monotonic() < self.due:
+            return
+        if self.writer is not None and self.writer.is_alive():
+            return
+        self.due = time.monotonic() + self.interval
+        try:
+            variables = defined_variables(self.data, self.data.snapshot())
+        except Exception as error:
+            self.error = error
+            return
+        self.writer = threading.Thread(target=self._write, args=(variables,),
+                                       name="checkpoint writer", daemon=True)
+        self.writer.start()
+
+    def _write(self, variables):
+        try:
+            save_image(self.path, self.data, variables)
+            self.saved += 1
+            self.error = None
+        except Exception as error:
+            self.error = error
+
+    def stop(self, final=True):
+        """
+        Stop taking checkpoints, wait for the one being written and, if
+        final is True, save the variables as they are now.
+        """
+        self.due = None
+        for runner in self.runners:
+            if self.checkpoint in runner.safepoint_handlers:
+                runner.safepoint_handlers.remove(self.checkpoint)
+        if self.writer is not None:
+            self.writer.join()
+        if final:
+            self._write(defined_variables(self.data))
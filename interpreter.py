@@ -0,0 +1,336 @@
+"""
+Embedding API: run programs in isolated, reusable sessions.
+
+main.py keeps one Evaluator for the whole process. A program that embeds
+the language (a service running scripts for many requests) uses this
+module instead:
+
+    interpreter = Interpreter(mode='vm')
+    program = interpreter.compile('print("hello " + name)')
+
+    session = interpreter.session()
+    session.write('name', 'world')
+    session.run(program)
+    session.output.getvalue()        # 'hello world\\n'
+
+- Interpreter holds what sessions can share: the settings and the compiled
+  Programs (parsed and optimized once per source text).
+- Session has its own Data, Evaluator and VM, so sessions never see each
+  other's variables. It captures PRINT output in a CollectedOutput (or
+  another sink, see output.py) and answers INPUT from lines given with
+  provide_input(). Programs are resolved against the session's Data once
+  and kept, so running the same Program again costs only the run.
+- Session.snapshot() / restore() / reset() save and bring back the
+  variables cheaply (lists are shared copy-on-write), and SessionPool keeps
+  reset sessions for reuse, so a request does not allocate a new session.
+
+Sessions are not thread-safe, but different sessions (and a SessionPool)
+can be used from different threads.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from scanner import Scanner
+from parser import Parser
+from optimizer import Optimizer
+from resolver import resolve
+from evaluator import Evaluator, MAX_CALL_DEPTH, allow_call_depth
+from vm import VM, compile_ast
+from memo import MEMO_SIZE
+from output import CollectedOutput
+from budget import BudgetExceededError
+
+
+# Backends a Session can run programs with
+MODES = ('tree', 'compile', 'iterative', 'vm')
+
+# Default number of compiled Programs an Interpreter keeps by source text
+PROGRAM_CACHE_SIZE = 128
+
+
+def error_message(error):
+    """
+    Return a user-friendly message for an error raised by a program,
+    describing its kind, as main.py prints it after "Error: ".
+    """
+    if isinstance(error, BudgetExceededError):
+        return f"Budget exceeded: {error}"
+    if isinstance(error, TypeError):
+        return f"Type mismatch error: {error}"
+    if isinstance(error, SyntaxError):
+        return f"Syntax error: {error}"
+    if isinstance(error, ValueError):
+        return f"Value error: {error}"
+    return f"Error while calculating expression: {error}"
+
+
+def format_value(value):
+    """
+    Format a program's result as main.py shows it after "Result: ":
+    strings in quotes, booleans as true/false.
+    """
+    if isinstance(value, str):
+        return f'"{value}"'
+    elif isinstance(value, bool):
+        return 'true' if value else 'false'
+    else:
+        return str(value)
+
+
+class Program:
+    """
+    A parsed and optimized program, ready to be run by any Session of the
+    Interpreter that compiled it.
+
+    Attributes:
+    - ast: The AST (unresolved: sessions resolve it against their own Data)
+    - source (str or None): The source text, if compiled from text
+    """
+
+    def __init__(self, ast, source=None):
+        self.ast = ast
+        self.source = source
+
+    def __repr__(self):
+        return f"Program({len(self.source) if self.source is not None else '?'} characters)"
+
+
+class Interpreter:
+    """
+    Settings and caches shared by the sessions that run programs.
+
+    Parameters:
+    - mode (str): Backend of the sessions, one of MODES
+    - optimize (bool): Run the Optimizer on compiled programs
+    - scanner_class: Scanner implementation used to tokenise sources
+    - max_call_depth (int): Maximum depth of nested function calls
+    - memo_size (int): Results cached per memo function
+    - program_cache_size (int): Programs kept by source text (0 disables)
+    - budget (Budget or None): Limits of every run; each session counts
+      against its own copy (see budget.py)
+
+    Raises:
+    - ValueError: If mode is not one of MODES.
+    """
+
+    def __init__(self, mode='tree', optimize=True, scanner_class=Scanner,
+                 max_call_depth=MAX_CALL_DEPTH, memo_size=MEMO_SIZE,
+                 program_cache_size=PROGRAM_CACHE_SIZE, budget=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.optimizer = Optimizer() if optimize else None
+        self.scanner_class = scanner_class
+        self.max_call_depth = max_call_depth
+        self.memo_size = memo_size
+        self.program_cache_size = program_cache_size
+        self.budget = budget
+        self.programs = OrderedDict()  # source -> Program, least recently used first
+        self.lock = threading.Lock()
+        if mode != 'iterative':
+            allow_call_depth(max_call_depth)
+
+    def compile(self, source):
+        """
+        Return the Program for a source text, parsing and optimizing it only
+        if it is not cached.
+
+        Raises:
+        - SyntaxError, ValueError: If the source does not parse.
+        """
+        with self.lock:
+            program = self.programs.get(source)
+            if program is not None:
+                self.programs.move_to_end(source)
+                return program
+            ast = Parser(self.scanner_class(source)).parse()
+            if self.optimizer is not None:
+                ast = self.optimizer.optimize(ast)
+            program = Program(ast, source)
+            if self.program_cache_size > 0:
+                self.programs[source] = program
+                if len(self.programs) > self.program_cache_size:
+                    self.programs.popitem(last=False)
+            return program
+
+    def session(self, output=None):
+        """Create a new Session (see Session)."""
+        return Session(self, output)
+
+    def run(self, source, inputs=()):
+        """
+        Run a source text or Program in a new Session.
+
+        Returns:
+        - (result, output): The program's result and the text it printed
+        """
+        session = self.session()
+        session.provide_input(*inputs)
+        result = session.run(source)
+        return result, session.output.getvalue()
+
+
+class Session:
+    """
+    An isolated run-time state: its own variables, output and input.
+
+    Attributes:
+    - interpreter (Interpreter): Settings and compiled programs
+    - data (Data): The session's variables
+    - output: Sink of PRINT (a CollectedOutput unless another was given)
+    """
+
+    def __init__(self, interpreter, output=None):
+        self.interpreter = interpreter
+        self.evaluator = Evaluator()
+        self.data = self.evaluator.data
+        self.vm = VM(self.data)
+        self.output = output if output is not None else CollectedOutput()
+        self.inputs = deque()
+        # Program -> its prepared form for this session's Data
+        self.prepared = weakref.WeakKeyDictionary()
+        budget = interpreter.budget.copy() if interpreter.budget is not None else None
+        for runner in (self.evaluator, self.vm):
+            runner.output = self.output
+            runner.input = self.read_input
+            runner.max_call_depth = interpreter.max_call_depth
+            runner.memo_size = interpreter.memo_size
+            runner.budget = budget
+
+    # ==== Running programs ====
+
+    def run(self, program):
+        """
+        Run a Program (or a source text, compiled by the interpreter first)
+        and return its result. Variables it leaves stay in the session for
+        the next run.
+
+        Raises:
+        - The errors of the program (TypeError, ValueError, ...), unchanged.
+        - BudgetExceededError: If the run goes over the interpreter's budget.
+        """
+        if not isinstance(program, Program):
+            program = self.interpreter.compile(program)
+        prepared = self.prepared.get(program)
+        if prepared is None:
+            prepared = self.prepared[program] = self.prepare(program)
+        try:
+            return prepared()
+        finally:
+            self.output.flush()
+
+    def prepare(self, program):
+        """Resolve or compile a Program for this session; return a function running it."""
+        mode = self.interpreter.mode
+        if mode == 'vm':
+            code = compile_ast(program.ast, self.data)
+            return lambda: self.vm.run(code)
+        ast, _ = resolve(program.ast, self.data)
+        if mode == 'compile':
+            return self.evaluator.compile(ast)
+        if mode == 'iterative':
+            return lambda: self.evaluator.evaluate_iterative(ast)
+        return lambda: self.evaluator.evaluate(ast)
+
+    # ==== Input ====
+
+    def provide_input(self, *lines):
+        """Queue lines to be returned by input() in the programs, in order."""
+        self.inputs.extend(str(line) for line in lines)
+
+    def read_input(self, prompt):
+        """
+        Answer an INPUT with the next queued line. The prompt is not shown.
+
+        Raises:
+        - EOFError: If no input is queued, as input() at the end of input.
+        """
+        if not self.inputs:
+            raise EOFError("No input left for input()")
+        return self.inputs.popleft()
+
+    # ==== Variables ====
+
+    def read(self, name):
+        """Return the value of a variable (VariableNotDefinedError if not defined)."""
+        return self.data.read(name)
+
+    def write(self, name, value):
+        """Set a variable, e.g. to pass a request's parameters to a program."""
+        self.data.write(name, value)
+
+    def variables(self):
+        """Dictionary of the defined variables."""
+        return self.data.all()
+
+    # ==== State ====
+
+    def snapshot(self):
+        """Return the session's variables, for restore() (see Data.snapshot)."""
+        return self.data.snapshot()
+
+    def restore(self, snapshot):
+        """Set the variables back to a snapshot() of this session."""
+        self.data.restore(snapshot)
+
+    def reset(self):
+        """
+        Forget all variables, queued input and collected output. Compiled
+        programs stay prepared, so running them again is still cheap.
+        """
+        self.data.clear()
+        self.inputs.clear()
+        if isinstance(self.output, CollectedOutput):
+            self.output.clear()
+        else:
+            self.output.flush()
+
+
+class SessionPool:
+    """
+    Keeps reset Sessions of an Interpreter for reuse.
+
+        pool = SessionPool(interpreter)
+        with pool.session() as session:
+            session.run(program)
+
+    Parameters:
+    - interpreter (Interpreter): Creates the sessions
+    - max_idle (int): Sessions kept for reuse; more are dropped on release
+    """
+
+    def __init__(self, interpreter, max_idle=8):
+        self.interpreter = interpreter
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self):
+        """Return an idle session, or a new one if there is none."""
+        with self.lock:
+            if self.idle:
+                self.reused += 1
+                return self.idle.pop()
+            self.created += 1
+        return self.interpreter.session()
+
+    def release(self, session):
+        """Reset a session and keep it for reuse (unless the pool is full)."""
+        session.reset()
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(session)
+
+    @contextmanager
+    def session(self):
+        """Context manager: acquire a session and release it afterwards."""
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
@@ -1,11 +1,47 @@
-from scanner import Scanner
+from scanner import Scanner, RegexScanner, StreamScanner
 from parser import Parser
-from evaluator import Evaluator
+from evaluator import Evaluator, MAX_CALL_DEPTH, allow_call_depth
+from resolver import resolve
+from parse_cache import ParseCache
+from optimizer import Optimizer
+from vm import VM, compile_ast, disassemble
+from data import Function
+from memo import MEMO_SIZE
+from profiler import Profiler, ProfilingEvaluator
+from output import StreamOutput, OUTPUT_BUFFER_SIZE
+from interpreter import error_message, format_value
+from batch import find_scripts, run_batch, write_report
+from image import Checkpointer
+from budget import Budget
+import argparse
 import os
+import re
 
 # Global Evaluator instance to retain variable states across expressions
 evaluator_instance = Evaluator()
 
+# Bytecode VM sharing the evaluator's variables
+vm_instance = VM(evaluator_instance.data)
+
+# Where PRINT writes; flushed after every program (see output.py)
+output = StreamOutput(buffer_size=0)
+evaluator_instance.output = vm_instance.output = output
+
+# Parsed programs, so repeated sources skip scanning and parsing
+parse_cache = ParseCache()
+
+# Constant folding / dead-branch pass run on every AST (None disables it)
+optimizer = Optimizer()
+
+# Scanner implementations selectable with --scanner
+SCANNERS = {'char': Scanner, 'regex': RegexScanner}
+
+# Options of parse_arguments() that set a limit of the Budget of every run
+BUDGET_OPTIONS = ('max_steps', 'max_seconds', 'max_list_elements', 'max_string_chars')
+
+# REPL commands saving and loading the variables: 'save FILE', 'load FILE'
+STATE_COMMAND = re.compile(r"(save|load)\s+([^\s=]\S*)", re.IGNORECASE)
+
 
 def clear_screen():
     """
@@ -16,17 +52,61 @@ def clear_screen():
     print("[Screen cleared]")
 
 
-def calculate(text):
+def execute(ast, compiled=False, vm=False, iterative=False):
+    """
+    Runs a parsed AST with the selected backend.
+
+    Parameters:
+    - ast: The AST from Parser (a whole program or a single statement)
+    - compiled (bool): Compile the AST to closures before running it
+    - vm (bool): Compile the AST to bytecode and run it on the VM
+    - iterative (bool): Evaluate with an explicit stack instead of recursion
+
+    Returns:
+    - The result of evaluation (any data type)
+    """
+    if optimizer is not None:
+        ast = optimizer.optimize(ast)
+    # With a budget, a line table lets its errors name the source line
+    budget = evaluator_instance.budget
+    lines = None
+    if budget is not None:
+        lines = budget.lines = {}
+    if vm:
+        return vm_instance.run(compile_ast(ast, vm_instance.data, lines))
+    ast, _ = resolve(ast, evaluator_instance.data, lines)
+    if compiled:
+        return evaluator_instance.compile(ast)()
+    if iterative:
+        return evaluator_instance.evaluate_iterative(ast)
+    return evaluator_instance.evaluate(ast)
+
+
+def calculation_error(error):
+    """
+    Wraps an error raised while calculating in an Exception with a
+    user-friendly message describing its kind (see error_message()).
+    """
+    return Exception(error_message(error))
+
+
+def calculate(text, compiled=False, vm=False, scanner_class=Scanner, iterative=False):
     """
     Performs the complete process of evaluating an input expression.
 
     Steps:
     1. Tokenise the input using Scanner
-    2. Parse tokens into an AST using Parser
-    3. Evaluate the AST using Evaluator
+    2. Parse tokens into an AST using Parser (skipped if parse_cache has it)
+    3. Fold constants and remove dead branches using Optimizer
+    4. Resolve variables in the AST to storage slots
+    5. Evaluate the AST using Evaluator
 
     Parameters:
     - text (str): The user input expression
+    - compiled (bool): Compile the AST to closures before running it
+    - vm (bool): Compile the AST to bytecode and run it on the VM
+    - scanner_class: Scanner implementation used to tokenise the text
+    - iterative (bool): Evaluate with an explicit stack instead of recursion
 
     Returns:
     - The result of evaluation (any data type)
@@ -35,18 +115,86 @@ def calculate(text):
     - Exception: With appropriate error message if any stage fails
     """
     try:
-        scanner = Scanner(text)
-        parser = Parser(scanner)
-        ast = parser.parse()
+        ast = parse_cache.parse(text, scanner_class, positions=evaluator_instance.budget is not None)
+        return execute(ast, compiled, vm, iterative)
+    except Exception as ex:
+        raise calculation_error(ex)
+    finally:
+        output.flush()
+
+
+def calculate_profiled(text, profiler, scanner_class=Scanner):
+    """
+    Evaluates a program like calculate(), recording a per-node profile.
+
+    The text is scanned with source positions (bypassing parse_cache, whose
+    ASTs have none) so the profile can name source lines, and is run by
+    evaluator_instance, which must be a ProfilingEvaluator using profiler.
+
+    Parameters:
+    - text (str): The program source
+    - profiler (Profiler): Receives the line table and the timings
+    - scanner_class: Scanner implementation used to tokenise the text
+
+    Returns:
+    - The result of evaluation (any data type)
+
+    Raises:
+    - Exception: With appropriate error message if any stage fails
+    """
+    try:
+        ast = Parser(scanner_class(text, positions=True)).parse()
+        if optimizer is not None:
+            ast = optimizer.optimize(ast)
+        ast, _ = resolve(ast, evaluator_instance.data, profiler.lines)
+        if evaluator_instance.budget is not None:
+            evaluator_instance.budget.lines = profiler.lines
         return evaluator_instance.evaluate(ast)
-    except TypeError as te:
-        raise Exception(f"Type mismatch error: {te}")
-    except SyntaxError as se:
-        raise Exception(f"Syntax error: {se}")
-    except ValueError as ve:
-        raise Exception(f"Value error: {ve}")
     except Exception as ex:
-        raise Exception(f"Error while calculating expression: {ex}")
+        raise calculation_error(ex)
+    finally:
+        output.flush()
+
+
+def calculate_stream(file, compiled=False, vm=False, iterative=False):
+    """
+    Evaluates a script read from a file one top-level statement at a time.
+
+    Each statement is scanned, parsed and run before the next one is read,
+    and its AST is dropped afterwards, so memory use depends on the largest
+    statement rather than the file size. Unlike calculate(), statements
+    before a syntax error have already run when the error is reported,
+    so tokens record their positions for the error to name its line.
+    A budget is started once and covers the whole script, not each
+    statement.
+
+    Parameters:
+    - file: An open text file
+    - compiled (bool): Compile each statement to closures before running it
+    - vm (bool): Compile each statement to bytecode and run it on the VM
+    - iterative (bool): Evaluate with an explicit stack instead of recursion
+
+    Returns:
+    - The result of the last statement (any data type)
+
+    Raises:
+    - Exception: With appropriate error message if any stage fails
+    """
+    budget = evaluator_instance.budget
+    if budget is not None:
+        budget.per_run = False
+        budget.start()
+    try:
+        result = None
+        for statement in Parser(StreamScanner(file, positions=True)).statements():
+            result = execute(statement, compiled, vm, iterative)
+        return result
+    except Exception as ex:
+        raise calculation_error(ex)
+    finally:
+        if budget is not None:
+            budget.per_run = True
+        output.flush()
 
 
 def format_result(value):
@@ -59,12 +207,48 @@ def format_result(value):
     Returns:
     - str: Formatted string
     """
-    if isinstance(value, str):
-        return f'"{value}"'
-    elif isinstance(value, bool):
-        return 'true' if value else 'false'
-    else:
-        return str(value)
+    return format_value(value)
+
+
+def memo_report(data):
+    """
+    Describes the result caches of the memo functions defined in data.
+
+    Parameters:
+    - data: The Data store holding the functions
+
+    Returns:
+    - list: One line of cache counters per memo function
+    """
+    lines = []
+    for name, value in data.all().items():
+        if isinstance(value, Function) and value.cache is not None:
+            stats = ", ".join(f"{key}={count}" for key, count in value.cache.stats().items())
+            lines.append(f"{name}: {stats}")
+    return lines
+
+
+def clear_memo_caches(data):
+    """Forgets the cached results of all memo functions defined in data."""
+    for value in data.all().values():
+        if isinstance(value, Function) and value.cache is not None:
+            value.cache.clear()
+
+
+def state_command(command, path):
+    """
+    Runs a 'save FILE' or 'load FILE' REPL command on the evaluator's
+    variables (see image.py).
+
+    Returns:
+    - str: The message describing what was done
+    """
+    if command == 'save':
+        size = evaluator_instance.save_state(path)
+        count = len(evaluator_instance.data.all())
+        return f"[{count} variables saved to {path}, {size} bytes]"
+    count = evaluator_instance.load_state(path)
+    return f"[{count} variables loaded from {path}]"
 
 
 def read_multiline_input(prompt=">>> "):
@@ -90,12 +274,186 @@ def read_multiline_input(prompt=">>> "):
     return "\n".join(lines)
 
 
+def parse_arguments(argv):
+    """
+    Parses the command-line arguments.
+
+    Parameters:
+    - argv (list): Arguments without the program name
+
+    Returns:
+    - argparse.Namespace: The parsed options
+    """
+    arg_parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Run the interpreter interactively or execute a script file.")
+    arg_parser.add_argument("input_file", nargs="?",
+                            help="script file to execute; omit for interactive mode")
+    arg_parser.add_argument("--compile", dest="compiled", action="store_true",
+                            help="compile the AST to closures before running it")
+    arg_parser.add_argument("--vm", action="store_true",
+                            help="compile the AST to bytecode and run it on the VM")
+    arg_parser.add_argument("--iterative", action="store_true",
+                            help="evaluate with an explicit stack (for very deeply nested programs)")
+    arg_parser.add_argument("--dis", dest="disassemble", action="store_true",
+                            help="print the bytecode of the script instead of running it")
+    arg_parser.add_argument("--scanner", choices=sorted(SCANNERS), default="char",
+                            help="scanner implementation (default: char)")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="read and run the script one statement at a time")
+    arg_parser.add_argument("--cache-size", type=int, default=128,
+                            help="number of parsed programs kept in memory (0 disables)")
+    arg_parser.add_argument("--cache-dir",
+                            help="folder for a persistent cache of parsed programs")
+    arg_parser.add_argument("--cache-stats", action="store_true",
+                            help="print parse cache hit/miss counters on exit")
+    arg_parser.add_argument("--no-optimize", dest="optimize", action="store_false",
+                            help="run the AST as parsed, without constant folding")
+    arg_parser.add_argument("--optimizer-stats", action="store_true",
+                            help="print AST node counts before and after optimizing on exit")
+    arg_parser.add_argument("--max-depth", type=int, default=MAX_CALL_DEPTH,
+                            help=f"maximum depth of nested function calls (default: {MAX_CALL_DEPTH})")
+    arg_parser.add_argument("--memo-size", type=int, default=MEMO_SIZE,
+                            help=f"results cached per memo function (default: {MEMO_SIZE})")
+    arg_parser.add_argument("--output-buffer", type=int, default=OUTPUT_BUFFER_SIZE, metavar="SIZE",
+                            help="characters of script output collected before writing them "
+                                 f"(default: {OUTPUT_BUFFER_SIZE}; 0 writes every line at once)")
+    arg_parser.add_argument("--batch", metavar="DIR_OR_GLOB",
+                            help="run every script of a directory (*.txt) or glob pattern in parallel")
+    arg_parser.add_argument("--workers", type=int,
+                            help="worker processes for --batch (default: one per CPU)")
+    arg_parser.add_argument("--order", choices=("input", "completion"), default="input",
+                            help="order of the scripts in the --batch report (default: input)")
+    arg_parser.add_argument("--report", metavar="FILE",
+                            help="write the --batch report to a file instead of the screen")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="print the time spent in each AST node and source line of the script")
+    arg_parser.add_argument("--profile-limit", type=int, default=20,
+                            help="nodes and lines listed in the profile (default: 20)")
+    arg_parser.add_argument("--profile-stacks", metavar="FILE",
+                            help="also write the profile as collapsed stacks for flame graph tools")
+    arg_parser.add_argument("--load", metavar="FILE",
+                            help="start with the variables saved in a state image (REPL 'save FILE')")
+    arg_parser.add_argument("--checkpoint", metavar="FILE",
+                            help="save the script's variables to a state image while it runs and when it ends")
+    arg_parser.add_argument("--checkpoint-every", type=float, default=60.0, metavar="SECONDS",
+                            help="seconds between two --checkpoint images (default: 60)")
+    arg_parser.add_argument("--max-steps", type=int, metavar="N",
+                            help="stop the script (in interactive mode: an input) after N loop iterations "
+                                 "and function calls; the --max-* limits cover the whole script, also with --stream")
+    arg_parser.add_argument("--max-seconds", type=float, metavar="SECONDS",
+                            help="stop the script (or input) after SECONDS of wall time")
+    arg_parser.add_argument("--max-list-elements", type=int, metavar="N",
+                            help="stop the script (or input) after it adds more than N elements to lists")
+    arg_parser.add_argument("--max-string-chars", type=int, metavar="N",
+                            help="stop the script (or input) after it builds strings of more than N characters "
+                                 "in total")
+    options = arg_parser.parse_args(argv)
+    for name in BUDGET_OPTIONS:
+        value = getattr(options, name)
+        if value is not None and value < 0:
+            arg_parser.error(f"--{name.replace('_', '-')} cannot be negative")
+    if options.checkpoint:
+        if options.input_file is None:
+            arg_parser.error("--checkpoint needs a script file")
+        if options.checkpoint_every <= 0:
+            arg_parser.error("--checkpoint-every must be positive")
+    if options.batch is not None:
+        if options.load or options.checkpoint:
+            arg_parser.error("--batch cannot be combined with --load or --checkpoint")
+        if options.input_file is not None:
+            arg_parser.error("--batch cannot be combined with a script file")
+        if options.stream or options.disassemble or options.profile or options.profile_stacks:
+            arg_parser.error("--batch cannot be combined with --stream, --dis or --profile")
+        if options.workers is not None and options.workers < 1:
+            arg_parser.error("--workers must be at least 1")
+    if options.profile_stacks:
+        options.profile = True
+    if options.profile:
+        if options.input_file is None:
+            arg_parser.error("--profile needs a script file")
+        if options.compiled or options.vm or options.iterative or options.stream or options.disassemble:
+            arg_parser.error("--profile runs the tree-walking evaluator and cannot be combined "
+                             "with --compile, --vm, --iterative, --stream or --dis")
+    return options
+
+
+def print_disassembly(text, scanner_class=Scanner):
+    """
+    Prints the bytecode compiled from the given source text.
+
+    Parameters:
+    - text (str): The program source
+    - scanner_class: Scanner implementation used to tokenise the text
+    """
+    try:
+        ast = Parser(scanner_class(text)).parse()
+        if optimizer is not None:
+            ast = optimizer.optimize(ast)
+        print(disassemble(compile_ast(ast, vm_instance.data)))
+    except Exception as error:
+        print(f"Error: {error}")
+
+
 if __name__ == "__main__":
     import sys
+    import time
+
+    options = parse_arguments(sys.argv[1:])
+    scanner_class = SCANNERS[options.scanner]
+    parse_cache = ParseCache(options.cache_size, options.cache_dir)
+    optimizer = Optimizer(options.optimizer_stats) if options.optimize else None
+    profiler = None
+    if options.profile:
+        profiler = Profiler()
+        evaluator_instance = ProfilingEvaluator(profiler)
+    # Scripts print through a large buffer; the REPL shows every line at once
+    if options.input_file is not None:
+        output = StreamOutput(buffer_size=options.output_buffer)
+    evaluator_instance.output = vm_instance.output = output
+    evaluator_instance.max_call_depth = vm_instance.max_call_depth = options.max_depth
+    # The profiling _eval() adds a Python frame to every node it runs
+    allow_call_depth(options.max_depth * 2 if profiler is not None else options.max_depth)
+    evaluator_instance.memo_size = vm_instance.memo_size = options.memo_size
+    # Limits of every run: the script (also with --stream) or each REPL input
+    budget = None
+    limits = {name: getattr(options, name) for name in BUDGET_OPTIONS}
+    if any(value is not None for value in limits.values()):
+        budget = Budget(**limits)
+    evaluator_instance.budget = vm_instance.budget = budget
+    if options.load:
+        try:
+            evaluator_instance.load_state(options.load)
+        except (ValueError, OSError) as error:
+            print(f"Error: Cannot load '{options.load}': {error}")
+            sys.exit(1)
+
+    # Batch Mode: many scripts in parallel, each in a fresh session
+    if options.batch is not None:
+        mode = 'vm' if options.vm else 'compile' if options.compiled else \
+            'iterative' if options.iterative else 'tree'
+        try:
+            paths = find_scripts(options.batch)
+            report = open(options.report, 'w') if options.report else sys.stdout
+            try:
+                write_report(run_batch(paths, options.workers, options.order, mode=mode,
+                                       optimize=options.optimize, scanner_class=scanner_class,
+                                       max_call_depth=options.max_depth, memo_size=options.memo_size,
+                                       budget=budget),
+                             report, time.perf_counter())
+            finally:
+                if report is not sys.stdout:
+                    report.close()
+            if options.report:
+                print(f"Report of {len(paths)} scripts written to {options.report}")
+        except (ValueError, OSError) as error:
+            print(f"Error: {error}")
 
-    # Interactive Mode: No command-line arguments
-    if len(sys.argv) == 1:
-        print("Enter expressions (type 'exit' or 'quit' to stop, 'clear' to clear screen)")
+    # Interactive Mode: No input file
+    elif options.input_file is None:
+        print("Enter expressions (type 'exit' or 'quit' to stop, 'clear' to clear screen, "
+              "'memo' for memo cache statistics, 'memo clear' to empty the caches, "
+              "'save FILE' / 'load FILE' to save / restore the variables)")
         while True:
             try:
                 user_input = read_multiline_input().strip()
@@ -109,10 +467,26 @@ if __name__ == "__main__":
                 if user_input.lower() == 'clear':
                     clear_screen()
                     continue
+                if user_input.lower() == 'memo':
+                    for line in memo_report(evaluator_instance.data) or ["No memo functions defined"]:
+                        print(line)
+                    continue
+                if user_input.lower() == 'memo clear':
+                    clear_memo_caches(evaluator_instance.data)
+                    print("[Memo caches cleared]")
+                    continue
+                match = STATE_COMMAND.fullmatch(user_input)
+                if match:
+                    try:
+                        print(state_command(match.group(1).lower(), match.group(2)))
+                    except (TypeError, ValueError, OSError) as error:
+                        print(f"Error: {error}")
+                    continue
 
                 # Process and display result
                 try:
-                    result = calculate(user_input)
+                    result = calculate(user_input, options.compiled, options.vm, scanner_class,
+                                       options.iterative)
                     if result is not None:
                         formatted = format_result(result)
                         print(f"Result: {formatted}")
@@ -123,21 +497,54 @@ if __name__ == "__main__":
                 # Prevent exiting on Ctrl+C
                 print("\nKeyboardInterrupt ignored. Use 'exit' or 'quit' to stop.")
 
-    # Script Mode: One argument passed (input file)
-    elif len(sys.argv) == 2:
+    # Script Mode: Input file passed
+    else:
         try:
-            with open(sys.argv[1]) as f:
-                text = f.read()
-                try:
-                    result = calculate(text)
-                    if result is not None:
-                        formatted = format_result(result)
-                        print(f"Result: {formatted}")
-                except Exception as error:
-                    print(f"Error: {error}")
+            with open(options.input_file) as f:
+                if options.disassemble:
+                    print_disassembly(f.read(), scanner_class)
+                else:
+                    source = None
+                    checkpointer = None
+                    if options.checkpoint:
+                        checkpointer = Checkpointer(options.checkpoint, evaluator_instance.data,
+                                                    options.checkpoint_every)
+                        checkpointer.attach(evaluator_instance)
+                        checkpointer.attach(vm_instance)
+                        checkpointer.start()
+                    try:
+                        if profiler is not None:
+                            source = f.read()
+                            result = calculate_profiled(source, profiler, scanner_class)
+                        elif options.stream:
+                            result = calculate_stream(f, options.compiled, options.vm, options.iterative)
+                        else:
+                            result = calculate(f.read(), options.compiled, options.vm, scanner_class,
+                                           options.iterative)
+                        if result is not None:
+                            formatted = format_result(result)
+                            print(f"Result: {formatted}")
+                    except Exception as error:
+                        print(f"Error: {error}")
+                    if checkpointer is not None:
+                        # The variables as the script left them, even after an error
+                        checkpointer.stop()
+                        if checkpointer.error is not None:
+                            print(f"Error: Checkpoint to '{options.checkpoint}' failed: {checkpointer.error}")
+                    if profiler is not None:
+                        print()
+                        for line in profiler.report(options.profile_limit, source):
+                            print(line)
+                        if options.profile_stacks:
+                            profiler.write_collapsed(options.profile_stacks)
+                            print(f"Collapsed stacks written to {options.profile_stacks}")
         except FileNotFoundError:
-            print(f"Error: File '{sys.argv[1]}' not found")
+            print(f"Error: File '{options.input_file}' not found")
 
-    # Invalid usage
-    else:
-        print("Usage: python main.py [input_file]")
+    if options.cache_stats:
+        stats = ", ".join(f"{name}={value}" for name, value in parse_cache.stats().items())
+        print(f"Parse cache: {stats}")
+    if options.optimizer_stats and optimizer is not None:
+        print(f"Optimizer: {optimizer.nodes_before} nodes before, {optimizer.nodes_after} after "
+              f"({optimizer.folded} folded, {optimizer.branches_removed} branches removed, "
+              f"{optimizer.blocks_collapsed} blocks collapsed)")
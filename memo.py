@@ -0,0 +1,179 @@
+"""
+Result caches of memo functions (`memo func name(...) { ... }`).
+
+A memo function keeps an LRU cache of its results keyed by its argument
+values, so calling it again with the same arguments skips running the body.
+Evaluator.check_memo_body() makes sure at definition time that the body
+cannot print, read input, assign global variables, delete variables or
+change lists it was given, so skipping it does not change what the program
+does.
+
+Keys are built from the argument values, including their type, since
+1, 1.0 and true are different values in the language (a Rope is keyed as
+the str it stands for). A List argument is
+keyed by a snapshot of its contents: lists in typed storage by a digest of
+their bytes, other lists by the keys of their elements. Arguments that
+cannot be keyed (functions) make the call run uncached.
+
+A body may read global variables, so the key also holds the values of the
+globals it reads (see global_reads), keyed the same way except that
+functions are keyed by identity; the globals read by the memo functions
+found there are added too, since a cached result depends on them as well.
+"""
+
+import hashlib
+from collections import OrderedDict
+from itertools import islice
+
+from data import List, Rope, Function
+
+
+# Default maximum number of results kept per memo function
+MEMO_SIZE = 128
+
+# Returned by MemoCache.lookup() when there is no result for a key
+MISSING = object()
+
+
+def memo_key(values):
+    """
+    Return a hashable key for a sequence of argument values, or None if one
+    of them cannot be used in a key.
+    """
+    key = []
+    for value in values:
+        value_type = type(value)
+        if value_type is float:
+            # hex() tells 0.0 from -0.0, which compare equal but print differently
+            key.append((float, value.hex()))
+        elif value_type in (int, str, bool) or value is None:
+            key.append((value_type, value))
+        elif value_type is Rope:
+            key.append((str, str(value)))
+        elif value_type is List:
+            list_key = list_snapshot(value)
+            if list_key is None:
+                return None
+            key.append(list_key)
+        else:
+            return None
+    return tuple(key)
+
+
+def global_reads(body):
+    """Return the global slots a resolved function body reads, in a tuple."""
+    reads = set()
+    work = [body]
+    while work:
+        node = work.pop()
+        if isinstance(node, list):
+            work.extend(node)
+        elif isinstance(node, tuple) and node:
+            if node[0] == 'LOAD_SLOT':
+                reads.add(node[1])
+            else:
+                work.extend(node[1:])
+    return tuple(sorted(reads))
+
+
+def globals_key(function, slots):
+    """
+    Return a hashable key for the global variables a memo function reads,
+    and those read by the memo functions held in them, or None if one of
+    them cannot be used in a key.
+    """
+    key = []
+    seen = {function}
+    pending = [function]
+    while pending:
+        for index in pending.pop().global_reads:
+            value = slots[index]
+            if type(value) is Function:
+                key.append(value)  # by identity
+                if value.cache is not None and value not in seen:
+                    seen.add(value)
+                    pending.append(value)
+                continue
+            value_key = memo_key((value,))
+            if value_key is None:
+                return None
+            key.append(value_key)
+    return tuple(key)
+
+
+def list_snapshot(lst):
+    """Key for the current contents of a List, or None if an element cannot be keyed."""
+    items = lst.items
+    if type(items) is not list:
+        # Typed storage: a 128-bit digest of the raw numbers
+        digest = hashlib.blake2b(memoryview(items)[:lst.length], digest_size=16).digest()
+        return (List, items.typecode, lst.length, digest)
+    elements = memo_key(islice(items, lst.length))
+    if elements is None:
+        return None
+    return (List, elements)
+
+
+def result_view(value):
+    """
+    Return a cached result for a caller. Lists are returned as views that
+    share the cached storage copy-on-write, so a caller changing its result
+    changes neither the cache nor the results given to other callers.
+    """
+    if type(value) is List:
+        return value.view()
+    return value
+
+
+class MemoCache:
+    """
+    LRU cache of the results of one memo function.
+
+    Attributes:
+    - max_entries (int): Maximum number of results kept (0 disables caching)
+    - hits, misses (int): Calls that found / did not find a cached result
+    - evictions (int): Results dropped to respect max_entries
+    - uncached (int): Calls with arguments that cannot be used as a key
+    """
+
+    def __init__(self, max_entries=MEMO_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0
+
+    def lookup(self, key):
+        """Return the result cached for key, or MISSING."""
+        value = self.entries.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def remember(self, key, value):
+        """Cache a result, evicting the least recently used one if full."""
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Forget all cached results (the counters are kept)."""
+        self.entries.clear()
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'uncached': self.uncached,
+        }
@@ -0,0 +1,209 @@
+"""
+Optimizer pass that runs between Parser.parse() and evaluation.
+
+Rewrites a parser AST into an equivalent, smaller one:
+
+- Operators whose operands are literals are replaced by their result,
+  e.g. "Outer: " + 1 -> "Outer: 1" and (2 + 3) * 4 -> 20
+- IF arms with a literal condition are dropped (false) or become the else
+  branch (true); WHILE loops with a false literal condition are dropped
+- BLOCKs with a single statement are replaced by that statement
+
+An operation is folded only if evaluating it does not raise, so programs
+fail with the same errors at the same point as without the optimizer. The
+value of every statement is kept, so script results do not change either.
+
+The input AST is not modified (it may be shared through the parse cache).
+"""
+
+from tokens import Token, PositionedToken
+from evaluator import Evaluator, BINARY_OPERATIONS
+from data import materialize
+
+
+# Token type for each Python type a literal can have
+LITERAL_TYPES = {int: 'NUMBER', float: 'FLOAT', str: 'STRING', bool: 'BOOL'}
+
+# Folded strings longer than this are left to be built at run time, so
+# long concatenations of literals do not grow the AST (and the parse cache)
+MAX_FOLDED_STRING = 4096
+
+
+def is_literal(node):
+    return isinstance(node, Token) and node.type in ('NUMBER', 'FLOAT', 'STRING', 'BOOL')
+
+
+def is_empty_block(node):
+    return isinstance(node, tuple) and len(node) == 2 and node[0] == 'BLOCK' and not node[1]
+
+
+def count_nodes(node):
+    """Number of tokens and tuples in an AST."""
+    count = 0
+    work = [node]
+    while work:
+        node = work.pop()
+        if isinstance(node, Token):
+            count += 1
+        elif isinstance(node, list):
+            work.extend(node)
+        elif isinstance(node, tuple) and node:
+            # An operator node is counted once, through its operator token
+            count += 1
+            work.extend(node[1:])
+    return count
+
+
+class Optimizer:
+    """
+    Folds constants and removes dead branches from ASTs.
+
+    Attributes:
+    - count_nodes (bool): Count AST nodes before and after optimizing
+    - nodes_before, nodes_after (int): Totals over all optimized ASTs
+      (only counted if count_nodes is set)
+    - folded (int): Operators replaced by their result
+    - branches_removed (int): IF arms and WHILE loops removed
+    - blocks_collapsed (int): Single-statement BLOCKs replaced by the statement
+    """
+
+    def __init__(self, count_nodes=False):
+        self.count_nodes = count_nodes
+        self.nodes_before = 0
+        self.nodes_after = 0
+        self.folded = 0
+        self.branches_removed = 0
+        self.blocks_collapsed = 0
+
+    def optimize(self, ast):
+        """Return an optimized copy of ast. A top-level BLOCK stays a BLOCK."""
+        if self.count_nodes:
+            self.nodes_before += count_nodes(ast)
+        if isinstance(ast, tuple) and ast and ast[0] == 'BLOCK':
+            result = ('BLOCK', self.statements(ast[1]))
+        else:
+            result = self.visit(ast)
+        if self.count_nodes:
+            self.nodes_after += count_nodes(result)
+        return result
+
+    def visit(self, node):
+        if isinstance(node, Token):
+            return node
+
+        if isinstance(node, list):
+            return [self.visit(child) for child in node]
+
+        if not isinstance(node, tuple) or not node:
+            return node
+
+        tag = node[0]
+
+        if isinstance(tag, Token) and len(node) == 3:
+            return self.operator(node)
+
+        if tag == 'BLOCK':
+            statements = self.statements(node[1])
+            if len(statements) == 1:
+                self.blocks_collapsed += 1
+                return statements[0]
+            return ('BLOCK', statements)
+
+        if tag == 'IF':
+            return self.if_statement(node)
+
+        if tag == 'WHILE':
+            condition = self.visit(node[1])
+            if is_literal(condition) and not condition.value:
+                self.branches_removed += 1
+                return ('BLOCK', [])
+            return ('WHILE', condition, self.visit(node[2]))
+
+        return tuple(self.visit(child) for child in node)
+
+    def statements(self, statements):
+        """Optimize a statement list, dropping statements that became no-ops."""
+        result = [self.visit(statement) for statement in statements]
+        # An empty BLOCK does nothing, but as the last statement its None is
+        # the value of the enclosing block, so that one is kept
+        return [statement for statement in result[:-1] if not is_empty_block(statement)] + result[-1:]
+
+    def if_statement(self, node):
+        conditions = []
+        actions = []
+        else_action = node[3]
+        for i, (condition, action) in enumerate(zip(node[1], node[2])):
+            condition = self.visit(condition)
+            if is_literal(condition):
+                if condition.value:
+                    # Always taken: later arms and the else can never run
+                    self.branches_removed += len(node[1]) - i - 1 + (1 if else_action else 0)
+                    else_action = action
+                    break
+                self.branches_removed += 1
+                continue
+            conditions.append(condition)
+            actions.append(self.visit(action))
+        if else_action:
+            else_action = self.visit(else_action)
+
+        if not conditions:
+            return else_action if else_action else ('BLOCK', [])
+        return ('IF', conditions, actions, else_action)
+
+    def operator(self, node):
+        # Walk down left operands (and the operands of unary operators) in a
+        # loop, so a long chain such as a + b + c + ... or - - - x does not
+        # take one Python call per operator
+        chain = []
+        while isinstance(node, tuple) and len(node) == 3 and isinstance(node[0], Token):
+            chain.append(node)
+            node = node[1] if node[1] is not None else node[2]
+        operand = self.visit(node)
+        for op, left, right in reversed(chain):
+            if left is None:
+                operand = self.fold_operator(op, None, operand)
+            else:
+                operand = self.fold_operator(op, operand, self.visit(right))
+        return operand
+
+    def fold_operator(self, op, left, right):
+        """Return the node for op applied to optimized operands, folded if possible."""
+        if is_literal(right) and (left is None or is_literal(left)):
+            value = self.fold(op.type, left.value if left is not None else None, right.value, left is None)
+            if type(value) in LITERAL_TYPES:
+                self.folded += 1
+                if op.line is not None:
+                    return PositionedToken(LITERAL_TYPES[type(value)], value, op.line, op.column)
+                return Token(LITERAL_TYPES[type(value)], value)
+
+        return (op, left, right)
+
+    @staticmethod
+    def fold(op_type, left, right, unary):
+        """
+        Return the value of a literal operation as the evaluator computes it,
+        or None if it must be left for run time (it raises, or it is too big).
+        """
+        if unary:
+            if op_type == 'MINUS' and isinstance(right, (int, float)):
+                return -right
+            if op_type == 'NOT' and isinstance(right, bool):
+                return not right
+            return None
+
+        operation = BINARY_OPERATIONS.get(op_type)
+        if operation is None or not Evaluator._are_compatible(left, right, op_type):
+            return None
+        try:
+            value = materialize(operation(left, right))
+        except Exception:
+            return None
+        if isinstance(value, str) and len(value) > MAX_FOLDED_STRING:
+            return None
+        return value
+
+
+def optimize(ast):
+    """Return an optimized copy of a parser AST."""
+    return Optimizer().optimize(ast)
@@ -0,0 +1,91 @@
+"""
+Output sinks for the PRINT statement.
+
+Evaluator and VM write printed values to their `output` attribute instead
+of calling print() for every statement:
+
+- StreamOutput: writes to a text stream (sys.stdout by default). Buffered,
+  it collects printed lines and writes them in large blocks, which is much
+  cheaper than a print() per line when a script prints many lines; line
+  buffered, it writes and flushes every line, as the interactive REPL needs.
+- CollectedOutput: keeps the printed text in memory, for programs that
+  embed the interpreter and want to capture what a script prints.
+
+Buffered output must be flushed before anything else is written to the
+same stream, so the order stays as the script printed it: the evaluators
+flush before input() shows its prompt, and main.py flushes when a script
+ends or stops with an error.
+"""
+
+import sys
+
+
+# Characters a buffered StreamOutput collects before writing them
+OUTPUT_BUFFER_SIZE = 1 << 16
+
+
+class StreamOutput:
+    """
+    Writes printed values to a text stream.
+
+    Attributes:
+    - stream: The stream written to, or None for the current sys.stdout
+      (looked up on every write, so redirecting sys.stdout still works)
+    - buffer_size (int): Characters collected before writing them; 0 writes
+      and flushes every line
+    """
+
+    def __init__(self, stream=None, buffer_size=OUTPUT_BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.pending = []      # lines not written yet
+        self.pending_size = 0  # characters in pending
+
+    def print(self, value):
+        """Print a value on its own line, like print(value)."""
+        line = f"{value}\n"
+        if self.buffer_size <= 0:
+            stream = self.stream or sys.stdout
+            stream.write(line)
+            stream.flush()
+            return
+        self.pending.append(line)
+        self.pending_size += len(line)
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered lines to the stream."""
+        stream = self.stream or sys.stdout
+        if self.pending:
+            stream.write("".join(self.pending))
+            self.pending.clear()
+            self.pending_size = 0
+        stream.flush()
+
+
+class CollectedOutput:
+    """
+    Keeps printed values in memory.
+
+    Attributes:
+    - lines (list): The printed lines, without their newlines
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def print(self, value):
+        """Record a value as a printed line."""
+        self.lines.append(str(value))
+
+    def flush(self):
+        """Nothing to write; collected lines stay until clear()."""
+
+    def getvalue(self):
+        """Return everything printed so far, as print() would have written it."""
+        return "".join(line + "\n" for line in self.lines)
+
+    def clear(self):
+        """Forget the collected lines."""
+        self.lines.clear()
@@ -0,0 +1,163 @@
+"""
+Cache of parsed programs, so running the same source again skips the
+Scanner and Parser.
+
+ASTs are kept in an in-memory LRU keyed by a hash of the source text and can
+also be stored on disk, so a new process can reuse them. Disk entries carry a
+format version and a fingerprint of the front-end modules (tokens, scanner,
+parser), so any change to the grammar makes old entries miss.
+
+The cached AST is the unresolved parser output. It is shared between runs
+and must not be modified; the resolver builds a new tree from it.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+import tokens
+import scanner
+import parser
+from scanner import Scanner
+from parser import Parser, EndOfExpressionError
+
+
+# Bump when the layout of cache files changes
+FORMAT_VERSION = 1
+
+MAGIC = b'LDAST'
+
+
+def front_end_fingerprint():
+    """Hash of the source of the modules that define the AST."""
+    digest = hashlib.sha256()
+    for module in (tokens, scanner, parser):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+class ParseCache:
+    """
+    LRU cache of parsed ASTs with an optional on-disk store.
+
+    Attributes:
+    - max_entries (int): Maximum number of ASTs kept in memory (0 disables it)
+    - directory (str or None): Folder for cache files, or None for memory only
+    - hits, misses (int): In-memory lookups that found / did not find an AST
+    - disk_hits, disk_misses (int): Disk lookups after an in-memory miss
+    - evictions (int): ASTs dropped from memory to respect max_entries
+
+    Only use a directory you trust: cache files are loaded with pickle.
+    """
+
+    def __init__(self, max_entries=128, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.header = MAGIC + f" {FORMAT_VERSION} {front_end_fingerprint()}\n".encode()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def parse(self, text, scanner_class=Scanner, positions=False):
+        """
+        Return the AST of text, parsing it with scanner_class only if it is
+        not cached. Errors are not cached, so a failing source raises each time;
+        it is parsed once more with source positions so the error names where
+        it is (parsing with positions is slower, so it is only done then).
+        With positions=True the AST's tokens record their lines and columns
+        (see resolve()); such ASTs are cached apart from the others.
+        """
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        if positions:
+            key += '-positions'
+
+        ast = self.entries.get(key)
+        if ast is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return ast
+        self.misses += 1
+
+        ast = self.load(key)
+        if ast is None:
+            try:
+                ast = Parser(scanner_class(text, positions=positions)).parse()
+            except (ValueError, EndOfExpressionError):
+                if not positions:
+                    # Parse again with source positions, so the error names its line
+                    Parser(scanner_class(text, positions=True)).parse()
+                raise
+            self.store(key, ast)
+
+        self.remember(key, ast)
+        return ast
+
+    def remember(self, key, ast):
+        """Add an AST to the in-memory LRU, evicting the oldest if full."""
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = ast
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.ast')
+
+    def load(self, key):
+        """Read an AST from disk; returns None if absent, stale or unreadable."""
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), 'rb') as f:
+                if f.readline() == self.header:
+                    ast = pickle.load(f)
+                    self.disk_hits += 1
+                    return ast
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+        self.disk_misses += 1
+        return None
+
+    def store(self, key, ast):
+        """Write an AST to disk atomically; failures only cost a future miss."""
+        if self.directory is None:
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.header)
+                pickle.dump(ast, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path(key))
+        except (OSError, pickle.PicklingError, RecursionError):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def clear(self):
+        """Forget all in-memory entries (disk entries are kept)."""
+        self.entries.clear()
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'disk_misses': self.disk_misses,
+            'evictions': self.evictions,
+        }
@@ -1,7 +1,17 @@
+class EndOfExpressionError(Exception):
+    """
+    Raised by Parser.statements() in place of the StopIteration that factor()
+    uses to signal a block delimiter, since a generator cannot raise
+    StopIteration. It carries the same message.
+    """
+    pass
+
+
 class Parser:
     def __init__(self, scanner):
         self.scanner = scanner
         self.current_token = None
+        self.function_depth = 0  # > 0 while parsing a function body
         self.advance()
 
     # Move to the next token
@@ -12,16 +22,42 @@ class Parser:
     def peek_next_token(self):
         return self.scanner.peek_next_token()
 
+    # ValueError about the current token, naming its line and column if
+    # the scanner recorded positions (see Token.location)
+    def error(self, message):
+        location = self.current_token.location()
+        return ValueError(f"{message} at {location}" if location else message)
+
+    # Whether the current token is a '(' that starts the arguments of a
+    # call of name: only if it is on name's line, so that a statement
+    # ending in a name is not called with a parenthesised expression that
+    # starts the next line
+    def call_follows(self, name):
+        paren = self.current_token
+        if paren.type != 'LPAREN':
+            return False
+        if paren.line is not None:
+            return paren.line == name.line
+        return not paren.starts_line
+
     # ==== Core Parser Control ====
     def parse(self):
-        statements = []
+        return ('BLOCK', list(self.statements()))
+
+    # Generate top-level statements one at a time, so a caller can run
+    # each one and drop its AST before the next is parsed
+    def statements(self):
         while self.current_token.type != 'EOF':
-            stmt = self.statement()
+            try:
+                stmt = self.statement()
+            except StopIteration as stop:
+                location = self.current_token.location()
+                message = f"{stop.args[0]} at {location}" if location else stop.args[0]
+                raise EndOfExpressionError(message) from stop
             if stmt is not None:
-                statements.append(stmt)
+                yield stmt
             else:
                 break  # End of block or invalid token
-        return ('BLOCK', statements)
 
     # ==== Statement Dispatcher ====
     def statement(self):
@@ -38,6 +74,19 @@ class Parser:
             return self.if_statements()
         elif self.current_token.type == 'WHILE':
             return self.while_statement()
+        elif self.current_token.type == 'FOR':
+            return self.for_statement()
+        elif self.current_token.type == 'FUNC':
+            return self.function_definition()
+        elif self.current_token.type == 'MEMO':
+            self.advance()  # consume 'MEMO'
+            if self.current_token.type != 'FUNC':
+                raise self.error("Expected 'func' after 'memo'")
+            return self.function_definition(memo=True)
+        elif self.current_token.type == 'RETURN':
+            return self.return_statement()
+        elif self.current_token.type == 'GLOBAL':
+            return self.global_statement()
         elif self.current_token.type == 'BREAK':
             self.advance()
             return ('BREAK',)
@@ -63,11 +112,11 @@ class Parser:
     def make_statement(self):
         self.advance()  # consume 'MAKE'
         if self.current_token.type != 'VARIABLE':
-            raise ValueError("Expected variable name after 'make'")
+            raise self.error("Expected variable name after 'make'")
         var_token = self.current_token
         self.advance()
         if self.current_token.type != 'ASSIGN':
-            raise ValueError("Expected '=' after variable in make statement")
+            raise self.error("Expected '=' after variable in make statement")
         self.advance()
         expr = self.boolean_expression()
         return ('ASSIGN', var_token, expr)
@@ -75,7 +124,7 @@ class Parser:
     def del_statement(self):
         self.advance()  # consume 'DEL'
         if self.current_token.type != 'VARIABLE':
-            raise ValueError("Expected variable name after 'del'")
+            raise self.error("Expected variable name after 'del'")
         var_token = self.current_token
         self.advance()
         return ('DEL', var_token)
@@ -93,7 +142,7 @@ class Parser:
         statements = []
         while self.current_token.type != 'RBRACE':
             if self.current_token.type == 'EOF':
-                raise ValueError("Expected '}' before EOF")
+                raise self.error("Expected '}' before EOF")
 
             stmt = self.statement()
             if stmt is not None:
@@ -139,6 +188,101 @@ class Parser:
         action = self.parse_block()
         return ('WHILE', condition, action)
 
+    # for x in expr { ... } or for i in start:end { ... }
+    def for_statement(self):
+        self.advance()  # consume 'FOR'
+        if self.current_token.type != 'VARIABLE':
+            raise self.error("Expected variable name after 'for'")
+        var_token = self.current_token
+        self.advance()
+        if self.current_token.type != 'IN':
+            raise self.error("Expected 'in' after for loop variable")
+        self.advance()  # consume 'IN'
+
+        iterable = self.boolean_expression()
+        if self.current_token.type == 'COLON':
+            self.advance()  # consume ':'
+            end = self.boolean_expression()
+            action = self.parse_block()
+            return ('FOR_RANGE', var_token, iterable, end, action)
+
+        action = self.parse_block()
+        return ('FOR', var_token, iterable, action)
+
+    # ==== Functions ====
+    # func name(a, b) { ... }, or memo func ... to cache its results
+    def function_definition(self, memo=False):
+        self.advance()  # consume 'FUNC'
+        if self.function_depth:
+            raise self.error("Functions cannot be defined inside another function")
+        if self.current_token.type != 'VARIABLE':
+            raise self.error("Expected function name after 'func'")
+        name_token = self.current_token
+        self.advance()
+        if self.current_token.type != 'LPAREN':
+            raise self.error("Expected '(' after function name")
+        self.advance()  # consume '('
+
+        params = []
+        if self.current_token.type != 'RPAREN':
+            while True:
+                if self.current_token.type != 'VARIABLE':
+                    raise self.error("Expected parameter name in function definition")
+                if any(param.value == self.current_token.value for param in params):
+                    raise self.error(f"Duplicate parameter '{self.current_token.value}' "
+                                     f"in function '{name_token.value}'")
+                params.append(self.current_token)
+                self.advance()
+                if self.current_token.type != 'COMMA':
+                    break
+                self.advance()  # consume ','
+        if self.current_token.type != 'RPAREN':
+            raise self.error("Expected ')' after function parameters")
+        self.advance()  # consume ')'
+
+        if self.current_token.type != 'LBRACE':
+            raise self.error("Expected '{' to start the function body")
+        self.function_depth += 1
+        try:
+            body = self.parse_block()
+        finally:
+            self.function_depth -= 1
+        return ('FUNCTION', name_token, params, body, memo)
+
+    # return expr, or a bare return (value None) at the end of a block
+    def return_statement(self):
+        self.advance()  # consume 'RETURN'
+        if not self.function_depth:
+            raise self.error("'return' outside of a function")
+        if self.current_token.type in ('RBRACE', 'EOF'):
+            return ('RETURN', None)
+        return ('RETURN', self.boolean_expression())
+
+    # global name: assignments to name in this function change the global variable
+    def global_statement(self):
+        self.advance()  # consume 'GLOBAL'
+        if not self.function_depth:
+            raise self.error("'global' outside of a function")
+        if self.current_token.type != 'VARIABLE':
+            raise self.error("Expected variable name after 'global'")
+        var_token = self.current_token
+        self.advance()
+        return ('GLOBAL', var_token)
+
+    # Arguments of a call, after the callee: (expr, expr, ...)
+    def call_arguments(self):
+        self.advance()  # consume '('
+        args = []
+        if self.current_token.type != 'RPAREN':
+            args.append(self.boolean_expression())
+            while self.current_token.type == 'COMMA':
+                self.advance()  # consume ','
+                args.append(self.boolean_expression())
+        if self.current_token.type != 'RPAREN':
+            raise self.error("Expected ')' after function arguments")
+        self.advance()  # consume ')'
+        return args
+
     # ==== Boolean & Expression Parsing ====
     def boolean_expression(self):
         node = self.comp_expression()
@@ -197,7 +341,7 @@ class Parser:
                     self.advance()  # consume '('
                     expr = self.boolean_expression()
                     if self.current_token.type != 'RPAREN':
-                        raise ValueError("Expected ')' after int() argument")
+                        raise self.error("Expected ')' after int() argument")
                     self.advance()  # consume ')'
                     return ('INT_CAST', expr)
                 else:
@@ -209,7 +353,7 @@ class Parser:
                         self.advance()  # consume '['
                         index_expr = self.boolean_expression()
                         if self.current_token.type != 'RSQUARE':
-                            raise ValueError("Expected ']' after list index")
+                            raise self.error("Expected ']' after list index")
                         self.advance()  # consume ']'
                         node = ('LIST_ACCESS', node, index_expr)
 
@@ -218,13 +362,13 @@ class Parser:
                         self.advance()  # consume '.'
 
                         if self.current_token.type != 'VARIABLE':
-                            raise ValueError("Expected method name after '.'")
+                            raise self.error("Expected method name after '.'")
 
                         method_name = self.current_token
                         self.advance()  # consume method name
 
                         if self.current_token.type != 'LPAREN':
-                            raise ValueError("Expected '(' after method name")
+                            raise self.error("Expected '(' after method name")
 
                         self.advance()  # consume '('
 
@@ -236,7 +380,7 @@ class Parser:
                                 args.append(self.boolean_expression())
 
                         if self.current_token.type != 'RPAREN':
-                            raise ValueError("Expected ')' after method arguments")
+                            raise self.error("Expected ')' after method arguments")
 
                         self.advance()  # consume ')'
 
@@ -248,12 +392,16 @@ class Parser:
                 self.advance()
                 node = token
 
+                # Handle function calls name(args)
+                if self.call_follows(token):
+                    node = ('CALL', token, self.call_arguments())
+
                 # Handle list access variable[expr]
                 while self.current_token.type == 'LSQUARE':
                     self.advance()  # consume '['
                     index_expr = self.boolean_expression()
                     if self.current_token.type != 'RSQUARE':
-                        raise ValueError("Expected ']' after list index")
+                        raise self.error("Expected ']' after list index")
                     self.advance()  # consume ']'
                     node = ('LIST_ACCESS', node, index_expr)
 
@@ -262,13 +410,13 @@ class Parser:
                     self.advance()  # consume '.'
 
                     if self.current_token.type != 'VARIABLE':
-                        raise ValueError("Expected method name after '.'")
+                        raise self.error("Expected method name after '.'")
 
                     method_name = self.current_token
                     self.advance()  # consume method name
 
                     if self.current_token.type != 'LPAREN':
-                        raise ValueError("Expected '(' after method name")
+                        raise self.error("Expected '(' after method name")
 
                     self.advance()  # consume '('
 
@@ -280,7 +428,7 @@ class Parser:
                             args.append(self.boolean_expression())
 
                     if self.current_token.type != 'RPAREN':
-                        raise ValueError("Expected ')' after method arguments")
+                        raise self.error("Expected ')' after method arguments")
 
                     self.advance()  # consume ')'
 
@@ -294,7 +442,7 @@ class Parser:
             node = self.boolean_expression()
 
             if self.current_token.type != 'RPAREN':
-                raise ValueError("Expected ')'")
+                raise self.error("Expected ')'")
             self.advance()
             return node
 
@@ -302,28 +450,33 @@ class Parser:
             return self.parse_list_literal()
 
         elif token.type in ('MINUS', 'NOT'):
-            op = token
-            self.advance()
-            operand = self.factor()
-            return (op, None, operand)
+            # A run of prefix operators is collected in a loop, not by recursion
+            ops = []
+            while self.current_token.type in ('MINUS', 'NOT'):
+                ops.append(self.current_token)
+                self.advance()
+            node = self.factor()
+            for op in reversed(ops):
+                node = (op, None, node)
+            return node
 
         elif token.type == 'INPUT':
             return self.parse_input_expression()
 
         else:
-            raise ValueError(f"Unexpected token in factor: {token}")
+            raise self.error(f"Unexpected token in factor: {token}")
 
     # ==== Input Expression ====
     def parse_input_expression(self):
         self.advance()  # consume 'INPUT'
         if self.current_token.type != 'LPAREN':
-            raise ValueError("Expected '(' after 'input'")
+            raise self.error("Expected '(' after 'input'")
         self.advance()  # consume '('
 
         prompt_expr = self.boolean_expression()
 
         if self.current_token.type != 'RPAREN':
-            raise ValueError("Expected ')' after input prompt expression")
+            raise self.error("Expected ')' after input prompt expression")
         self.advance()  # consume ')'
 
         return ('INPUT', prompt_expr)
@@ -339,7 +492,7 @@ class Parser:
                 elements.append(self.boolean_expression())
 
         if self.current_token.type != 'RSQUARE':
-            raise ValueError("Expected ']' to close list literal")
+            raise self.error("Expected ']' to close list literal")
         self.advance()  # consume ']'
 
         return ('LIST_LITERAL', elements)
@@ -0,0 +1,204 @@
+"""
+Per-node execution profiler (main.py --profile).
+
+ProfilingEvaluator is an Evaluator whose _eval() times every node it runs.
+It is only used when profiling, so the ordinary evaluators carry no
+instrumentation at all.
+
+For each AST node the Profiler counts how often it ran and measures:
+- total time: wall time from entering the node until it returned,
+  including its children (counted once for recursive function calls)
+- self time: total time minus the time spent in its children
+
+Nodes are mapped to source lines through the table filled by
+resolve(..., lines) from a program scanned with positions=True. Nodes
+without a line of their own (break, an empty list) take the line of the
+node that ran them.
+
+The profile can be written as collapsed stacks ("frame;frame;frame weight"
+per line, weights in microseconds of self time), the input format of
+flamegraph.pl and compatible tools such as speedscope and inferno.
+"""
+
+import time
+
+from tokens import Token
+from evaluator import Evaluator
+
+
+# Resolved nodes that carry a variable or function name in node[2]
+NAMED_TAGS = ('LOAD_SLOT', 'STORE_SLOT', 'DEL_SLOT', 'FOR_SLOT', 'FOR_RANGE_SLOT',
+              'LOAD_LOCAL', 'STORE_LOCAL', 'DEL_LOCAL', 'FOR_LOCAL', 'FOR_RANGE_LOCAL',
+              'DEFINE')
+
+
+def describe(node):
+    """Return a short label for an AST node, e.g. "STORE_SLOT total" or "PLUS"."""
+    if isinstance(node, Token):
+        return node.type
+    tag = node[0]
+    if isinstance(tag, Token):
+        return tag.type if node[1] is not None else f"unary {tag.type}"
+    if tag in NAMED_TAGS:
+        return f"{tag} {node[2]}"
+    if tag == 'CALL' and isinstance(node[1], tuple) and node[1][0] in NAMED_TAGS:
+        return f"CALL {node[1][2]}"
+    if tag == 'METHOD_CALL':
+        return f"METHOD_CALL {node[2].value}"
+    return str(tag)
+
+
+class NodeStats:
+    """Counters of one AST node."""
+
+    __slots__ = ('node', 'line', 'label', 'frame', 'hits', 'total', 'self_time', 'active')
+
+    def __init__(self, node, line):
+        self.node = node          # kept so the id of the node stays unique
+        self.line = line
+        self.label = describe(node)
+        # Name of the node in a collapsed stack
+        self.frame = self.label if line is None else f"{self.label} (line {line})"
+        self.hits = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.active = 0           # runs of the node in progress (recursion)
+
+
+class Profiler:
+    """
+    Collects per-node hit counts and times for a ProfilingEvaluator.
+
+    Attributes:
+    - lines (dict): id(node) -> source line, as filled by resolve()
+    - nodes (dict): id(node) -> NodeStats of every node that ran
+    - elapsed (float): Wall time of all profiled runs
+    """
+
+    def __init__(self):
+        self.lines = {}
+        self.nodes = {}
+        self.elapsed = 0.0
+        # Running nodes: [stats, start time, time of finished children, stack id]
+        self.stack = []
+        # Collapsed stacks, interned: (parent stack id, frame) -> stack id
+        self.stack_ids = {}
+        self.stack_keys = []
+        self.stack_self = []
+
+    def enter(self, node):
+        """Start timing a run of node; return the record to pass to leave()."""
+        stats = self.nodes.get(id(node))
+        stack = self.stack
+        if stats is None:
+            line = node.line if isinstance(node, Token) else self.lines.get(id(node))
+            if line is None and stack:
+                line = stack[-1][0].line
+            stats = self.nodes[id(node)] = NodeStats(node, line)
+        key = (stack[-1][3] if stack else -1, stats.frame)
+        stack_id = self.stack_ids.get(key)
+        if stack_id is None:
+            stack_id = self.stack_ids[key] = len(self.stack_keys)
+            self.stack_keys.append(key)
+            self.stack_self.append(0.0)
+        stats.hits += 1
+        stats.active += 1
+        record = [stats, 0.0, 0.0, stack_id]
+        stack.append(record)
+        record[1] = time.perf_counter()
+        return record
+
+    def leave(self, record):
+        """Stop timing the run started by enter()."""
+        elapsed = time.perf_counter() - record[1]
+        stack = self.stack
+        stack.pop()
+        stats = record[0]
+        self_time = elapsed - record[2]
+        stats.self_time += self_time
+        stats.active -= 1
+        if not stats.active:
+            stats.total += elapsed
+        self.stack_self[record[3]] += self_time
+        if stack:
+            stack[-1][2] += elapsed
+        else:
+            self.elapsed += elapsed
+
+    def report(self, limit=20, source=None):
+        """
+        Describe the profile as text.
+
+        Parameters:
+        - limit (int): Number of nodes and lines listed
+        - source (str, optional): Program text, to show the hottest lines
+
+        Returns:
+        - list: Report lines, nodes sorted by self time
+        """
+        nodes = sorted(self.nodes.values(), key=lambda stats: stats.self_time, reverse=True)
+        lines = [f"Profile: {len(nodes)} nodes, {self.elapsed:.6f}s",
+                 f"{'line':>6} {'hits':>10} {'total(s)':>11} {'self(s)':>11}  node"]
+        for stats in nodes[:limit]:
+            line = stats.line if stats.line is not None else "-"
+            lines.append(f"{line:>6} {stats.hits:>10} {stats.total:11.6f} "
+                         f"{stats.self_time:11.6f}  {stats.label}")
+
+        if source is not None:
+            per_line = {}
+            for stats in nodes:
+                if stats.line is not None:
+                    per_line[stats.line] = per_line.get(stats.line, 0.0) + stats.self_time
+            source_lines = source.splitlines()
+            lines.append("")
+            lines.append(f"{'line':>6} {'self(s)':>11}  source")
+            for number, self_time in sorted(per_line.items(), key=lambda item: item[1],
+                                            reverse=True)[:limit]:
+                text = source_lines[number - 1].strip() if number <= len(source_lines) else ""
+                lines.append(f"{number:>6} {self_time:11.6f}  {text}")
+        return lines
+
+    def collapsed_stacks(self):
+        """
+        Return the profile as collapsed stacks, one "frame;...;frame weight"
+        line per distinct stack, weighted by self time in microseconds.
+        Stacks with less than a microsecond of self time are left out.
+        """
+        lines = []
+        for stack_id, self_time in enumerate(self.stack_self):
+            weight = round(self_time * 1e6)
+            if weight <= 0:
+                continue
+            frames = []
+            while stack_id >= 0:
+                parent, frame = self.stack_keys[stack_id]
+                frames.append(frame.replace(';', ','))
+                stack_id = parent
+            lines.append(f"{';'.join(reversed(frames))} {weight}")
+        return lines
+
+    def write_collapsed(self, path):
+        """Write collapsed_stacks() to a file."""
+        with open(path, 'w') as f:
+            for line in self.collapsed_stacks():
+                f.write(line + "\n")
+
+
+class ProfilingEvaluator(Evaluator):
+    """
+    Tree-walking Evaluator that records every node it runs in a Profiler.
+    Function calls and loops run through _eval() as well, so their bodies
+    are profiled too.
+    """
+
+    def __init__(self, profiler=None):
+        super().__init__()
+        self.profiler = profiler if profiler is not None else Profiler()
+
+    def _eval(self, node):
+        profiler = self.profiler
+        record = profiler.enter(node)
+        try:
+            return Evaluator._eval(self, node)
+        finally:
+            profiler.leave(record)
@@ -0,0 +1,274 @@
+"""
+Resolver pass that runs between Parser.parse() and evaluation.
+
+Every variable name in the AST is given a slot number in a Data store, and
+the AST is rewritten so that variables are accessed by slot:
+
+- VARIABLE token            -> ('LOAD_SLOT', slot, name)
+- ('ASSIGN', token, expr)   -> ('STORE_SLOT', slot, name, expr)
+- ('DEL', token)            -> ('DEL_SLOT', slot, name)
+- ('FOR', token, expr, body)              -> ('FOR_SLOT', slot, name, expr, body)
+- ('FOR_RANGE', token, start, end, body)  -> ('FOR_RANGE_SLOT', slot, name, start, end, body)
+
+Inside a function body, the parameters and the names the body assigns to
+(by assignment, for loop or del) are local variables, unless declared with
+`global name`. They get slot numbers in the call frame instead, and use the
+LOAD_LOCAL, STORE_LOCAL, DEL_LOCAL, FOR_LOCAL and FOR_RANGE_LOCAL forms of
+the nodes above. All other names in the body are global.
+
+- ('FUNCTION', token, [params], body, memo) -> ('DEFINE', slot, name, param_count, local_names, memo, body)
+- ('GLOBAL', token)                   -> ('BLOCK', [])
+
+Slot numbers belong to the Data store used for resolving, so a resolved AST
+must be run against that same store.
+
+If the tokens carry source positions (Scanner(text, positions=True)), the
+resolver can also record the source line of each node it builds, for tools
+such as the profiler: a node gets the line of its own token (the variable
+of an assignment, the operator of an expression), or else that of its first
+child with a line.
+"""
+
+from tokens import Token
+
+
+# Work items of Resolver.resolve(): (kind, node)
+RESOLVE = 0       # resolve node, leaving its result on the result stack
+KEEP = 1          # push node unchanged
+BUILD_LIST = 2    # replace the last len(node) results with a list of them
+BUILD_TUPLE = 3   # replace the last len(node) results with a tuple of them
+BUILD_PREFIX = 4  # node is (prefix, n, line): append the last n results to the prefix tuple
+SET_SCOPE = 5     # node is the local slot table to use from now on (None at top level)
+
+# Raw and resolved tags of nodes that assign to the variable in node[1]
+RESOLVED_TAGS = {'ASSIGN': 'STORE_SLOT', 'FOR': 'FOR_SLOT', 'FOR_RANGE': 'FOR_RANGE_SLOT'}
+LOCAL_TAGS = {'ASSIGN': 'STORE_LOCAL', 'FOR': 'FOR_LOCAL', 'FOR_RANGE': 'FOR_RANGE_LOCAL'}
+
+# Resolved nodes (tag, slot, name, children...), kept as they are
+SLOT_TAGS = ('LOAD_SLOT', 'STORE_SLOT', 'DEL_SLOT', 'FOR_SLOT', 'FOR_RANGE_SLOT')
+LOCAL_SLOT_TAGS = ('LOAD_LOCAL', 'STORE_LOCAL', 'DEL_LOCAL', 'FOR_LOCAL', 'FOR_RANGE_LOCAL')
+
+
+def function_locals(params, body):
+    """
+    Return the local variable names of a function: its parameters, then
+    the other names the body assigns to or deletes, in source order.
+
+    Raises:
+    - ValueError: If a parameter is declared global.
+    """
+    declared_global = set()
+    assigned = []
+    work = [body]
+    while work:
+        node = work.pop()
+        if isinstance(node, list):
+            work.extend(reversed(node))
+        elif isinstance(node, tuple) and node:
+            tag = node[0]
+            if tag == 'GLOBAL':
+                declared_global.add(node[1].value)
+            elif tag in RESOLVED_TAGS or tag == 'DEL':
+                assigned.append(node[1].value)
+            work.extend(reversed(node[1:]))
+
+    for param in params:
+        if param in declared_global:
+            raise ValueError(f"Parameter '{param}' cannot be declared global")
+    others = [name for name in dict.fromkeys(assigned)
+              if name not in params and name not in declared_global]
+    return tuple(params) + tuple(others)
+
+
+class Resolver:
+    """
+    Rewrites an AST to use the variable slots of a Data store.
+    Collects the slot table (name -> slot) of the names the program uses.
+    """
+
+    def __init__(self, data, lines=None):
+        self.data = data
+        self.slot_table = {}
+        self.local_slots = None  # name -> frame slot inside a function body
+        self.lines = lines       # id(resolved node) -> source line, or None
+
+    def slot(self, name):
+        index = self.data.slot(name)
+        self.slot_table[name] = index
+        return index
+
+    def resolve(self, node):
+        """
+        Return a copy of node with all variable accesses resolved to slots.
+
+        Walks the tree with an explicit stack rather than recursion, so
+        very long operator chains (a + b + c + ...) do not hit Python's
+        recursion limit. Nodes are visited in source order, so slots are
+        assigned in the same order as by a recursive walk.
+        """
+        results = []
+        work = [(RESOLVE, node)]
+        while work:
+            kind, node = work.pop()
+
+            if kind == KEEP:
+                results.append(node)
+                continue
+
+            if kind == SET_SCOPE:
+                self.local_slots = node
+                continue
+
+            if kind == RESOLVE:
+                if isinstance(node, Token):
+                    if node.type == 'VARIABLE':
+                        local_slots = self.local_slots
+                        if local_slots is not None and node.value in local_slots:
+                            load = ('LOAD_LOCAL', local_slots[node.value], node.value)
+                        else:
+                            load = ('LOAD_SLOT', self.slot(node.value), node.value)
+                        if self.lines is not None and node.line is not None:
+                            self.lines[id(load)] = node.line
+                        results.append(load)
+                    else:
+                        results.append(node)
+                elif isinstance(node, list):
+                    work.append((BUILD_LIST, node))
+                    work.extend((RESOLVE, child) for child in reversed(node))
+                elif not isinstance(node, tuple) or not node:
+                    results.append(node)
+                else:
+                    self.visit_tuple(node, work, results)
+                continue
+
+            # A composite node whose children are the last results
+            count = len(node) if kind != BUILD_PREFIX else node[1]
+            children = results[len(results) - count:]
+            del results[len(results) - count:]
+            if kind == BUILD_LIST:
+                built = children
+            elif kind == BUILD_TUPLE:
+                built = tuple(children)
+            else:
+                built = node[0] + tuple(children)
+            if self.lines is not None:
+                line = None
+                if kind == BUILD_TUPLE:
+                    line = token_line(node)
+                elif kind == BUILD_PREFIX:
+                    line = node[2]
+                self.record_line(built, line, children)
+            results.append(built)
+        return results[0]
+
+    def record_line(self, built, line, children):
+        """Record the line of a built node: line, or that of its first child with one."""
+        lines = self.lines
+        for child in children:
+            if line is not None:
+                break
+            if isinstance(child, Token):
+                line = child.line
+            elif isinstance(child, (tuple, list)):
+                line = lines.get(id(child))
+        if line is not None:
+            lines[id(built)] = line
+
+    def visit_tuple(self, node, work, results):
+        """Schedule the children of a tuple node."""
+        tag = node[0]
+        local_slots = self.local_slots
+
+        if tag in RESOLVED_TAGS:
+            name = node[1].value
+            children = node[2:]
+            if local_slots is not None and name in local_slots:
+                prefix = (LOCAL_TAGS[tag], local_slots[name], name)
+            else:
+                prefix = (RESOLVED_TAGS[tag], self.slot(name), name)
+            work.append((BUILD_PREFIX, (prefix, len(children), node[1].line)))
+            work.extend((RESOLVE, child) for child in reversed(children))
+
+        elif tag == 'DEL':
+            name = node[1].value
+            if local_slots is not None and name in local_slots:
+                delete = ('DEL_LOCAL', local_slots[name], name)
+            else:
+                delete = ('DEL_SLOT', self.slot(name), name)
+            if self.lines is not None and node[1].line is not None:
+                self.lines[id(delete)] = node[1].line
+            results.append(delete)
+
+        elif tag == 'FUNCTION':
+            name = node[1].value
+            params = [token.value for token in node[2]]
+            local_names = function_locals(params, node[3])
+            prefix = ('DEFINE', self.slot(name), name, len(params), local_names, node[4])
+            # The body is resolved with the function's own scope, which is
+            # set now and replaced by the enclosing one once the body is done
+            work.append((BUILD_PREFIX, (prefix, 1, node[1].line)))
+            work.append((SET_SCOPE, local_slots))
+            work.append((RESOLVE, node[3]))
+            self.local_slots = {local: index for index, local in enumerate(local_names)}
+
+        elif tag == 'GLOBAL':
+            results.append(('BLOCK', []))
+
+        elif tag in SLOT_TAGS or tag == 'DEFINE':
+            self.slot_table[node[2]] = node[1]
+            prefix_length = 6 if tag == 'DEFINE' else 3
+            children = node[prefix_length:]
+            if children:
+                work.append((BUILD_PREFIX, (node[:prefix_length], len(children), None)))
+                work.extend((RESOLVE, child) for child in reversed(children))
+            else:
+                results.append(node)
+
+        elif tag in LOCAL_SLOT_TAGS:
+            children = node[3:]
+            if children:
+                work.append((BUILD_PREFIX, (node[:3], len(children), None)))
+                work.extend((RESOLVE, child) for child in reversed(children))
+            else:
+                results.append(node)
+
+        elif tag == 'METHOD_CALL':
+            # The method name is a VARIABLE token but not a variable
+            work.append((BUILD_TUPLE, node))
+            work.append((RESOLVE, node[3]))
+            work.append((KEEP, node[2]))
+            work.append((RESOLVE, node[1]))
+            work.append((KEEP, tag))
+
+        else:
+            # Operator nodes keep their operator token as the first element
+            work.append((BUILD_TUPLE, node))
+            work.extend((RESOLVE, child) for child in reversed(node))
+
+
+def token_line(node):
+    """Return the source line of the first positioned token among node's elements, or None."""
+    for element in node:
+        if isinstance(element, Token) and element.line is not None:
+            return element.line
+    return None
+
+
+def resolve(ast, data, lines=None):
+    """
+    Resolve the variables of an AST against a Data store.
+
+    Parameters:
+    - ast: The AST from Parser (or Optimizer)
+    - data: The Data store that gets the slots
+    - lines (dict, optional): Filled with id(node) -> source line for the
+      resolved nodes whose source tokens recorded positions. The ids are
+      only meaningful while the resolved AST is kept alive.
+
+    Returns:
+    - (resolved_ast, slot_table): slot_table maps each variable name used by
+      the program to its slot number in data.
+    """
+    resolver = Resolver(data, lines)
+    resolved = resolver.resolve(ast)
+    return resolved, resolver.slot_table
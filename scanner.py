@@ -1,4 +1,6 @@
-from tokens import Token
+import re
+
+from tokens import Token, PositionedToken, LineStartToken
 
 class Scanner:
     """
@@ -26,17 +28,27 @@ class Scanner:
         'input':  ('INPUT', 'input'),
         'int':    ('INT', 'int'),
         'in': ('IN', 'in'),
+        'func': ('FUNC', 'func'),
+        'return': ('RETURN', 'return'),
+        'global': ('GLOBAL', 'global'),
+        'memo': ('MEMO', 'memo'),
     }
 
-    def __init__(self, text):
+    def __init__(self, text, positions=False):
         """
         Initialise the scanner with input text.
         Set the starting position and current character.
+        If positions is True, tokens record their source line and column.
         """
         self.text = text
         self.position = 0
         self.current_char = self.text[self.position] if self.text else None
         self._peeked_token = None  # Cache for peeked token (lookahead)
+        self.positions = positions
+        self._line = 1            # line of self._counted
+        self._line_start = 0      # position where that line starts
+        self._counted = 0         # newlines before this position are counted
+        self._token_end = 0       # position after the last token
 
     def advance(self):
         """Move the position one character forward."""
@@ -153,19 +165,39 @@ class Scanner:
                     self.advance()
                 continue
 
+            start = self.position
             if self.current_char.isdigit():
-                return self.number()
-
-            if self.current_char.isalpha() or self.current_char == '_':
-                return self.identifier()
-
-            if self.current_char == '"':
-                return self.string()
+                token = self.number()
+            elif self.current_char.isalpha() or self.current_char == '_':
+                token = self.identifier()
+            elif self.current_char == '"':
+                token = self.string()
+            else:
+                token = self.operator()
 
-            return self.operator()
+            if self.positions:
+                token = PositionedToken(token.type, token.value, *self.location(start))
+            elif token.type == 'LPAREN' and '\n' in self.text[self._token_end:start]:
+                token = LineStartToken('LPAREN', '(')
+            self._token_end = self.position
+            return token
 
+        if self.positions:
+            return PositionedToken('EOF', None, *self.location(len(self.text)))
         return Token('EOF', None)
 
+    def location(self, position):
+        """
+        Return the 1-based (line, column) of a position at or after the
+        previously located one. Newlines are counted only once.
+        """
+        newlines = self.text.count('\n', self._counted, position)
+        if newlines:
+            self._line += newlines
+            self._line_start = self.text.rindex('\n', self._counted, position) + 1
+        self._counted = position
+        return self._line, position - self._line_start + 1
+
     def peek_next_token(self):
         """
         Peek at the next token without consuming it.
@@ -174,3 +206,254 @@ class Scanner:
         if not self._peeked_token:
             self._peeked_token = self.get_next_token()
         return self._peeked_token
+
+
+class RegexScanner:
+    """
+    Table-driven scanner with the same interface and token stream as Scanner.
+
+    The whole input is tokenised in one pass using a single compiled master
+    regular expression whose named groups select the token kind. Errors are
+    recorded at the position they occur and raised only when the parser asks
+    for that token, so error reporting order is the same as with Scanner.
+    """
+
+    keywords = Scanner.keywords
+
+    escape_map = {'n': '\n', 't': '\t', '"': '"', '\\': '\\'}
+
+    # Operator symbol -> token type
+    operators = {
+        '!=': 'NEQ', '==': 'EQ', '<=': 'LTE', '>=': 'GTE', '?=': 'QMARK_EQ',
+        '!': 'NOT', '+': 'PLUS', '-': 'MINUS', '*': 'MUL', '/': 'DIV',
+        '%': 'MOD', '<': 'LT', '>': 'GT', '=': 'ASSIGN', '.': 'DOT', ':': 'COLON',
+        '(': 'LPAREN', ')': 'RPAREN', '{': 'LBRACE', '}': 'RBRACE', '[': 'LSQUARE', ']': 'RSQUARE', ',': 'COMMA',
+    }
+
+    # Leading whitespace is part of every match and the final ERROR
+    # alternative matches any other character, so the matches cover the
+    # whole text apart from trailing whitespace.
+    token_pattern = re.compile(r"""
+        [ \t\n\r]*
+        (?:
+              (?P<OPERATOR>!=|==|<=|>=|\?=|[!+\-*/%<>=.:(){}\[\],])
+            | (?P<NAME>[^\W\d]\w*)
+            | (?P<NUMBER>\d+(?P<FRACTION>\.\d*)?)
+            | (?P<STRING>"(?:[^"\\]|\\.)*")
+            | (?P<COMMENT>\#[^\n]*\n?)
+            | (?P<ERROR>[^ \t\n\r])
+        )
+    """, re.VERBOSE | re.DOTALL)
+
+    unclosed_string_pattern = re.compile(r'"(?:[^"\\]|\\.)*', re.DOTALL)
+
+    escape_pattern = re.compile(r'\\(.)', re.DOTALL)
+
+    def __init__(self, text, positions=False):
+        """
+        Initialise the scanner and tokenise the whole input text.
+        If positions is True, tokens record their source line and column.
+        """
+        self.text = text
+        self.positions = positions
+        self.tokens = []
+        self.index = 0
+        self.end_position = None  # (line, column) after the last character, set by scan()
+        self.error = None  # Error found after the last token, raised when reached
+        try:
+            self.tokens.extend(self.scan((text,)))
+        except ValueError as error:
+            self.error = error
+
+    def scan(self, chunks):
+        """
+        Generate tokens from an iterable of text chunks.
+
+        A token that touches the end of the current buffer may continue in
+        the next chunk, so it is only produced once more text has arrived or
+        the input has ended. Errors are raised with positions counted from
+        the start of the whole input.
+        """
+        pattern = self.token_pattern
+        keywords = self.keywords
+        operators = self.operators
+        positions = self.positions
+        chunks = iter(chunks)
+        buffer = ''
+        offset = 0  # position of buffer[0] in the whole input
+        line = 1          # source line of buffer[counted]
+        line_start = 0    # position in the whole input where that line starts
+        counted = 0       # newlines in the buffer before this index are counted
+        comment_end = -1  # position in the whole input after the last comment
+        chunk = next(chunks, None)
+
+        while chunk is not None:
+            buffer = buffer + chunk if buffer else chunk
+            chunk = next(chunks, None)  # read ahead to know if more text follows
+            more = chunk is not None
+            end = len(buffer)
+            position = 0
+
+            for m in pattern.finditer(buffer):
+                kind = m.lastgroup
+                if more and (m.end() == end or (kind == 'ERROR' and buffer[m.start(kind)] == '"')):
+                    break  # wait for the rest of this token
+
+                position = m.end()
+                if kind == 'OPERATOR':
+                    value = m.group(kind)
+                    token_type = operators[value]
+                elif kind == 'NAME':
+                    value = m.group(kind)
+                    keyword = keywords.get(value.lower())
+                    if keyword is None:
+                        token_type = 'VARIABLE'
+                    else:
+                        token_type, value = keyword
+                elif kind == 'NUMBER':
+                    fraction = m.group('FRACTION')
+                    if fraction is None:
+                        token_type = 'NUMBER'
+                        value = int(m.group(kind))
+                    elif fraction == '.':
+                        raise ValueError(f"Invalid float literal at position {offset + m.end()}")
+                    else:
+                        token_type = 'FLOAT'
+                        value = float(m.group(kind))
+                elif kind == 'STRING':
+                    token_type = 'STRING'
+                    value = m.group(kind)[1:-1]
+                    if '\\' in value:
+                        value = self.escape_pattern.sub(self.unescape, value)
+                elif kind == 'ERROR':
+                    raise self.scan_error(buffer, m.start(kind), offset)
+                else:
+                    comment_end = offset + m.end()
+                    continue  # COMMENT produces no token
+
+                if positions:
+                    start = m.start(kind)
+                    newlines = buffer.count('\n', counted, start)
+                    if newlines:
+                        line += newlines
+                        line_start = offset + buffer.rindex('\n', counted, start) + 1
+                    counted = start
+                    yield PositionedToken(token_type, value, line, offset + start - line_start + 1)
+                elif token_type == 'LPAREN' and (comment_end == offset + m.start()
+                                                 or '\n' in buffer[m.start():m.start(kind)]):
+                    # A comment ends its line, so '(' after one starts a line too
+                    yield LineStartToken(token_type, value)
+                else:
+                    yield Token(token_type, value)
+
+            if positions and counted < position:
+                newlines = buffer.count('\n', counted, position)
+                if newlines:
+                    line += newlines
+                    line_start = offset + buffer.rindex('\n', counted, position) + 1
+                counted = position
+            buffer = buffer[position:]
+            offset += position
+            counted -= position
+
+        if positions:
+            # Only trailing whitespace is left in the buffer
+            newlines = buffer.count('\n', counted)
+            if newlines:
+                line += newlines
+                line_start = offset + buffer.rindex('\n') + 1
+            self.end_position = (line, offset + len(buffer) - line_start + 1)
+
+    def unescape(self, m):
+        ch = m.group(1)
+        return self.escape_map.get(ch, '\\' + ch)
+
+    def scan_error(self, text, position, offset=0):
+        """Build the error for text at position that matches no token."""
+        ch = text[position]
+        if ch == '"':
+            m = self.unclosed_string_pattern.match(text, position)
+            if m.end() < len(text):  # stopped at a trailing backslash
+                return ValueError("Unclosed string literal with escape")
+            return ValueError("Unclosed string literal")
+        return ValueError(f"Unknown operator or character: '{ch}' at position {offset + position}")
+
+    def get_next_token(self):
+        """
+        Retrieve the next token from input.
+        Returns EOF token at end of input.
+        """
+        if self.index < len(self.tokens):
+            token = self.tokens[self.index]
+            self.index += 1
+            return token
+        if self.error is not None:
+            raise self.error
+        return self.end_token()
+
+    def end_token(self):
+        """The EOF token, positioned after the last character if positions are recorded."""
+        if not self.positions:
+            return Token('EOF', None)
+        return PositionedToken('EOF', None, *self.end_position)
+
+    def peek_next_token(self):
+        """
+        Peek at the next token without consuming it.
+        Useful for lookahead during parsing.
+        """
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        if self.error is not None:
+            raise self.error
+        return self.end_token()
+
+
+class StreamScanner(RegexScanner):
+    """
+    Scanner that reads its input from a text file object in chunks.
+
+    Tokens are produced one at a time as the parser asks for them, so only
+    the current chunk and the token being built are held in memory.
+    """
+
+    def __init__(self, file, chunk_size=1 << 16, positions=False):
+        """
+        Initialise the scanner with an open text file (or any object with a
+        read(size) method returning str).
+        If positions is True, tokens record their source line and column.
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.positions = positions
+        self.end_position = None
+        self.stream = self.scan(iter(lambda: file.read(chunk_size), ''))
+        self._peeked_token = None  # Cache for peeked token (lookahead)
+
+    def get_next_token(self):
+        """
+        Retrieve the next token from the stream.
+        Returns EOF token at end of input.
+        """
+        if self._peeked_token is not None:
+            token = self._peeked_token
+            self._peeked_token = None
+            return token
+        return next(self.stream, None) or self.end_token()
+
+    def peek_next_token(self):
+        """
+        Peek at the next token without consuming it.
+        Useful for lookahead during parsing.
+        """
+        if self._peeked_token is None:
+            self._peeked_token = self.get_next_token()
+        return self._peeked_token
+
+
+# Token types are not checked when tokens are created, so check the
+# scanner tables once here instead.
+for _token_type, _ in Scanner.keywords.values():
+    Token.validate_type(_token_type)
+for _token_type in RegexScanner.operators.values():
+    Token.validate_type(_token_type)
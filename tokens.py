@@ -60,6 +60,12 @@ class Token:
         'CONTINUE': 'CONTINUE',   # Continue from loop
         'FOR': 'FOR',             # For loop
 
+        # Functions
+        'FUNC': 'FUNC',          # Function definition
+        'RETURN': 'RETURN',      # Return from a function
+        'GLOBAL': 'GLOBAL',      # Assign a global variable inside a function
+        'MEMO': 'MEMO',          # Cache the results of a function
+
         # Deletion
         'DEL': 'DEL',            # Delete keyword
 
@@ -68,6 +74,20 @@ class Token:
         'EOF': 'EOF'             # End of input/file
     }
 
+    # Tokens are created in very large numbers, so they use slots instead of
+    # a per-instance __dict__. Token types are the interned string keys of
+    # TYPE_DISPLAY, so comparisons like token.type == 'PLUS' stay cheap.
+    __slots__ = ('type', 'value')
+
+    # Source position; only PositionedToken stores one
+    line = None
+    column = None
+
+    # Whether a line break comes before the token. Scanners without
+    # positions mark only the '(' tokens that start a line, with
+    # LineStartToken (see Parser.call_follows)
+    starts_line = False
+
     def __init__(self, token_type, value=None):
         """
         Create a new token object.
@@ -76,13 +96,36 @@ class Token:
         - token_type (str): A key from TYPE_DISPLAY that identifies the token's type.
         - value (optional): The associated value (e.g., actual number, string, etc.)
 
+        The type is not checked here because scanners create tokens in their
+        innermost loop from tables that are checked once with validate_type().
+        Code building tokens from other input should call validate_type() first.
+        """
+        self.type = token_type
+        self.value = value
+
+    @classmethod
+    def validate_type(cls, token_type):
+        """
+        Check that token_type is a recognised token type.
+
+        Returns:
+        - token_type, unchanged.
+
         Raises:
         - ValueError: If token_type is not recognised.
         """
-        if token_type not in self.TYPE_DISPLAY:
+        if token_type not in cls.TYPE_DISPLAY:
             raise ValueError(f"Invalid token type: {token_type}")
-        self.type = token_type
-        self.value = value
+        return token_type
+
+    def location(self):
+        """
+        Return a short description of where the token starts, e.g. "line 3, column 7",
+        or an empty string if the scanner did not record positions.
+        """
+        if self.line is None:
+            return ""
+        return f"line {self.line}, column {self.column}"
 
     def __repr__(self):
         """
@@ -107,3 +150,40 @@ class Token:
                 return f'STRING("{self.value}")'
             return f"{display_type}({self.value})"
         return display_type
+
+
+class PositionedToken(Token):
+    """
+    A token that also records where it starts in the source text.
+    Scanners create these instead of Token when asked to record positions.
+    """
+
+    __slots__ = ('line', 'column')
+
+    def __init__(self, token_type, value=None, line=None, column=None):
+        """
+        Create a new token object with a source position.
+
+        Parameters:
+        - token_type (str): A key from TYPE_DISPLAY that identifies the token's type.
+        - value (optional): The associated value
+        - line (int): 1-based source line where the token starts
+        - column (int): 1-based source column where the token starts
+        """
+        self.type = token_type
+        self.value = value
+        self.line = line
+        self.column = column
+
+
+class LineStartToken(Token):
+    """
+    A token that is the first on its source line, for scanners that do not
+    record positions. Only '(' is marked this way, so that a name at the end
+    of one line and a parenthesised expression on the next are not parsed
+    as a call.
+    """
+
+    __slots__ = ()
+
+    starts_line = True
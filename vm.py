@@ -0,0 +1,801 @@
+"""
+Bytecode compiler and stack-based virtual machine.
+
+The Compiler turns a resolved AST (see resolver.py) into a Code object: a
+flat instruction list of (opcode, argument) integer pairs and a constants
+pool. LOAD_SLOT and STORE_SLOT use the slot numbers of the Data store the AST
+was resolved against. The VM runs a Code object in a single dispatch loop.
+Control flow (if/while/for/break/continue) is compiled into jumps, so loops never
+raise exceptions and variables are read by index instead of by name.
+
+A function body is compiled into a Code object of its own, whose
+LOAD_LOCAL and STORE_LOCAL instructions use the slots of the call frame.
+Each call runs the body's Code in a nested VM.execute().
+"""
+
+from tokens import Token
+from data import Data, List, VariableNotDefinedError, UNDEFINED, materialize, type_name
+from memo import MEMO_SIZE
+from output import StreamOutput
+from resolver import resolve
+from evaluator import (Evaluator, TypeConversionError, BreakException,
+                       ContinueException, BINARY_OPERATIONS, MAX_CALL_DEPTH,
+                       _list_values, _range_values, _check_call, _make_function, _call_memo,
+                       _call_method, start_run, run_safepoint)
+from budget import BudgetExceededError, SAFEPOINT_INTERVAL
+
+
+# ==== Opcodes ====
+# Every instruction takes two entries in Code.instructions: opcode, argument.
+# Instructions without an argument store 0.
+LOAD_CONST = 0       # push constants[arg]
+LOAD_SLOT = 1        # push the variable in slot arg
+STORE_SLOT = 2       # pop into slot arg
+DELETE_SLOT = 3      # delete the variable in slot arg
+BINARY_OP = 4        # pop right, pop left, push BINARY_OP_NAMES[arg] applied
+NEGATE = 5           # unary minus on top of stack
+LOGICAL_NOT = 6      # unary not on top of stack
+INT_CAST = 7         # int() on top of stack
+BUILD_LIST = 8       # pop arg elements, push a List of them
+LIST_ACCESS = 9      # pop index, pop list, push list[index]
+LIST_APPEND = 10     # pop value, pop list, append value, push None
+LIST_REMOVE = 11     # pop index, pop list, push removed element
+CALL_METHOD = 12     # constants[arg] is (name, argc); pop args and object
+PRINT = 13           # pop and print
+INPUT = 14           # pop prompt, push the line read
+JUMP = 15            # continue at instruction offset arg
+JUMP_IF_FALSE = 16   # pop; jump to arg if the value is falsy
+POP_TOP = 17         # discard top of stack
+SET_RESULT = 18      # pop into the result register
+LOAD_RESULT = 19     # push the result register
+STORE_LOOP_RESULT = 20  # replace the value arg entries below the top of stack with the result register
+RAISE_BREAK = 21     # break outside of a loop
+RAISE_CONTINUE = 22  # continue outside of a loop
+UNKNOWN_NODE = 23    # constants[arg] is a node the compiler does not know
+RETURN = 24          # stop and return the result register
+GET_ITER = 25        # replace the List on top of stack with an iterator over it
+RANGE_ITER = 26      # pop end, replace start with an iterator over start:end
+FOR_ITER = 27        # push the iterator's next value, or pop it and jump to arg
+LOAD_LOCAL = 28      # push the local variable in frame slot arg
+STORE_LOCAL = 29     # pop into frame slot arg
+DELETE_LOCAL = 30    # delete the local variable in frame slot arg
+MAKE_FUNCTION = 31   # constants[arg] is (name, param_count, local_names, memo, body, code); push a Function
+CALL_FUNCTION = 32   # pop arg arguments and the function, push the call's value
+RETURN_VALUE = 33    # return the value on top of stack from the function
+
+OPNAMES = [
+    'LOAD_CONST', 'LOAD_SLOT', 'STORE_SLOT', 'DELETE_SLOT', 'BINARY_OP',
+    'NEGATE', 'LOGICAL_NOT', 'INT_CAST', 'BUILD_LIST', 'LIST_ACCESS',
+    'LIST_APPEND', 'LIST_REMOVE', 'CALL_METHOD', 'PRINT', 'INPUT', 'JUMP',
+    'JUMP_IF_FALSE', 'POP_TOP', 'SET_RESULT', 'LOAD_RESULT',
+    'STORE_LOOP_RESULT', 'RAISE_BREAK', 'RAISE_CONTINUE', 'UNKNOWN_NODE',
+    'RETURN', 'GET_ITER', 'RANGE_ITER', 'FOR_ITER', 'LOAD_LOCAL',
+    'STORE_LOCAL', 'DELETE_LOCAL', 'MAKE_FUNCTION', 'CALL_FUNCTION',
+    'RETURN_VALUE',
+]
+
+BINARY_OP_NAMES = tuple(BINARY_OPERATIONS)
+BINARY_OP_FUNCTIONS = tuple(BINARY_OPERATIONS[name] for name in BINARY_OP_NAMES)
+PLUS_OP = BINARY_OP_NAMES.index('PLUS')
+
+# Statement tags handled by Compiler.statement()
+STATEMENT_TAGS = ('BLOCK', 'STORE_SLOT', 'PRINT', 'IF', 'WHILE', 'FOR_SLOT', 'FOR_RANGE_SLOT',
+                  'DEL_SLOT', 'BREAK', 'CONTINUE', 'STORE_LOCAL', 'DEL_LOCAL', 'FOR_LOCAL',
+                  'FOR_RANGE_LOCAL', 'DEFINE', 'RETURN')
+
+
+class Code:
+    """
+    A compiled program.
+
+    Attributes:
+    - instructions (list): Flat list of opcode, argument pairs
+    - constants (list): Constants pool referenced by LOAD_CONST and friends
+    - names (dict): Slot number -> variable name for the slots the code uses
+    - local_names (tuple): Frame slot number -> name, for a function body
+    - lines (dict): Instruction offset -> source line, for the instructions
+      a budget can stop at (loop jumps, list and string building), if the
+      program was compiled with a line table
+    """
+
+    def __init__(self, instructions, constants, names, local_names=(), lines=None):
+        self.instructions = instructions
+        self.constants = constants
+        self.names = names
+        self.local_names = local_names
+        self.lines = lines if lines is not None else {}
+
+    def describe(self, offset):
+        """
+        Describe the instruction at offset for a budget error, in the words
+        budget.describe_location() uses for the AST node it was compiled from.
+        """
+        instructions = self.instructions
+        op = instructions[offset]
+        arg = instructions[offset + 1]
+        if op == JUMP:
+            # A for loop jumps back to its FOR_ITER, followed by the store
+            # of the loop variable
+            if instructions[arg] == FOR_ITER:
+                slot = instructions[arg + 3]
+                name = self.local_names[slot] if instructions[arg + 2] == STORE_LOCAL else self.names[slot]
+                description = f"in a for loop over {name}"
+            else:
+                description = "in a while loop"
+        elif op == BUILD_LIST:
+            description = "building a list"
+        elif op == LIST_APPEND:
+            description = "appending to a list"
+        elif op == CALL_METHOD:
+            description = f"calling .{self.constants[arg][0]}()"
+        elif op == BINARY_OP:
+            description = "in a + operation"
+        else:
+            description = f"at bytecode offset {offset}"
+        line = self.lines.get(offset)
+        return f"{description} at line {line}" if line is not None else description
+
+    def __repr__(self):
+        return (f"Code({len(self.instructions) // 2} instructions, "
+                f"{len(self.constants)} constants, {len(self.names)} slots)")
+
+
+class Compiler:
+    """
+    Compiles a resolved parser AST into a Code object.
+
+    Only statements whose value can become the program's result (the last
+    statement of the program, recursively through blocks, ifs and loops)
+    write to the result register; all other statement values are dropped.
+
+    Given node_lines (id(node) -> source line, as filled by resolve()), it
+    keeps the lines of the instructions a budget can stop at in Code.lines.
+    """
+
+    def __init__(self, node_lines=None):
+        self.instructions = []
+        self.constants = []
+        self.constant_index = {}
+        self.names = {}
+        self.loops = []  # (continue target, offsets of break jumps to patch, loop node)
+        self.node_lines = node_lines
+        self.lines = {}
+
+    def compile(self, ast):
+        """Compile a whole program and return its Code object."""
+        self.statement(ast, True)
+        self.emit(RETURN)
+        return Code(self.instructions, self.constants, self.names, lines=self.lines)
+
+    def compile_function(self, body, local_names):
+        """Compile a resolved function body and return its Code object."""
+        self.statement(body, False)
+        self.emit(LOAD_CONST, self.constant(None))
+        self.emit(RETURN_VALUE)
+        return Code(self.instructions, self.constants, self.names, local_names, self.lines)
+
+    # ==== Emit Helpers ====
+    def emit(self, opcode, arg=0):
+        """Append an instruction and return its offset."""
+        self.instructions.append(opcode)
+        self.instructions.append(arg)
+        return len(self.instructions) - 2
+
+    def mark(self, offset, node):
+        """Record the source line of node, if known, as that of the instruction at offset."""
+        if self.node_lines is not None:
+            line = self.node_lines.get(id(node))
+            if line is not None:
+                self.lines[offset] = line
+
+    def patch(self, offset, target):
+        """Point the jump at offset to target."""
+        self.instructions[offset + 1] = target
+
+    def here(self):
+        """Offset of the next instruction."""
+        return len(self.instructions)
+
+    def constant(self, value):
+        """Return the constants pool index of value, adding it if needed."""
+        try:
+            key = (type(value), value)
+            if key not in self.constant_index:
+                self.constant_index[key] = len(self.constants)
+                self.constants.append(value)
+            return self.constant_index[key]
+        except TypeError:  # unhashable values are never shared
+            self.constants.append(value)
+            return len(self.constants) - 1
+
+    def slot(self, node):
+        """Return the slot number of a resolved variable node, recording its name."""
+        self.names[node[1]] = node[2]
+        return node[1]
+
+    # ==== Statements ====
+    def statement(self, node, want_result):
+        """
+        Compile a node in statement position.
+        If want_result is True the statement's value is left in the result register.
+        """
+        tag = node[0] if isinstance(node, tuple) and node else None
+
+        if tag == 'BLOCK':
+            statements = node[1]
+            if not statements:
+                if want_result:
+                    self.set_none_result()
+                return
+            for stmt in statements[:-1]:
+                self.statement(stmt, False)
+            self.statement(statements[-1], want_result)
+
+        elif tag == 'STORE_SLOT':
+            self.expression(node[3])
+            self.emit(STORE_SLOT, self.slot(node))
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'PRINT':
+            self.expression(node[1])
+            self.emit(PRINT)
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'DEL_SLOT':
+            self.emit(DELETE_SLOT, self.slot(node))
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'STORE_LOCAL':
+            self.expression(node[3])
+            self.emit(STORE_LOCAL, node[1])
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'DEL_LOCAL':
+            self.emit(DELETE_LOCAL, node[1])
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'DEFINE':
+            _, index, name, param_count, local_names, memo, body = node
+            code = Compiler(self.node_lines).compile_function(body, local_names)
+            self.emit(MAKE_FUNCTION, self.constant((name, param_count, local_names, memo, body, code)))
+            self.emit(STORE_SLOT, self.slot(node))
+            if want_result:
+                self.set_none_result()
+
+        elif tag == 'RETURN':
+            if node[1] is None:
+                self.emit(LOAD_CONST, self.constant(None))
+            else:
+                self.expression(node[1])
+            self.emit(RETURN_VALUE)
+
+        elif tag == 'IF':
+            self.if_statement(node, want_result)
+
+        elif tag == 'WHILE':
+            self.while_statement(node, want_result)
+
+        elif tag in ('FOR_SLOT', 'FOR_RANGE_SLOT', 'FOR_LOCAL', 'FOR_RANGE_LOCAL'):
+            self.for_statement(node, want_result)
+
+        elif tag == 'BREAK':
+            if self.loops:
+                self.loops[-1][1].append(self.emit(JUMP))
+            else:
+                self.emit(RAISE_BREAK)
+
+        elif tag == 'CONTINUE':
+            if self.loops:
+                start, _, loop = self.loops[-1]
+                self.mark(self.emit(JUMP, start), loop)
+            else:
+                self.emit(RAISE_CONTINUE)
+
+        elif tag in ('ASSIGN', 'DEL', 'FOR', 'FOR_RANGE', 'FUNCTION'):
+            raise ValueError("Variables must be resolved before compiling to bytecode")
+
+        else:
+            self.expression(node)
+            self.emit(SET_RESULT if want_result else POP_TOP)
+
+    def set_none_result(self):
+        self.emit(LOAD_CONST, self.constant(None))
+        self.emit(SET_RESULT)
+
+    def if_statement(self, node, want_result):
+        end_jumps = []
+        branches = list(zip(node[1], node[2]))
+        falls_through = not node[3] and not want_result
+        for i, (cond, action) in enumerate(branches):
+            self.expression(cond)
+            skip = self.emit(JUMP_IF_FALSE)
+            self.statement(action, want_result)
+            if not (falls_through and i == len(branches) - 1):
+                end_jumps.append(self.emit(JUMP))
+            self.patch(skip, self.here())
+
+        if node[3]:
+            self.statement(node[3], want_result)
+        elif want_result:
+            self.set_none_result()
+
+        for jump in end_jumps:
+            self.patch(jump, self.here())
+
+    def while_statement(self, node, want_result):
+        # The loop's own result lives on the stack while it runs, so that a
+        # break or continue leaves it at the last fully completed iteration.
+        if want_result:
+            self.emit(LOAD_CONST, self.constant(None))
+
+        start = self.here()
+        self.expression(node[1])
+        exit_jump = self.emit(JUMP_IF_FALSE)
+
+        self.loops.append((start, [], node))
+        self.statement(node[2], want_result)
+        if want_result:
+            self.emit(STORE_LOOP_RESULT)
+        self.mark(self.emit(JUMP, start), node)
+        _, break_jumps, _ = self.loops.pop()
+
+        end = self.here()
+        self.patch(exit_jump, end)
+        for jump in break_jumps:
+            self.patch(jump, end)
+
+        if want_result:
+            self.emit(SET_RESULT)
+
+    def for_statement(self, node, want_result):
+        # The iterator stays on the stack (above the loop result, if any)
+        # while the loop runs; FOR_ITER pops it when it is exhausted and a
+        # break jumps to a POP_TOP that discards it.
+        if want_result:
+            self.emit(LOAD_CONST, self.constant(None))
+
+        if node[0] in ('FOR_SLOT', 'FOR_LOCAL'):
+            self.expression(node[3])
+            self.emit(GET_ITER)
+        else:
+            self.expression(node[3])
+            self.expression(node[4])
+            self.emit(RANGE_ITER)
+
+        start = self.here()
+        exit_jump = self.emit(FOR_ITER)
+        if node[0] in ('FOR_LOCAL', 'FOR_RANGE_LOCAL'):
+            self.emit(STORE_LOCAL, node[1])
+        else:
+            self.emit(STORE_SLOT, self.slot(node))
+
+        self.loops.append((start, [], node))
+        self.statement(node[-1], want_result)
+        if want_result:
+            self.emit(STORE_LOOP_RESULT, 1)
+        self.mark(self.emit(JUMP, start), node)
+        _, break_jumps, _ = self.loops.pop()
+
+        if break_jumps:
+            for jump in break_jumps:
+                self.patch(jump, self.here())
+            self.emit(POP_TOP)
+        self.patch(exit_jump, self.here())
+
+        if want_result:
+            self.emit(SET_RESULT)
+
+    # ==== Expressions ====
+    def expression(self, node):
+        """Compile a node that leaves exactly one value on the stack."""
+        if isinstance(node, Token):
+            if node.type == 'VARIABLE':
+                raise ValueError("Variables must be resolved before compiling to bytecode")
+            self.emit(LOAD_CONST, self.constant(node.value))
+            return
+
+        if not isinstance(node, tuple) or not node:
+            self.emit(UNKNOWN_NODE, self.constant(node))
+            return
+
+        tag = node[0]
+
+        if tag == 'LOAD_SLOT':
+            self.emit(LOAD_SLOT, self.slot(node))
+
+        elif tag == 'LOAD_LOCAL':
+            self.emit(LOAD_LOCAL, node[1])
+
+        elif tag == 'CALL':
+            self.expression(node[1])
+            for arg in node[2]:
+                self.expression(arg)
+            self.emit(CALL_FUNCTION, len(node[2]))
+
+        elif tag == 'INT_CAST':
+            self.expression(node[1])
+            self.emit(INT_CAST)
+
+        elif tag == 'LIST_LITERAL':
+            for elem in node[1]:
+                self.expression(elem)
+            self.mark(self.emit(BUILD_LIST, len(node[1])), node)
+
+        elif tag in ('LIST_ACCESS', 'LIST_APPEND', 'LIST_REMOVE'):
+            self.expression(node[1])
+            self.expression(node[2])
+            self.mark(self.emit({'LIST_ACCESS': LIST_ACCESS,
+                                 'LIST_APPEND': LIST_APPEND,
+                                 'LIST_REMOVE': LIST_REMOVE}[tag]), node)
+
+        elif tag == 'METHOD_CALL':
+            self.expression(node[1])
+            for arg in node[3]:
+                self.expression(arg)
+            self.mark(self.emit(CALL_METHOD, self.constant((node[2].value, len(node[3])))), node)
+
+        elif tag == 'INPUT':
+            self.expression(node[1])
+            self.emit(INPUT)
+
+        elif tag in STATEMENT_TAGS:
+            self.statement(node, True)
+            self.emit(LOAD_RESULT)
+
+        elif len(node) == 3:
+            self.operator(node)
+
+        else:
+            self.emit(UNKNOWN_NODE, self.constant(node))
+
+    def operator(self, node):
+        op, left, right = node
+        op_type = op.type if isinstance(op, Token) else op
+
+        if op_type == 'MINUS' and left is None:
+            self.expression(right)
+            self.emit(NEGATE)
+            return
+
+        if op_type == 'NOT' and left is None:
+            self.expression(right)
+            self.emit(LOGICAL_NOT)
+            return
+
+        if left is None:
+            self.emit(LOAD_CONST, self.constant(None))
+        else:
+            self.expression(left)
+        self.expression(right)
+
+        if op_type in BINARY_OPERATIONS:
+            self.mark(self.emit(BINARY_OP, BINARY_OP_NAMES.index(op_type)), node)
+        else:
+            # Unknown operators evaluate both sides and raise, as in Evaluator
+            self.emit(POP_TOP)
+            self.emit(POP_TOP)
+            self.emit(UNKNOWN_NODE, self.constant(node))
+
+
+class VM:
+    """
+    Stack-based virtual machine for Code objects.
+    Variables live in the slots of the given Data store, which must be the
+    store the program was resolved against.
+    """
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else Data()
+        self.call_depth = 0
+        self.max_call_depth = MAX_CALL_DEPTH
+        self.memo_depth = 0        # number of running memo function calls
+        self.memo_size = MEMO_SIZE  # cache size of new memo functions
+        self.output = StreamOutput(buffer_size=0)  # where PRINT writes (see output.py)
+        self.input = input         # reads a line for INPUT, given the prompt
+        self.budget = None         # limits of a run (see budget.py), or None
+        self.countdown = self.countdown_start = SAFEPOINT_INTERVAL  # steps to the next safepoint
+        self.safepoint_handlers = []  # called with the VM at every safepoint (see run_safepoint)
+
+    def run(self, code):
+        """
+        Execute a Code object and return the program's result.
+        """
+        start_run(self)
+        return materialize(self.execute(code, None))
+
+    def call(self, function, args):
+        """Call a Function and return its value."""
+        _check_call(function, args, self.call_depth, self.max_call_depth)
+        self.countdown -= 1
+        if self.countdown <= 0:
+            run_safepoint(self, function)
+        if function.cache is not None or self.memo_depth:
+            return _call_memo(self, function, args, self.run_call)
+        return self.run_call(function, args)
+
+    def run_call(self, function, args):
+        """Run the body of a function for a call and return the call's value."""
+        code = function.code
+        if code is None:
+            code = function.code = Compiler().compile_function(function.body, function.local_names)
+        frame = function.new_frame(args)
+        self.call_depth += 1
+        try:
+            return self.execute(code, frame)
+        except BudgetExceededError as error:
+            error.functions.append(function.name)
+            raise
+        finally:
+            self.call_depth -= 1
+            function.free_frame(frame)
+
+    def execute(self, code, frame):
+        """
+        Run a Code object with the given call frame (None for the program
+        itself) and return its result, or the value of a function's return.
+        """
+        instructions = code.instructions
+        constants = code.constants
+        slots = self.data.slots
+        names = self.data.names
+        are_compatible = Evaluator._are_compatible
+        op_names = BINARY_OP_NAMES
+        op_functions = BINARY_OP_FUNCTIONS
+        budget = self.budget
+
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        result = None
+        pc = 0
+
+        while True:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+
+            if op == LOAD_SLOT:
+                value = slots[arg]
+                if value is UNDEFINED:
+                    raise VariableNotDefinedError(f"Variable '{names[arg]}' not defined.")
+                push(value)
+
+            elif op == LOAD_CONST:
+                push(constants[arg])
+
+            elif op == LOAD_LOCAL:
+                value = frame[arg]
+                if value is UNDEFINED:
+                    raise VariableNotDefinedError(f"Variable '{code.local_names[arg]}' not defined.")
+                push(value)
+
+            elif op == BINARY_OP:
+                right_val = pop()
+                left_val = stack[-1]
+                op_type = op_names[arg]
+                if not are_compatible(left_val, right_val, op_type):
+                    raise TypeConversionError(
+                        f"Incompatible types: {type_name(left_val)} and {type_name(right_val)} for {op_type}"
+                    )
+                stack[-1] = op_functions[arg](left_val, right_val)
+                if budget is not None and arg == PLUS_OP:
+                    budget.concatenated(left_val, stack[-1], right_val, (code, pc - 2))
+
+            elif op == STORE_SLOT:
+                slots[arg] = pop()
+
+            elif op == STORE_LOCAL:
+                frame[arg] = pop()
+
+            elif op == CALL_FUNCTION:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                stack[-1] = self.call(stack[-1], args)
+
+            elif op == RETURN_VALUE:
+                return pop()
+
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+
+            elif op == JUMP:
+                # Every loop iteration ends with a jump back: a step
+                if arg < pc:
+                    self.countdown -= 1
+                    if self.countdown <= 0:
+                        run_safepoint(self, (code, pc - 2))
+                pc = arg
+
+            elif op == PRINT:
+                self.output.print(pop())
+
+            elif op == POP_TOP:
+                pop()
+
+            elif op == SET_RESULT:
+                result = pop()
+
+            elif op == STORE_LOOP_RESULT:
+                stack[-1 - arg] = result
+
+            elif op == FOR_ITER:
+                value = next(stack[-1], UNDEFINED)
+                if value is UNDEFINED:
+                    pop()
+                    pc = arg
+                else:
+                    push(value)
+
+            elif op == LIST_ACCESS:
+                index = pop()
+                list_obj = pop()
+                if not isinstance(list_obj, List):
+                    raise TypeError("LIST_ACCESS requires a List object")
+                if not isinstance(index, int):
+                    raise TypeError("List index must be an integer")
+                push(list_obj.get(index))
+
+            elif op == BUILD_LIST:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                if budget is not None:
+                    budget.add_elements(arg, (code, pc - 2))
+                push(List(elements))
+
+            elif op == CALL_METHOD:
+                method_name, argc = constants[arg]
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                push(_call_method(pop(), method_name, args, budget, (code, pc - 2)))
+
+            elif op == NEGATE:
+                value = stack[-1]
+                if not isinstance(value, (int, float)):
+                    raise TypeConversionError("Unary minus requires a number")
+                stack[-1] = -value
+
+            elif op == LOGICAL_NOT:
+                value = stack[-1]
+                if not isinstance(value, bool):
+                    raise TypeConversionError("Unary NOT requires a boolean")
+                stack[-1] = not value
+
+            elif op == INT_CAST:
+                try:
+                    stack[-1] = int(stack[-1])
+                except (ValueError, TypeError) as e:
+                    raise TypeConversionError(f"Cannot cast to int: {e}")
+
+            elif op == LOAD_RESULT:
+                push(result)
+
+            elif op == DELETE_SLOT:
+                if slots[arg] is UNDEFINED:
+                    raise VariableNotDefinedError(f"Variable '{names[arg]}' not defined, cannot delete.")
+                slots[arg] = UNDEFINED
+
+            elif op == INPUT:
+                prompt = str(pop())
+                self.output.flush()
+                push(self.input(prompt))
+
+            elif op == LIST_APPEND:
+                value = pop()
+                list_obj = pop()
+                if not isinstance(list_obj, List):
+                    raise TypeError("LIST_APPEND requires a List object")
+                if budget is not None:
+                    budget.add_elements(1, (code, pc - 2))
+                list_obj.append(value)
+                push(None)
+
+            elif op == LIST_REMOVE:
+                index = pop()
+                list_obj = pop()
+                if not isinstance(list_obj, List):
+                    raise TypeError("LIST_REMOVE requires a List object")
+                if not isinstance(index, int):
+                    raise TypeError("List remove index must be an integer")
+                push(list_obj.remove(index))
+
+            elif op == GET_ITER:
+                stack[-1] = _list_values(stack[-1])
+
+            elif op == RANGE_ITER:
+                end = pop()
+                stack[-1] = _range_values(stack[-1], end)
+
+            elif op == RETURN:
+                return result
+
+            elif op == MAKE_FUNCTION:
+                name, param_count, local_names, memo, body, function_code = constants[arg]
+                function = _make_function(name, param_count, local_names, memo, body, self.memo_size)
+                function.code = function_code
+                push(function)
+
+            elif op == DELETE_LOCAL:
+                if frame[arg] is UNDEFINED:
+                    raise VariableNotDefinedError(f"Variable '{code.local_names[arg]}' not defined, cannot delete.")
+                frame[arg] = UNDEFINED
+
+            elif op == RAISE_BREAK:
+                raise BreakException()
+
+            elif op == RAISE_CONTINUE:
+                raise ContinueException()
+
+            elif op == UNKNOWN_NODE:
+                raise Exception(f"Unknown AST node: {constants[arg]}")
+
+            else:
+                raise Exception(f"Unknown opcode {op} at offset {pc - 2}")
+
+
+def compile_ast(ast, data, lines=None):
+    """
+    Resolve a parser AST against a Data store and compile it to a Code object.
+    The Code object must be run by a VM using the same Data store. Given a
+    lines dict, the resolver fills it (see resolve()) and the Code gets the
+    line table that budget errors name lines from.
+    """
+    resolved, _ = resolve(ast, data, lines)
+    return Compiler(lines).compile(resolved)
+
+
+def disassemble(code):
+    """
+    Return a human-readable listing of a Code object, one instruction per line.
+    Jump targets are marked with '>>'.
+    """
+    instructions = code.instructions
+    targets = {instructions[i + 1] for i in range(0, len(instructions), 2)
+               if instructions[i] in (JUMP, JUMP_IF_FALSE, FOR_ITER)}
+
+    lines = []
+    for offset in range(0, len(instructions), 2):
+        op = instructions[offset]
+        arg = instructions[offset + 1]
+        marker = '>>' if offset in targets else '  '
+        line = f"{marker} {offset:5d} {OPNAMES[op]:<18}"
+
+        if op in (LOAD_CONST, UNKNOWN_NODE):
+            line += f" {arg} ({code.constants[arg]!r})"
+        elif op in (LOAD_SLOT, STORE_SLOT, DELETE_SLOT):
+            line += f" {arg} ({code.names[arg]})"
+        elif op in (LOAD_LOCAL, STORE_LOCAL, DELETE_LOCAL):
+            line += f" {arg} ({code.local_names[arg]})"
+        elif op == MAKE_FUNCTION:
+            line += f" {arg} (function {code.constants[arg][0]})"
+        elif op == BINARY_OP:
+            line += f" {arg} ({BINARY_OP_NAMES[arg]})"
+        elif op == CALL_METHOD:
+            name, argc = code.constants[arg]
+            line += f" {arg} ({name}, {argc} args)"
+        elif op in (JUMP, JUMP_IF_FALSE, FOR_ITER, BUILD_LIST, STORE_LOOP_RESULT, CALL_FUNCTION):
+            line += f" {arg}"
+        lines.append(line.rstrip())
+
+    # Function bodies are listed after the code that defines them
+    for offset in range(0, len(instructions), 2):
+        if instructions[offset] == MAKE_FUNCTION:
+            name, param_count, local_names, memo, _, function_code = code.constants[instructions[offset + 1]]
+            lines.append("")
+            lines.append(f"{'memo ' if memo else ''}function {name}({', '.join(local_names[:param_count])}):")
+            lines.append(disassemble(function_code))
+    return "\n".join(lines)